@@ -0,0 +1,400 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║              MAFIO BOT — BACKTEST (Replay)                  ║
+║   إعادة تشغيل السوق المسجل عبر نفس دوال القرار بساعة محاكاة  ║
+╚══════════════════════════════════════════════════════════════╝
+
+التسجيل (من البوت الحقيقي):
+  RECORD_DIR=rec python main.py
+
+إعادة التشغيل:
+  python backtest.py rec
+  python backtest.py rec --horizon 3600 --trades trades.csv
+
+  ● الساعة محاكاة: time.time() داخل main = وقت الصورة المسجلة
+  ● كل دورة → main.periodic_tasks + main.process_snapshot (نفس مسار run)
+  ● safe_get يقرأ من الردود المسجلة (آخر رد قبل الوقت الحالي)
+  ● send يُلتقط (لا Telegram) | Deep Scan متزامن (بدون خيوط)
+  ● النتيجة: PnL لكل إشارة + نسبة النجاح + Drawdown
+    - إشارات Deep Scan: من الدخول حتى Trailing / SL / نهاية التسجيل
+    - تنبيهات Momentum (المرحلة 1): العائد بعد --horizon ثانية
+"""
+
+import os
+import sys
+import csv
+import glob
+import gzip
+import json
+import time as _time
+import argparse
+import logging
+from bisect import bisect_right
+from concurrent.futures import Future
+from datetime import datetime
+
+import numpy as np
+
+import main
+
+KLINES_MAX_AGE = 2 * 86400   # أقدم رد Klines يُستخدم لبناء النافذة
+DEPTH_MAX_AGE  = 900         # OrderBook أقدم من 15 دقيقة = غير متوفر
+
+
+# ═══════════════════════════════════════════════
+#   ساعة محاكاة + تنفيذ متزامن
+# ═══════════════════════════════════════════════
+class SimClock(object):
+    """بديل وحدة time داخل main: time() = وقت الصورة، sleep() بدون انتظار."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, sec):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(_time, name)   # perf_counter / monotonic / strftime ...
+
+
+CLOCK = SimClock()
+
+
+class SimDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.fromtimestamp(CLOCK.now, tz)
+
+
+class InlineExecutor(object):
+    """scan_pool متزامن: المهمة تُنفذ فوراً والنتيجة جاهزة."""
+
+    def submit(self, fn, *args, **kwargs):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+# ═══════════════════════════════════════════════
+#   البيانات المسجلة
+# ═══════════════════════════════════════════════
+def iter_chunks(path):
+    """(ts, symbols, data) لكل ملف snapshots-*.npz بالترتيب."""
+    for name in sorted(glob.glob(os.path.join(path, "snapshots-*.npz"))):
+        with np.load(name) as z:
+            yield z["ts"], z["symbols"].tolist(), z["data"]
+
+
+def snapshots(chunks):
+    """صور السوق بالترتيب — index الرموز يُعاد استخدامه ما دامت نفس الرموز."""
+    for ts, symbols, data in chunks:
+        mask = None
+        for t in range(len(ts)):
+            d     = np.asarray(data[t], dtype=np.float64)
+            valid = ~np.isnan(d[0])
+            if mask is None or not np.array_equal(valid, mask):
+                mask  = valid
+                cols  = np.flatnonzero(valid)
+                full  = len(cols) == len(symbols)
+                syms  = symbols if full else [symbols[c] for c in cols.tolist()]
+                index = {s: i for i, s in enumerate(syms)}
+            yield main.MarketSnapshot(syms, d if full else d[:, cols],
+                                      ts=float(ts[t]), index=index)
+
+
+def iter_snapshots(path):
+    return snapshots(iter_chunks(path))
+
+
+class ResponseStore(object):
+    """ردود Klines/Depth المسجلة مفهرسة بـ (endpoint, symbol[, interval]) ثم الوقت."""
+
+    def __init__(self, path):
+        self.recs = self.index(self.read(path))
+
+    @classmethod
+    def read(cls, path):
+        """كل الردود المسجلة: {key: [(t, رد), ...]}."""
+        recs = {}
+        for name in sorted(glob.glob(os.path.join(path, "responses-*.jsonl.gz"))):
+            try:
+                with gzip.open(name, "rt", encoding="utf-8") as fh:
+                    for line in fh:
+                        try:
+                            rec = json.loads(line)
+                        except ValueError:
+                            continue
+                        recs.setdefault(cls.key(rec["e"], rec["p"]), []).append(
+                            (rec["t"], rec["r"]))
+            except (EOFError, OSError):
+                pass   # ملف مقطوع (إيقاف مفاجئ) — نستخدم ما قُرئ
+        return recs
+
+    @staticmethod
+    def index(recs):
+        out = {}
+        for k, items in recs.items():
+            items.sort(key=lambda x: x[0])
+            out[k] = ([t for t, _ in items], [r for _, r in items])
+        return out
+
+    def data(self, key, item):
+        """الرد الخام — sweep.py يعيد تعريفها للقراءة من memmap."""
+        return item
+
+    @staticmethod
+    def key(endpoint, params):
+        if endpoint == "klines":
+            return ("klines", params.get("symbol"), params.get("interval"))
+        return (endpoint, params.get("symbol"))
+
+    def depth(self, params, now):
+        key = self.key("depth", params)
+        times, datas = self.recs.get(key, ([], []))
+        i = bisect_right(times, now) - 1
+        if i < 0 or now - times[i] > DEPTH_MAX_AGE:
+            return None
+        return self.data(key, datas[i])
+
+    def klines(self, params, now):
+        """
+        الردود التراكمية (startTime) قصيرة — نرجع للخلف وندمج حتى تكتمل النافذة.
+        الأحدث يفوز لنفس openTime (الشمعة الجارية).
+        """
+        key = self.key("klines", params)
+        times, datas = self.recs.get(key, ([], []))
+        limit = int(params.get("limit", 500))
+        rows  = {}
+        i = bisect_right(times, now) - 1
+        while i >= 0 and now - times[i] <= KLINES_MAX_AGE and len(rows) < limit:
+            for r in self.data(key, datas[i]):
+                rows.setdefault(r[0], r)
+            i -= 1
+        if not rows:
+            return None
+        out   = [rows[k] for k in sorted(rows)]
+        start = params.get("startTime")
+        if start is not None:
+            out = [r for r in out if r[0] >= start]
+        return out[-limit:]
+
+
+# ═══════════════════════════════════════════════
+#   سجل الإشارات
+# ═══════════════════════════════════════════════
+class Ledger(object):
+    def __init__(self, horizon):
+        self.horizon = horizon
+        self.open    = {}   # sym → إشارة Deep Scan مفتوحة
+        self.probes  = {}   # (sym, entry_time) → تنبيه Momentum تحت القياس
+        self.trades  = []   # نتائج مغلقة
+        self.seen_stage = {}
+
+    @staticmethod
+    def _track(d, price):
+        d["max"] = max(d["max"], price)
+        d["min"] = min(d["min"], price)
+
+    def _close(self, d, kind, sym, price, now, reason):
+        entry = d["entry"]
+        self.trades.append({
+            "kind":   kind,
+            "symbol": sym,
+            "entry_time": d["time"],
+            "exit_time":  now,
+            "entry":  entry,
+            "exit":   price,
+            "pnl":    (price - entry) / entry * 100,
+            "mfe":    (d["max"] - entry) / entry * 100,
+            "mae":    (d["min"] - entry) / entry * 100,
+            "score":  d.get("score", ""),
+            "reason": reason,
+        })
+
+    def step(self, snap, now, msgs):
+        tracked = main.tracked
+        if tracked or self.open:
+            for sym in tracked.keys() - self.open.keys():
+                e = tracked[sym]["entry"]
+                self.open[sym] = {"entry": e, "time": now, "max": e, "min": e,
+                                  "score": tracked[sym].get("score", "")}
+            for sym, d in list(self.open.items()):
+                price = snap.get("price", sym, d["entry"])
+                if sym in tracked:
+                    self._track(d, price)
+                    continue
+                tag = "`{}`".format(sym)
+                hit = [m for m in msgs if tag in m]
+                reason = ("trail" if any("TRAILING" in m for m in hit) else
+                          "sl" if any("STOP LOSS" in m for m in hit) else "stale")
+                self._track(d, price)
+                self._close(d, "signal", sym, price, now, reason)
+                del self.open[sym]
+
+        for sym, st in main.momentum_stage.items():
+            if st["stage"] == 1 and self.seen_stage.get(sym) != st["entry_time"]:
+                self.seen_stage[sym] = st["entry_time"]
+                e = st["entry_price"]
+                self.probes[(sym, now)] = {"entry": e, "time": now, "max": e, "min": e}
+        for key, d in list(self.probes.items()):
+            price = snap.get("price", key[0], d["entry"])
+            self._track(d, price)
+            if now - d["time"] >= self.horizon:
+                self._close(d, "momentum", key[0], price, now, "horizon")
+                del self.probes[key]
+
+    def finish(self, snap, now):
+        for sym, d in list(self.open.items()):
+            self._close(d, "signal", sym, snap.get("price", sym, d["entry"]), now, "open")
+        for key, d in list(self.probes.items()):
+            self._close(d, "momentum", key[0],
+                        snap.get("price", key[0], d["entry"]), now, "open")
+        self.open.clear()
+        self.probes.clear()
+
+
+def summarize(trades):
+    """PnL% لكل صفقة → نسبة النجاح / المتوسط / أقصى Drawdown لمنحنى الأرباح."""
+    if not trades:
+        return None
+    pnl = np.array([t["pnl"] for t in sorted(trades, key=lambda t: t["exit_time"])])
+    eq  = np.cumsum(pnl)
+    dd  = np.maximum.accumulate(np.maximum(eq, 0)) - eq
+    return {
+        "n":        len(pnl),
+        "hit_rate": float((pnl > 0).mean() * 100),
+        "avg":      float(pnl.mean()),
+        "median":   float(np.median(pnl)),
+        "best":     float(pnl.max()),
+        "worst":    float(pnl.min()),
+        "total":    float(eq[-1]),
+        "max_dd":   float(dd.max()),
+        "avg_mae":  float(np.mean([t["mae"] for t in trades])),
+        "avg_mfe":  float(np.mean([t["mfe"] for t in trades])),
+    }
+
+
+# ═══════════════════════════════════════════════
+#   REPLAY
+# ═══════════════════════════════════════════════
+def install(store):
+    """يربط main بالساعة المحاكاة والبيانات المسجلة."""
+    msgs = []
+
+    def replay_get(url, params=None, decode=None, **kw):
+        p   = params or {}
+        sym = p.get("symbol")
+        if url == main.MEXC_KLINES:
+            return store.klines(p, CLOCK.now)
+        if url == main.MEXC_DEPTH:
+            return store.depth(p, CLOCK.now)
+        snap = main.market_snapshot
+        if sym and sym in snap:
+            if url == main.MEXC_24H:
+                return {"symbol": sym, "priceChangePercent": str(snap.get("change", sym)),
+                        "lastPrice": str(snap.get("price", sym))}
+            if url == main.MEXC_PRICE:
+                return {"symbol": sym, "price": str(snap.get("price", sym))}
+        return None
+
+    def sync_deep_scan(symbols=None):
+        main.run_deep_scan(list(main.candidates if symbols is None else symbols),
+                           symbols is None)
+        return True
+
+    main.time          = CLOCK
+    main.datetime      = SimDatetime
+    main.safe_get      = replay_get
+    main.send          = msgs.append
+    main.scan_pool     = InlineExecutor()
+    main.start_deep_scan = sync_deep_scan
+    main.scan_limiter  = main.TokenBucket(1e12, 1e12)
+    main.api_limiter   = main.TokenBucket(1e12, 1e12)
+    main.recorder      = None
+    main.kline_archive = None   # الأرشيف يحتوي شموعاً من "المستقبل" بالنسبة للساعة المحاكاة
+    main.state_store   = None
+    main.METRICS_ENABLED = False
+    return msgs
+
+
+def replay(path, horizon=3600):
+    return run_replay(iter_snapshots(path), ResponseStore(path), horizon)
+
+
+def run_replay(snaps, store, horizon=3600):
+    msgs   = install(store)
+    ledger = Ledger(horizon)
+    steps  = 0
+    snap   = None
+    first  = None
+    for snap in snaps:
+        now = CLOCK.now = snap.ts
+        if first is None:
+            first = now
+        n = len(msgs)
+        main.periodic_tasks(now)
+        main.process_snapshot(snap, now)
+        ledger.step(snap, now, msgs[n:] if len(msgs) > n else ())
+        steps += 1
+    if snap is not None:
+        ledger.finish(snap, CLOCK.now)
+    return ledger, msgs, steps, (CLOCK.now - first) if first is not None else 0.0
+
+
+def print_report(ledger, msgs, steps, span, wall):
+    print("🎞️ Replay | {:,} دورة | {:.1f} يوم مسجل | {:.1f}s ({:,.0f} دورة/ثانية)".format(
+        steps, span / 86400, wall, steps / wall if wall else 0))
+    print("   رسائل: {:,}".format(len(msgs)))
+    for kind, title in (("signal", "إشارات Deep Scan"), ("momentum", "تنبيهات Momentum")):
+        st = summarize([t for t in ledger.trades if t["kind"] == kind])
+        if st is None:
+            print("📭 {}: لا يوجد".format(title))
+            continue
+        print("📊 {} | {} صفقة".format(title, st["n"]))
+        print("   نجاح   : {:.1f}%".format(st["hit_rate"]))
+        print("   متوسط  : {:+.2f}% | وسيط: {:+.2f}%".format(st["avg"], st["median"]))
+        print("   أفضل   : {:+.2f}% | أسوأ: {:+.2f}%".format(st["best"], st["worst"]))
+        print("   إجمالي : {:+.2f}% | Max DD: {:.2f}%".format(st["total"], st["max_dd"]))
+        print("   MAE/MFE: {:+.2f}% / {:+.2f}%".format(st["avg_mae"], st["avg_mfe"]))
+
+
+def write_trades(trades, path):
+    fields = ["kind", "symbol", "entry_time", "exit_time", "entry", "exit",
+              "pnl", "mfe", "mae", "score", "reason"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fields)
+        w.writeheader()
+        w.writerows(trades)
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Replay a recorded market through the signal pipeline")
+    ap.add_argument("path", help="RECORD_DIR من البوت الحقيقي")
+    ap.add_argument("--horizon", type=float, default=3600,
+                    help="ثوانٍ لقياس تنبيهات Momentum")
+    ap.add_argument("--trades", default="", help="حفظ كل الصفقات في CSV")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    if not args.verbose:
+        main.log.setLevel(logging.WARNING)
+    t0 = _time.perf_counter()
+    ledger, msgs, steps, span = replay(args.path, args.horizon)
+    print_report(ledger, msgs, steps, span, _time.perf_counter() - t0)
+    if args.trades:
+        write_trades(ledger.trades, args.trades)
+        print("💾 {}".format(args.trades))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,448 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║              MAFIO BOT — BENCHMARKS                         ║
+║     قياس الأداء والذاكرة على بيانات صناعية (بدون API)      ║
+╚══════════════════════════════════════════════════════════════╝
+
+الاستخدام:
+  python bench.py             ● كل القياسات
+  python bench.py memory      ● ذاكرة Cache الشموع فقط
+  python bench.py batch       ● scan_features مقابل الدوال العادية (التوقيت فقط)
+  python bench.py expiry      ● طلبات Klines/يوم: TTL ثابت مقابل إغلاق الشمعة
+  python bench.py hot         ● المسارات الساخنة (ops/sec + الذاكرة) مقابل الحدود
+  python bench.py momentum deep_scan   ● مسارات محددة فقط
+
+  ● الحدود في bench_thresholds.json: {"اسم": {"max_ms": .., "max_alloc_kb": ..}}
+    تجاوز أي حد = exit 1 (للـ CI أو قبل أي commit أداء)
+  ● --save-thresholds يكتب القياسات الحالية × BENCH_MARGIN كحدود جديدة
+    (الحدود تخص الجهاز الذي قيست عليه)
+  ● المطابقة (batch / decode / الدلتا) في tests/ — python -m pytest -q
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tracemalloc
+
+import numpy as np
+
+import main
+
+THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_thresholds.json")
+BENCH_MARGIN  = 2.0     # الحدود الجديدة = القياس × 2
+HOT_SYMBOLS   = 2000    # حجم السوق الصناعي
+SCAN_SYMBOLS  = 200     # عملات الـ Deep Scan
+
+SYMBOLS   = 200
+INTERVALS = (("15m", 50), ("1h", 4), ("4h", 30))
+
+
+# ═══════════════════════════════════════════════
+#   بيانات صناعية
+# ═══════════════════════════════════════════════
+def synth_klines(n, step_ms=900_000, seed=None):
+    """صفوف بنفس شكل رد MEXC: [openTime, o, h, l, c, v, closeTime, qv]."""
+    rnd = random.Random(seed)
+    t0  = 1_700_000_000_000
+    p   = rnd.uniform(0.01, 50)
+    rows = []
+    for i in range(n):
+        o = p
+        c = p * (1 + rnd.uniform(-0.012, 0.013))
+        h = max(o, c) * (1 + rnd.uniform(0, 0.006))
+        l = min(o, c) * (1 - rnd.uniform(0, 0.006))
+        v = rnd.uniform(1_000, 80_000)
+        rows.append([t0 + i * step_ms, repr(o), repr(h), repr(l), repr(c),
+                     repr(v), t0 + (i + 1) * step_ms - 1, "0"])
+        p = c
+    return rows
+
+
+def legacy_klines(raw):
+    """تنسيق Cache القديم (V10): 5 قوائم float + avg_vol — للمقارنة فقط."""
+    vols = [float(c[5]) for c in raw]
+    return {
+        "opens":  [float(c[1]) for c in raw],
+        "highs":  [float(c[2]) for c in raw],
+        "lows":   [float(c[3]) for c in raw],
+        "closes": [float(c[4]) for c in raw],
+        "vols":   vols,
+        "avg_vol": sum(vols[:-1]) / max(len(vols[:-1]), 1),
+    }
+
+
+# ═══════════════════════════════════════════════
+#   MEMORY — ذاكرة Cache الشموع
+# ═══════════════════════════════════════════════
+def _measure(build, payloads):
+    tracemalloc.start()
+    base  = tracemalloc.get_traced_memory()[0]
+    cache = {k: build(raw, limit) for k, (raw, limit) in payloads.items()}
+    used  = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return used, len(cache)
+
+
+def bench_memory():
+    payloads = {}
+    for i in range(SYMBOLS):
+        for interval, limit in INTERVALS:
+            raw = synth_klines(limit, main.INTERVAL_MS[interval], seed=i)
+            payloads["S{}USDT_{}".format(i, interval)] = (raw, limit)
+
+    old, n = _measure(lambda raw, limit: legacy_klines(raw), payloads)
+    new, _ = _measure(main.OHLCV.from_rows, payloads)
+
+    print("📦 Klines cache | {} series ({} symbols × {} intervals)".format(
+        n, SYMBOLS, len(INTERVALS)))
+    print("   lists (V10) : {:>10,} B  ({:,.0f} B/series)".format(old, old / n))
+    print("   OHLCV       : {:>10,} B  ({:,.0f} B/series)".format(new, new / n))
+    print("   saving      : {:.0%}".format(1 - new / old))
+
+    # ── KlineCache بحدود: كل السوق يمر عبر Cache بـ 1/4 الحجم ──
+    budget = new / 4 / 1024 / 1024
+    cache  = main.KlineCache(n // 2, budget)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    t    = time.time()
+    for k, (raw, limit) in payloads.items():
+        cache[k] = (main.OHLCV.from_rows(raw, limit), t)
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    st = cache.stats()
+    print("   bounded     : {:>10,} B  ({} مدخل | حد {:.2f} MB | طُرد {})".format(
+        used, st["entries"], budget, st["evicted"]))
+    if cache.nbytes > cache.max_bytes or len(cache) > cache.max_entries:
+        print("   ❌ KlineCache تجاوز الحدود")
+        sys.exit(1)
+    return {"legacy_bytes": old, "ohlcv_bytes": new, "bounded_bytes": used}
+
+
+# ═══════════════════════════════════════════════
+#   PARITY — المحرك الدفعي ≡ الدوال العادية
+# ═══════════════════════════════════════════════
+def synth_series(n_series=2000, seed=7):
+    """سلاسل بأطوال مختلفة + حالات Pump وحجم غير عادي."""
+    rnd = random.Random(seed)
+    kds = {}
+    for i in range(n_series):
+        n    = rnd.choice([50, 50, 50, 30, 12, 11, 8, 6, 5, 4])
+        rows = synth_klines(n, seed=seed * 100_000 + i)
+        if i % 7 == 0:
+            for r in rows[-5:]: r[2] = repr(float(r[2]) * 1.3)
+        if i % 11 == 0:
+            for r in rows[-6:]: r[5] = repr(float(r[5]) * 5)
+        kds["S{}USDT".format(i)] = main.OHLCV.from_rows(rows, n)
+    return kds
+
+
+def bench_batch():
+    """التوقيت فقط — المطابقة في tests/test_parity.py."""
+    kds = synth_series()
+
+    t0 = time.perf_counter()
+    main.scan_features(kds)
+    batch_sec = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for kd in kds.values():
+        main.indicator_features(kd)
+    scalar_sec = time.perf_counter() - t0
+
+    print("🧮 Batch indicators | {} series".format(len(kds)))
+    print("   scalar : {:.3f}s".format(scalar_sec))
+    print("   batch  : {:.3f}s  (×{:.1f})".format(batch_sec, scalar_sec / batch_sec))
+    return {"scalar_sec": scalar_sec, "batch_sec": batch_sec}
+
+
+# ═══════════════════════════════════════════════
+#   EXPIRY — TTL ثابت مقابل الإغلاق المحاذي
+# ═══════════════════════════════════════════════
+LEGACY_TTL = {"15m": 60, "1h": 300, "4h": 900}
+
+
+def simulate_expiry(expires, interval, every=12.7, days=3.0, start=1_700_000_123.0):
+    """طلب كل دورة (12 ثانية + وقت العمل) لـ days يوم: (جلب/يوم, أسوأ تأخير بعد إغلاق شمعة)."""
+    step  = main.INTERVAL_MS[interval] / 1000.0
+    t, ts = start, None
+    fetches, worst = 0, 0.0
+    while t < start + days * 86400:
+        if ts is None or t >= expires(interval, ts):
+            # الإغلاق الذي فاتته آخر سلسلة يظهر الآن
+            if ts is not None and (t // step) > (ts // step):
+                worst = max(worst, t - (t // step) * step)
+            ts = t
+            fetches += 1
+        t += every
+    return fetches / days, worst
+
+
+def bench_expiry():
+    """
+    الإغلاق المحاذي لا يوفر طلبات: يضيف جلباً عند كل إغلاق (الشمعة النهائية فوراً)
+    مقابل تأخير أقصى ~دورة واحدة بعد الإغلاق بدل TTL كامل.
+    """
+    print("⏱️  Klines expiry | طلب مع كل دورة (~12.7 ثانية) | جلب/يوم")
+    for interval in ("15m", "1h", "4h"):
+        old = simulate_expiry(lambda i, ts: ts + LEGACY_TTL[i], interval)
+        new = simulate_expiry(main.kline_expires, interval)
+        print("   {:<4} TTL ثابت: {:>6.0f} جلب | تأخير بعد الإغلاق ≤ {:>4.0f}s   "
+              "محاذي: {:>6.0f} جلب ({:+.0f}) | ≤ {:>3.0f}s".format(
+                  interval, old[0], old[1], new[0], new[0] - old[0], new[1]))
+    return {}
+
+
+# ═══════════════════════════════════════════════
+#   HOT PATHS — ops/sec + الذاكرة لكل مسار
+# ═══════════════════════════════════════════════
+def synth_tickers(n=HOT_SYMBOLS, seed=11):
+    """رد ticker/24hr صناعي: n عملة + Stablecoins الـ Smart Money + القطاعات + BTC."""
+    rnd  = random.Random(seed)
+    syms = ["S{}USDT".format(i) for i in range(n)]
+    syms += [s for s in main.SMART_MONEY_STABLES if s not in syms]
+    syms += [s for coins in main.SECTORS.values() for s in coins if s not in syms]
+    syms += ["BTCUSDT", "ETHUSDT", "BTC3LUSDT", "USDCUSDT"]
+    seen, out = set(), []
+    for s in syms:
+        if s in seen:
+            continue
+        seen.add(s)
+        p   = rnd.uniform(0.001, 80)
+        ch  = rnd.uniform(-12, 15)
+        out.append({
+            "symbol":             s,
+            "lastPrice":          repr(p),
+            "priceChangePercent": repr(ch),
+            "quoteVolume":        repr(rnd.uniform(5e4, 9e7)),
+            "highPrice":          repr(p * rnd.uniform(1.0, 1.3)),
+            "lowPrice":           repr(p * rnd.uniform(0.7, 1.0)),
+            "openPrice":          repr(p / (1 + ch / 100)),
+            "volume":             repr(rnd.uniform(1e3, 1e7)),
+        })
+    return out
+
+
+def moved(raw, frac=0.04, seed=12, lo=1.02, hi=1.06):
+    """نفس الرد بعد 12 ثانية: frac من العملات تحرك سعرها (×lo..hi) وحجمها."""
+    rnd = random.Random(seed)
+    out = []
+    for t in raw:
+        t = dict(t)
+        if rnd.random() < frac:
+            t["lastPrice"]   = repr(float(t["lastPrice"]) * rnd.uniform(lo, hi))
+            t["quoteVolume"] = repr(float(t["quoteVolume"]) * rnd.uniform(1.0, 1.6))
+        out.append(t)
+    return out
+
+
+def measure(fn, setup=None, number=20, warmup=2):
+    """
+    ms/op (وسيط) + ops/sec + ذاكرة الذروة لتشغيلة واحدة (tracemalloc).
+    setup() خارج التوقيت قبل كل تشغيلة.
+    """
+    for _ in range(warmup):
+        if setup: setup()
+        fn()
+    times = []
+    for _ in range(number):
+        if setup: setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    if setup: setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ms = float(np.median(times)) * 1000
+    return {"ms": round(ms, 4), "ops": round(1000 / ms, 1) if ms else 0.0,
+            "alloc_kb": round(peak / 1024, 1)}
+
+
+class _Inline(object):
+    """scan_pool بدون خيوط — القياس لا يتأثر بجدولة الخيوط."""
+
+    def submit(self, fn, *a, **kw):
+        from concurrent.futures import Future
+        fut = Future()
+        try:
+            fut.set_result(fn(*a, **kw))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+
+def _quiet():
+    """بدون Telegram / سجلات / حدود API أثناء القياس."""
+    main.log.setLevel(logging.WARNING)
+    main.send = lambda msg: None
+    main.scan_limiter = main.TokenBucket(1e12, 1e12)
+    main.api_limiter  = main.TokenBucket(1e12, 1e12)
+    main.scan_pool    = _Inline()
+    main.recorder     = None
+    main.kline_archive = None
+
+
+def hot_paths():
+    """{اسم: (وصف, fn, setup)} — كل المسارات على نفس البيانات الصناعية."""
+    _quiet()
+    raw     = synth_tickers()
+    payload = json.dumps(raw).encode()
+    snap_a  = main.MarketSnapshot.from_tickers(raw)
+    snap_b  = main.MarketSnapshot.from_tickers(moved(raw))
+    now     = time.time()
+
+    def set_market():
+        main.market_snapshot = snap_a
+
+    def momentum_setup():
+        main.momentum_stage.clear()
+        main.momentum_alerted.clear()
+        main.price_prev.clear()
+        main.price_prev.update(snap_a.as_map("price"))
+        main.price_prev_ts.clear()
+        main.price_prev_ts.update(dict.fromkeys(snap_a.symbols, now - main.CHECK_INTERVAL))
+
+    # ── Deep Scan: الشموع في Cache + OrderBook/4h من safe_get صناعي ──
+    syms  = [s for s in snap_a.symbols if s.startswith("S")][:SCAN_SYMBOLS]
+    k15   = {s: synth_klines(50, main.INTERVAL_MS["15m"], seed=i) for i, s in enumerate(syms)}
+    k4h   = {s: synth_klines(30, main.INTERVAL_MS["4h"], seed=10_000 + i)
+             for i, s in enumerate(syms)}
+    depth = {"bids": [[repr(1.0), repr(3_000 + i * 10)] for i in range(20)],
+             "asks": [[repr(1.0), repr(2_500 + i * 10)] for i in range(20)]}
+
+    def fake_get(url, params=None, decode=None, **kw):
+        p = params or {}
+        if url == main.MEXC_DEPTH:
+            return depth
+        if url == main.MEXC_KLINES:
+            return (k4h if p.get("interval") == "4h" else k15).get(p.get("symbol"))
+        return None
+
+    def deep_setup():
+        main.safe_get = fake_get
+        main.market_snapshot = snap_a
+        main.tracked.clear()
+        main.discovered.clear()
+        main.klines_cache.clear()
+        main.depth_cache.clear()
+        t = time.time()
+        for s in syms:
+            main.klines_cache[s + "_15m"] = (main.OHLCV.from_rows(k15[s], 50), t)
+            main.klines_cache[s + "_4h"]  = (main.OHLCV.from_rows(k4h[s], 30), t)
+
+    kds = {s: main.OHLCV.from_rows(k15[s], 50) for s in syms}
+
+    sched = main.ScanScheduler()
+    cands = [s for s in snap_a.symbols if s.startswith("S")][:SCAN_SYMBOLS * 2]
+
+    def sched_run():
+        sched.update(snap_a, cands, now)
+        sched.update(snap_b, cands, now + main.CHECK_INTERVAL)
+        return sched.drain(main.SCHED_BATCH, now)
+
+    def sched_setup():
+        sched.prev = None
+        sched.last_scan = dict.fromkeys(cands, now - 900)
+
+    return {
+        "ticker_parse":    ("decode_tickers ({} رمز)".format(len(raw)),
+                            lambda: main.decode_tickers(payload), None),
+        "ticker_legacy":   ("json.loads + from_tickers (مرجع)",
+                            lambda: main.MarketSnapshot.from_tickers(json.loads(payload)), None),
+        "refresh_tickers": ("اختيار candidates",
+                            lambda: main.refresh_tickers(snap_a), set_market),
+        "momentum":        ("detect_momentum ({} رمز)".format(len(snap_b)),
+                            lambda: main.detect_momentum(snap_b), momentum_setup),
+        "momentum_delta":  ("changed + detect_momentum (الدلتا فقط)",
+                            lambda: main.detect_momentum(snap_b, snap_b.changed(snap_a)),
+                            momentum_setup),
+        "sectors":         ("analyze_sectors ({} قطاع)".format(len(main.SECTORS)),
+                            main.analyze_sectors, set_market),
+        "smart_money":     ("analyze_smart_money",
+                            main.analyze_smart_money, set_market),
+        "scan_schedule":   ("ScanScheduler.update × 2 + drain ({} مرشح)".format(len(cands)),
+                            sched_run, sched_setup),
+        "klines_parse":    ("OHLCV.from_rows × {} (50 شمعة)".format(SCAN_SYMBOLS),
+                            lambda: [main.OHLCV.from_rows(k15[s], 50) for s in syms], None),
+        "indicators":      ("scan_features ({} سلسلة)".format(SCAN_SYMBOLS),
+                            lambda: main.scan_features(kds), None),
+        "deep_scan":       ("run_deep_scan ({} عملة)".format(SCAN_SYMBOLS),
+                            lambda: main.run_deep_scan(syms), deep_setup),
+    }
+
+
+def load_thresholds(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def bench_hot(names=None, thresholds=THRESHOLDS, save=False, number=20):
+    paths   = hot_paths()
+    names   = names or list(paths)
+    limits  = load_thresholds(thresholds)
+    results = {}
+    failed  = []
+    print("⚡ Hot paths | حدود: {}".format(
+        os.path.basename(thresholds) if limits else "لا يوجد"))
+    for name in names:
+        desc, fn, setup = paths[name]
+        r = results[name] = measure(fn, setup, number=number)
+        lim  = limits.get(name, {})
+        bad  = [k for k, key in (("max_ms", "ms"), ("max_alloc_kb", "alloc_kb"))
+                if k in lim and r[key] > lim[k]]
+        mark = "❌" if bad else ("✅" if lim else "  ")
+        print("   {} {:<16} {:>9.3f} ms/op {:>10,.1f} ops/s {:>9,.1f} KB  | {}".format(
+            mark, name, r["ms"], r["ops"], r["alloc_kb"], desc))
+        if bad:
+            failed.append(name)
+            for k in bad:
+                print("      ↳ {} {} > {}".format(k, r["ms" if k == "max_ms" else "alloc_kb"],
+                                                 lim[k]))
+    if save:
+        new = dict(limits)
+        for name, r in results.items():
+            new[name] = {"max_ms": round(r["ms"] * BENCH_MARGIN, 3),
+                         "max_alloc_kb": round(r["alloc_kb"] * BENCH_MARGIN + 64, 1)}
+        with open(thresholds, "w", encoding="utf-8") as f:
+            json.dump(new, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("💾 {}".format(thresholds))
+    elif failed:
+        print("❌ تراجع أداء: {}".format(", ".join(failed)))
+        sys.exit(1)
+    return results
+
+
+BENCHES = {
+    "memory": bench_memory,
+    "batch":  bench_batch,
+    "expiry": bench_expiry,
+    "hot":    bench_hot,
+}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="MAFIO BOT benchmarks")
+    ap.add_argument("names", nargs="*", help="memory / batch / expiry / hot / اسم مسار ساخن")
+    ap.add_argument("--thresholds", default=THRESHOLDS)
+    ap.add_argument("--save-thresholds", action="store_true")
+    ap.add_argument("--number", type=int, default=20, help="تشغيلات لكل مسار")
+    args = ap.parse_args()
+
+    names = args.names or list(BENCHES)
+    hot   = [n for n in names if n not in BENCHES]
+    for name in names:
+        if name == "hot":
+            bench_hot(None, args.thresholds, args.save_thresholds, args.number)
+        elif name in BENCHES:
+            BENCHES[name]()
+    if hot:
+        bench_hot(hot, args.thresholds, args.save_thresholds, args.number)
@@ -17,12 +17,40 @@
 
 import os
 import sys
+import json
 import time
+import gzip
+import heapq
+import signal
+import sqlite3
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from queue import Queue, Empty, Full
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import namedtuple, deque, OrderedDict
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 from datetime import datetime
 from typing import Optional, Dict, List, Tuple, Any, Set
 
+try:
+    import websocket   # websocket-client — اختياري (بدونه: REST فقط)
+except ImportError:
+    websocket = None
+
+try:
+    import msgspec     # اختياري — ticker/24hr مباشرة إلى أرقام (بدون float() لكل حقل)
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson      # اختياري — json.loads أسرع لكل الردود
+except ImportError:
+    orjson = None
+
 # ═══════════════════════════════════════════════
 #                    CONFIG
 # ═══════════════════════════════════════════════
@@ -61,6 +89,9 @@ PD_LOOKBACK        = 12
 SECTOR_HOT_CHANGE  = 3.0
 SECTOR_MIN_RISING  = 60.0
 SECTOR_BONUS       = 15
+# ملف قطاعات إضافي: JSON {"AI": ["FETUSDT", ...]} أو CSV (symbol,sector)
+# القطاعات في الملف تستبدل القطاعات بنفس الاسم وتضيف الجديدة
+SECTORS_FILE       = os.getenv("SECTORS_FILE", "")
 
 # ── Volume & Order Book ──────────────────────────
 VOL_SPIKE_RATIO    = 2.5
@@ -91,12 +122,55 @@ BTC_EVERY          = 1800      # تحليل BTC كل 30 دقيقة
 SECTORS_EVERY      = 1800      # تحليل القطاعات كل 30 دقيقة
 DEEP_SCAN_EVERY    = 3600      # Scan عميق (Klines) كل ساعة
 STALE_EVERY        = 3600      # تنظيف العملات المتوقفة كل ساعة
+STALE_REMOVE_SEC   = 86400     # إشارة بدون خروج لمدة 24 ساعة = تُحذف
 REPORT_EVERY       = 21600     # تقرير الأداء كل 6 ساعات
 
+# ── Deep Scan المتزامن ───────────────────────────
+SCAN_WORKERS       = int(os.getenv("SCAN_WORKERS", "8"))   # عملات تُفحص بالتوازي
+SCAN_MAX_RPS       = float(os.getenv("SCAN_MAX_RPS", "8")) # أقصى طلبات/ثانية للـ Scan
+
+# ── Scan Scheduler (طابور أولوية بدل المسح الأعمى كل ساعة) ──
+# كل دورة: أولوية لكل مرشح من بيانات ticker فقط → أعلى الطابور يُفحص فوراً
+SCAN_SCHEDULER     = os.getenv("SCAN_SCHEDULER", "1") == "1"   # 0 = Deep Scan كل ساعة
+SCHED_BATCH        = SCAN_WORKERS * 2   # أقصى عملات لكل دفعة
+SCHED_MIN_PRIORITY = 1.0       # أقل أولوية تستحق الفحص
+SCHED_RESCAN       = 300       # 5 دقائق على الأقل بين فحصين لنفس العملة
+SCHED_DECAY        = 0.9       # الإشارات المتراكمة تضعف كل دورة (نصف عمر ~80 ثانية)
+SCHED_API_RESERVE  = 60        # وزن محجوز لطلبات الدورة (ticker/24hr = 40)
+SCHED_WEIGHTS      = {
+    "hot":   1.0,    # قطاع ساخن
+    "accel": 0.5,    # لكل +1% تسارع في تغيير 24h منذ الصورة السابقة (حتى 4%)
+    "vol":   0.1,    # لكل +1% نمو حجم منذ الصورة السابقة (حتى 20%)
+    "stage": 1.5,    # لكل مرحلة Momentum
+    "age":   1.0,    # لكل DEEP_SCAN_EVERY بدون فحص — كل مرشح يُفحص مرة كل ساعة على الأقل
+}
+
 # ── Cache ────────────────────────────────────────
-CACHE_15M          = 60        # شموع 15m صالحة 60 ثانية
-CACHE_1H           = 300       # شموع 1h صالحة 5 دقائق
-CACHE_4H           = 900       # شموع 4h صالحة 15 دقيقة
+# تحديث الشمعة الجارية فقط — إغلاق الشمعة ينهي الصلاحية فوراً (kline_expires)
+CACHE_15M          = 60        # شمعة 15m الجارية تُحدّث كل 60 ثانية
+CACHE_1H           = 300       # شمعة 1h الجارية كل 5 دقائق
+CACHE_4H           = 900       # شمعة 4h الجارية كل 15 دقيقة (الإغلاق لا يُفوّت)
+# حدود Cache الشموع في الذاكرة — الأقل استخداماً يُطرد عند الإضافة
+KLINES_CACHE_MAX   = int(os.getenv("KLINES_CACHE_MAX", "4000"))    # ~2000 عملة × 2 فاصل
+KLINES_CACHE_MB    = float(os.getenv("KLINES_CACHE_MB", "32"))
+
+# طول كل شمعة بالمللي ثانية (للتحديث التراكمي عبر startTime)
+INTERVAL_MS = {
+    "1m":  60_000,      "5m":  300_000,    "15m": 900_000,
+    "30m": 1_800_000,   "1h":  3_600_000,  "4h":  14_400_000,
+    "1d":  86_400_000,
+}
+
+# ── أرشيف الشموع على القرص (memmap) ─────────────
+# الشموع المغلقة تُحفظ لكل رمز/فاصل — الـ Scan والإقلاع يطلبان فقط الجديد
+KLINES_ARCHIVE_DIR = os.getenv("KLINES_ARCHIVE_DIR", "")   # مثال: klines_archive | "" = تعطيل
+ARCHIVE_OPEN_MAX   = 256       # ملفات memmap مفتوحة معاً (كل ملف = fd) — الأقدم استخداماً يُغلق
+ARCHIVE_CAPACITY   = {         # أقصى شموع لكل ملف (حجم ثابت على القرص)
+    "15m": 672,                # 7 أيام
+    "1h":  720,                # 30 يوم
+    "4h":  540,                # 90 يوم
+}
+ARCHIVE_DEFAULT_CAP = 500
 
 # ── 🆕 Momentum Detector ─────────────────────────
 # يرصد الحركة اللحظية كل 12 ثانية بدون Klines
@@ -107,10 +181,92 @@ MOMENTUM_MIN_VOL   = 500_000 # حجم 24h أدنى (~Market Cap 5M$)
 MOMENTUM_COOLDOWN  = 600     # 10 دقائق بين كل تنبيه لنفس العملة
 
 # ── MEXC Endpoints ──────────────────────────────
-MEXC_24H    = "https://api.mexc.com/api/v3/ticker/24hr"
-MEXC_PRICE  = "https://api.mexc.com/api/v3/ticker/price"
-MEXC_KLINES = "https://api.mexc.com/api/v3/klines"
-MEXC_DEPTH  = "https://api.mexc.com/api/v3/depth"
+MEXC_BASE   = "https://api.mexc.com"
+MEXC_24H    = MEXC_BASE + "/api/v3/ticker/24hr"
+MEXC_PRICE  = MEXC_BASE + "/api/v3/ticker/price"
+MEXC_KLINES = MEXC_BASE + "/api/v3/klines"
+MEXC_DEPTH  = MEXC_BASE + "/api/v3/depth"
+
+# ── Streaming (WebSocket) ───────────────────────
+# miniTickers لكل السوق بدل تحميل ticker/24hr كاملاً كل 12 ثانية
+STREAM_ENABLED     = os.getenv("STREAM", "1") == "1"
+MEXC_WS            = os.getenv("MEXC_WS_URL", "wss://wbs.mexc.com/ws")
+# نافذة 24H متحركة = نفس معنى change/high/low/vol في REST ticker/24hr
+# (UTC+8 = يوم تقويمي ينقلب عند منتصف الليل ويغير معنى كل الفلاتر)
+STREAM_CHANNEL     = "spot@public.miniTickers.v3.api@24H"
+STREAM_STALE_SEC   = 30        # لا رسائل 30 ثانية = انقطاع → REST
+STREAM_PING_SEC    = 20        # MEXC يقطع الاتصال بدون PING
+STREAM_RETRY_SEC   = 15        # انتظار قبل إعادة الاتصال
+STREAM_RECORD_FILE = os.getenv("STREAM_RECORD_FILE", "")  # تسجيل الرسائل لـ replay_ws.py
+
+# ── Order Book (Depth) ──────────────────────────
+DEPTH_LIMIT        = 20        # مستويات لكل جانب (Score مبني على أول 20)
+DEPTH_TTL          = 30        # OrderBook صالح 30 ثانية (Stage-3 و Scheduler يعيدون نفس العملات)
+# دفتر محلي عبر WebSocket للـ tracked / Momentum / القطاعات الساخنة — اختياري
+DEPTH_STREAM       = os.getenv("DEPTH_STREAM", "0") == "1"
+DEPTH_STREAM_MAX   = 30        # حد MEXC للاشتراكات في الاتصال الواحد
+DEPTH_CHANNEL      = "spot@public.limit.depth.v3.api@{}@20"
+
+# ── Checkpoint (حفظ الحالة عبر إعادة التشغيل) ───
+# SQLite بوضع WAL: كل حفظ = transaction واحدة (لا ملف نصف مكتوب)
+STATE_FILE         = os.getenv("STATE_FILE", "")   # مثال: mafio_state.db | "" = تعطيل
+STATE_SAVE_EVERY   = 60        # حفظ كل دقيقة
+STATE_MAX_AGE      = 172800    # حالة أقدم من 48 ساعة = بداية باردة
+
+# ── Recorder (تسجيل السوق لـ backtest.py) ───────
+# صور السوق → npz عمودي (كل RECORD_CHUNK دورة) | Klines/Depth → jsonl.gz
+RECORD_DIR         = os.getenv("RECORD_DIR", "")   # "" = تعطيل
+RECORD_CHUNK       = 300       # 300 دورة × 12 ثانية = ساعة لكل ملف
+
+# ── Rate Limiter (Token Bucket) ─────────────────
+# أوزان MEXC لكل endpoint: (مع symbol, بدون symbol)
+# ticker/24hr بدون symbol = كل السوق = الأثقل
+API_WEIGHTS = {
+    MEXC_24H:    (1, 40),
+    MEXC_PRICE:  (1, 2),
+    MEXC_KLINES: (1, 1),
+    MEXC_DEPTH:  (1, 1),
+}
+API_WEIGHT_PER_MIN = int(os.getenv("API_WEIGHT_PER_MIN", "1200"))  # ميزانية الوزن/دقيقة
+API_WEIGHT_BURST   = int(os.getenv("API_WEIGHT_BURST", "120"))     # أقصى دفعة فورية
+API_BAN_PAUSE      = 60        # إيقاف افتراضي بعد 429 بدون Retry-After
+
+# ── HTTP (Connection Pools) ─────────────────────
+# Session منفصلة لكل جهة: MEXC (خيوط الـ Scan) و Telegram (خيط واحد)
+HTTP_POOL_MEXC     = SCAN_WORKERS + 4   # اتصالات مفتوحة (keep-alive) لـ MEXC
+HTTP_POOL_TG       = 2
+HTTP_RETRIES       = 2         # إعادة تلقائية للشبكة و 5xx (ليس 429)
+HTTP_BACKOFF       = 0.3       # 0.3s, 0.6s ...
+HTTP_TIMEOUT       = (3.05, 10)  # (اتصال, قراءة)
+# تحليل ticker/24hr السريع: msgspec ← orjson ← json (0 = المسار القديم فقط)
+FAST_JSON          = os.getenv("FAST_JSON", "1") == "1"
+
+# ── Market Sources (مصادر بيانات السوق) ─────────
+# الأول = الأساسي (رموزه بدون بادئة + Stream). الباقي يُجلب بالتوازي
+# ورموزه بالشكل "اسم:رمز" — كل مصدر إضافي بميزانية وزن و Pool مستقلة:
+#   MARKET_SOURCES="mexc,dev=mexc:http://127.0.0.1:8081,local=file:market_dir"
+MARKET_SOURCES     = os.getenv("MARKET_SOURCES", "mexc")
+SOURCE_WEIGHT_PER_MIN = int(os.getenv("SOURCE_WEIGHT_PER_MIN", str(API_WEIGHT_PER_MIN)))
+SOURCE_STALE_SEC   = 60        # صورة مصدر إضافي أقدم من دقيقة لا تُدمج (فشل متكرر)
+
+# ── Metrics (توقيت المراحل) ─────────────────────
+# معطل افتراضياً: timed() يرجع كائناً فارغاً بدون أي قياس
+METRICS_ENABLED    = os.getenv("METRICS", "0") == "1"
+METRICS_PORT       = int(os.getenv("METRICS_PORT", "0"))  # >0 = /metrics بصيغة Prometheus
+METRICS_LOG_EVERY  = 300       # ملخص في السجل كل 5 دقائق
+METRICS_RESERVOIR  = 1024      # آخر N قياس لكل مرحلة (لحساب p50/p95/p99)
+
+# ── Telegram (طابور إرسال في الخلفية) ────────────
+# send() لا ينتظر أبداً — الرسائل تُدمج وتُرسل من خيط منفصل
+TG_API             = "https://api.telegram.org/bot{}/sendMessage"
+TG_QUEUE_MAX       = 500       # عند الامتلاء تُحذف الأقدم
+TG_MAX_LEN         = 4096      # حد Telegram للرسالة الواحدة
+TG_COALESCE_SEC    = 1.0       # انتظار قصير لتجميع الدفعات
+TG_PER_MIN         = 20        # حد Telegram لكل محادثة (مجموعات: 20/دقيقة)
+TG_BURST           = 3
+TG_RETRIES         = 5
+TG_BACKOFF_MAX     = 60        # أقصى انتظار بين المحاولات
+TG_FLUSH_SEC       = 15        # مهلة تفريغ الطابور عند الإيقاف
 
 EXCLUDED          = {"BTCUSDT","ETHUSDT","BNBUSDT","SOLUSDT","XRPUSDT"}
 
@@ -139,8 +295,11 @@ LEVERAGE_KEYWORDS = ["3L","3S","5L","5S","BULL","BEAR","UP","DOWN",
 STABLE_KEYWORDS   = ["USD","EUR","GBP","JPY","CNY","AUD","CHF",
                      "GOLD","SILVER","PAX","DAI","FRAX"]
 
+# ── عملات التسعير المعروفة (الأطول أولاً) ────────
+QUOTE_ASSETS      = ["USDT","USDC","BTC","ETH"]
+
 # ═══════════════════════════════════════════════
-#   SECTORS — 12 قطاع
+#   SECTORS — 12 قطاع (+ SECTORS_FILE)
 # ═══════════════════════════════════════════════
 SECTORS = {
     "AI":      ["FETUSDT","AGIXUSDT","OCEANUSDT","AIXBTUSDT","RENDUSDT",
@@ -193,6 +352,890 @@ logging.basicConfig(
     ]
 )
 log = logging.getLogger("MafioBot")
+logging.getLogger("websocket").setLevel(logging.CRITICAL)  # لدينا رسائل Stream خاصة
+
+
+# ═══════════════════════════════════════════════
+#   RATE LIMITER — Token Bucket بأوزان MEXC
+# ═══════════════════════════════════════════════
+class TokenBucket(object):
+    """
+    Token Bucket آمن بين الخيوط:
+      ● يمتلئ بمعدل rate_per_min/60 وزن في الثانية حتى capacity
+      ● acquire(weight) يحجز الوزن فوراً — إذا الرصيد سالب ينتظر دوره
+        (الحجز المسبق = طابور FIFO بدون قوائم إضافية)
+      ● pause(sec) يوقف الامتلاء بعد 429 حتى ينتهي الحظر
+    """
+
+    def __init__(self, rate_per_min, capacity):
+        # type: (float, float) -> None
+        self.rate     = rate_per_min / 60.0
+        self.capacity = float(capacity)
+        self.tokens   = float(capacity)
+        self.updated  = time.time()
+        self.blocked_until = 0.0
+        self.waiting  = 0       # طلبات في الطابور الآن
+        self.granted  = 0       # إجمالي الوزن المصروف
+        self.wait_sec = 0.0     # إجمالي وقت الانتظار
+        self._lock    = threading.Lock()
+
+    def _refill(self, now):
+        # type: (float) -> None
+        start = max(self.updated, self.blocked_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def acquire(self, weight=1):
+        # type: (float) -> float
+        """يحجز weight وينتظر إذا لزم. يرجع مدة الانتظار بالثواني."""
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            self.tokens  -= weight
+            self.granted += weight
+            wait = max(self.blocked_until - now, 0.0)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            if wait > 0:
+                self.waiting  += 1
+                self.wait_sec += wait
+        if wait > 0:
+            time.sleep(wait)
+            with self._lock:
+                self.waiting -= 1
+        return wait
+
+    def pause(self, seconds):
+        # type: (float) -> None
+        """بعد 429: لا امتلاء ولا طلبات حتى انتهاء المدة."""
+        with self._lock:
+            now = time.time()
+            self._refill(now)
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+    def stats(self):
+        # type: () -> Dict[str, float]
+        with self._lock:
+            self._refill(time.time())
+            return {
+                "budget":   round(self.tokens, 1),
+                "queue":    self.waiting,
+                "granted":  self.granted,
+                "wait_sec": round(self.wait_sec, 1),
+                "blocked":  round(max(self.blocked_until - time.time(), 0.0), 1),
+            }
+
+
+def request_weight(url, params=None, weights=None):
+    # type: (str, Optional[dict], Optional[Dict[str, Tuple[int, int]]]) -> int
+    with_sym, without = (weights or API_WEIGHTS).get(url, (1, 1))
+    return with_sym if params and params.get("symbol") else without
+
+
+# ═══════════════════════════════════════════════
+#   TELEGRAM QUEUE — إرسال غير متزامن مع دمج وإعادة محاولة
+# ═══════════════════════════════════════════════
+def split_message(msg, limit=TG_MAX_LEN):
+    # type: (str, int) -> List[str]
+    """تقسيم رسالة طويلة على حدود الأسطر (والسطر الطويل يُقطع)."""
+    if len(msg) <= limit:
+        return [msg]
+    parts, cur = [], ""
+    for line in msg.split("\n"):
+        while len(line) > limit:
+            if cur:
+                parts.append(cur)
+                cur = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if cur and len(cur) + 1 + len(line) > limit:
+            parts.append(cur)
+            cur = line
+        else:
+            cur = cur + "\n" + line if cur else line
+    if cur:
+        parts.append(cur)
+    return parts
+
+
+class TelegramQueue(object):
+    """
+    طابور محدود + خيط إرسال واحد:
+      ● push() لا ينتظر أبداً (عند الامتلاء تُحذف أقدم رسالة)
+      ● الرسائل المتتالية تُدمج في رسالة واحدة ≤ 4096 حرف
+      ● TokenBucket لكل محادثة + احترام retry_after عند 429
+      ● إعادة محاولة بتأخير متزايد للأخطاء المؤقتة (شبكة / 5xx)
+      ● 400 (Markdown غير صالح بعد الدمج) → إعادة كنص عادي
+    """
+
+    def __init__(self, maxsize=TG_QUEUE_MAX):
+        # type: (int) -> None
+        self.q       = Queue(maxsize)   # type: Queue
+        self.limiter = TokenBucket(TG_PER_MIN, TG_BURST)
+        self.carry   = None             # type: Optional[Tuple[float, str]]
+        self.thread  = None             # type: Optional[threading.Thread]
+        self.pending = 0                # رسائل لم تُسلّم بعد
+        self._lock   = threading.Lock()
+        self._stop   = threading.Event()
+        # إحصائيات
+        self.sent = self.batches = self.dropped = self.failed = self.retries = 0
+        self.latency = deque(maxlen=500)   # ثوانٍ من push حتى التسليم
+        self._last_log = time.time()
+
+    def start(self):
+        # type: () -> None
+        with self._lock:
+            if self.thread is None or not self.thread.is_alive():
+                self._stop.clear()
+                self.thread = threading.Thread(target=self._loop, name="telegram",
+                                               daemon=True)
+                self.thread.start()
+
+    def push(self, msg):
+        # type: (str) -> None
+        item = (time.time(), msg)
+        with self._lock:
+            self.pending += 1
+        while True:
+            try:
+                self.q.put_nowait(item)
+                break
+            except Full:
+                try:
+                    self.q.get_nowait()
+                    with self._lock:
+                        self.pending -= 1
+                        self.dropped += 1
+                except Empty:
+                    pass
+        if self.thread is None:
+            self.start()
+
+    def _next(self, timeout):
+        # type: (float) -> Optional[Tuple[float, str]]
+        if self.carry is not None:
+            item, self.carry = self.carry, None
+            return item
+        try:
+            return self.q.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def _batch(self):
+        # type: () -> Optional[Tuple[List[float], str]]
+        """أول رسالة + ما يصل خلال TG_COALESCE_SEC ويتسع في نفس الرسالة."""
+        first = self._next(1.0)
+        if first is None:
+            return None
+        stamps, text = [first[0]], first[1]
+        deadline = time.time() + TG_COALESCE_SEC
+        while len(text) < TG_MAX_LEN:
+            item = self._next(max(deadline - time.time(), 0.0))
+            if item is None:
+                break
+            if len(text) + 2 + len(item[1]) > TG_MAX_LEN:
+                self.carry = item
+                break
+            stamps.append(item[0])
+            text += "\n\n" + item[1]
+        return stamps, text
+
+    def _post(self, text):
+        # type: (str) -> bool
+        """إرسال رسالة واحدة مع إعادة المحاولة. يرجع True عند النجاح."""
+        data = {"chat_id": CHAT_ID, "text": text, "parse_mode": "Markdown"}
+        delay = 1.0
+        for attempt in range(TG_RETRIES):
+            if attempt:
+                with self._lock:
+                    self.retries += 1
+            self.limiter.acquire()
+            try:
+                with timed("telegram_post"):
+                    r = tg_session.post(TG_API.format(TELEGRAM_TOKEN), data=data,
+                                        timeout=HTTP_TIMEOUT)
+            except requests.RequestException as e:
+                log.warning("Telegram: %s — إعادة بعد %.0fs", e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, TG_BACKOFF_MAX)
+                continue
+            if r.status_code == 200:
+                return True
+            if r.status_code == 429:
+                try:
+                    wait = float(r.json()["parameters"]["retry_after"])
+                except (ValueError, KeyError, TypeError):
+                    wait = delay
+                self.limiter.pause(wait)
+                log.warning("Telegram 429 — انتظار %.0fs", wait)
+                continue
+            if r.status_code == 400 and "parse_mode" in data:
+                data.pop("parse_mode")   # Markdown مكسور → نص عادي
+                continue
+            if r.status_code < 500:
+                log.error("Telegram %d: %s", r.status_code, r.text[:200])
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, TG_BACKOFF_MAX)
+        return False
+
+    def _loop(self):
+        # type: () -> None
+        while not self._stop.is_set():
+            batch = self._batch()
+            if batch is None:
+                continue
+            stamps, text = batch
+            ok = all([self._post(part) for part in split_message(text)])
+            now = time.time()
+            with self._lock:
+                self.pending -= len(stamps)
+                self.batches += 1
+                if ok:
+                    self.sent += len(stamps)
+                    self.latency.extend(now - t for t in stamps)
+                else:
+                    self.failed += len(stamps)
+            if now - self._last_log >= 60:
+                self._last_log = now
+                st = self.stats()
+                log.info("✉️ Telegram: %d رسالة في %d دفعة | طابور: %d | "
+                         "تأخير p50/max: %.1f/%.1fs | فشل: %d | محذوف: %d",
+                         st["sent"], st["batches"], st["queue"], st["latency_p50"],
+                         st["latency_max"], st["failed"], st["dropped"])
+
+    def flush(self, timeout=TG_FLUSH_SEC):
+        # type: (float) -> bool
+        """ينتظر تسليم كل الرسائل (عند الإيقاف). يرجع False عند انتهاء المهلة."""
+        deadline = time.time() + timeout
+        while self.pending > 0 and time.time() < deadline:
+            time.sleep(0.1)
+        return self.pending <= 0
+
+    def stop(self):
+        # type: () -> None
+        self._stop.set()
+
+    def stats(self):
+        # type: () -> Dict[str, float]
+        with self._lock:
+            lat = sorted(self.latency)
+            return {
+                "queue":       self.pending,
+                "sent":        self.sent,
+                "batches":     self.batches,
+                "failed":      self.failed,
+                "dropped":     self.dropped,
+                "retries":     self.retries,
+                "latency_p50": round(lat[len(lat) // 2], 2) if lat else 0.0,
+                "latency_p95": round(lat[int(len(lat) * 0.95)], 2) if lat else 0.0,
+                "latency_max": round(lat[-1], 2) if lat else 0.0,
+            }
+
+# ═══════════════════════════════════════════════
+#   HTTP SESSIONS — Pool لكل جهة + Retry + gzip
+# ═══════════════════════════════════════════════
+def make_session(pool_size, retries=0):
+    # type: (int, int) -> requests.Session
+    """
+    Session بـ Pool بحجم ثابت (اتصالات keep-alive يعاد استخدامها بدل
+    TLS handshake جديد لكل طلب) + إعادة تلقائية لأخطاء الشبكة و 5xx.
+    429/418 لا تُعاد هنا — safe_get يوقف api_limiter بدلها.
+    """
+    retry = Retry(
+        total=retries, connect=retries, read=retries, status=retries,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size,
+                          max_retries=retry, pool_block=False)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({
+        "User-Agent":      "MafioBot/10.0",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection":      "keep-alive",
+    })
+    return s
+
+
+def pool_stats(s):
+    # type: (requests.Session) -> Dict[str, int]
+    """اتصالات جديدة مقابل الطلبات عبر كل Pools الـ Session."""
+    conns = reqs = 0
+    for adapter in set(s.adapters.values()):
+        pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+        if pools is None:
+            continue
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                conns += pool.num_connections
+                reqs  += pool.num_requests
+    return {"conns": conns, "reqs": reqs}
+
+
+# ═══════════════════════════════════════════════
+#   METRICS — توقيت كل مرحلة + /metrics (Prometheus)
+# ═══════════════════════════════════════════════
+class Histogram(object):
+    """عدد + مجموع + آخر METRICS_RESERVOIR قياس (للـ quantiles)."""
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        # type: () -> None
+        self.count   = 0
+        self.total   = 0.0
+        self.samples = deque(maxlen=METRICS_RESERVOIR)
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)):
+        # type: (Tuple[float, ...]) -> List[float]
+        data = sorted(self.samples)
+        if not data:
+            return [0.0] * len(qs)
+        return [data[min(int(q * len(data)), len(data) - 1)] for q in qs]
+
+
+class Metrics(object):
+    """
+    قياسات بعائلتين: phase (مراحل الدورة) و api (كل endpoint).
+    observe() آمن بين الخيوط؛ render() بصيغة Prometheus (summary).
+    """
+    FAMILIES = {
+        "phase": ("mafio_phase_seconds", "phase", "مدة كل مرحلة في الدورة"),
+        "api":   ("mafio_api_seconds",  "endpoint", "مدة طلبات MEXC لكل endpoint"),
+    }
+
+    def __init__(self):
+        # type: () -> None
+        self.hists = {}   # type: Dict[Tuple[str, str], Histogram]
+        self._lock = threading.Lock()
+        self._last_log = time.time()
+
+    def observe(self, family, label, sec):
+        # type: (str, str, float) -> None
+        key = (family, label)
+        with self._lock:
+            h = self.hists.get(key)
+            if h is None:
+                h = self.hists[key] = Histogram()
+            h.count += 1
+            h.total += sec
+            h.samples.append(sec)
+
+    def render(self):
+        # type: () -> str
+        lines = []
+        with self._lock:
+            items = sorted(self.hists.items())
+            for family, (name, label, help_txt) in self.FAMILIES.items():
+                rows = [(k[1], h) for k, h in items if k[0] == family]
+                if not rows:
+                    continue
+                lines.append("# HELP {} {}".format(name, help_txt))
+                lines.append("# TYPE {} summary".format(name))
+                for lbl, h in rows:
+                    for q, v in zip(("0.5", "0.95", "0.99"), h.quantiles()):
+                        lines.append('{}{{{}="{}",quantile="{}"}} {:.6f}'.format(
+                            name, label, lbl, q, v))
+                    lines.append('{}_sum{{{}="{}"}} {:.6f}'.format(name, label, lbl, h.total))
+                    lines.append('{}_count{{{}="{}"}} {}'.format(name, label, lbl, h.count))
+        for name, value in gauges().items():
+            lines.append("# TYPE mafio_{} gauge".format(name))
+            lines.append("mafio_{} {}".format(name, value))
+        return "\n".join(lines) + "\n"
+
+    def maybe_log(self):
+        # type: () -> None
+        """ملخص دوري: p50/p95/p99 بالمللي ثانية لكل مرحلة."""
+        now = time.time()
+        if now - self._last_log < METRICS_LOG_EVERY:
+            return
+        self._last_log = now
+        with self._lock:
+            rows = [(k, h.count, h.quantiles()) for k, h in sorted(self.hists.items())]
+        for (family, label), n, (p50, p95, p99) in rows:
+            log.info("⏱️ %s:%-16s n=%-6d p50=%7.1fms p95=%7.1fms p99=%7.1fms",
+                     family, label, n, p50 * 1000, p95 * 1000, p99 * 1000)
+
+
+class _Timer(object):
+    __slots__ = ("family", "label", "t0")
+
+    def __init__(self, family, label):
+        # type: (str, str) -> None
+        self.family = family
+        self.label  = label
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        metrics.observe(self.family, self.label, time.perf_counter() - self.t0)
+        return False
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(label, family="phase"):
+    # type: (str, str) -> Any
+    """with timed("momentum"): ... — بدون تكلفة تقريباً عند تعطيل METRICS."""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(family, label)
+
+
+def gauges():
+    # type: () -> Dict[str, float]
+    """قيم لحظية تُعرض مع /metrics."""
+    api = api_limiter.stats()
+    tg  = tg_queue.stats()
+    return {
+        "tracked":            len(tracked),
+        "momentum_stages":    len(momentum_stage),
+        "candidates":         len(candidates),
+        "klines_cache":       len(klines_cache),
+        "klines_cache_bytes": klines_cache.nbytes,
+        "klines_cache_hits":  klines_cache.hits,
+        "klines_cache_misses": klines_cache.misses,
+        "klines_cache_evicted": klines_cache.evicted,
+        "klines_coalesced":   klines_flight.coalesced,
+        "api_budget":         api["budget"],
+        "api_waiting":        api["queue"],
+        "api_calls_total":    api_calls_total,
+        "market_sources":     len(sources),
+        "scan_queue":         len(scan_scheduler.heap),
+        "depth_cache_hits":   depth_cache.hits,
+        "depth_cache_misses": depth_cache.misses,
+        "depth_coalesced":    depth_cache.flight.coalesced,
+        "depth_books":        len(depth_stream.books) if depth_stream is not None else 0,
+        "scans_scheduled":    scan_scheduler.scanned,
+        "telegram_queue":     tg["queue"],
+        "telegram_sent":      tg["sent"],
+        "telegram_failed":    tg["failed"],
+        "telegram_latency_p95_seconds": tg["latency_p95"],
+    }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def start_metrics_server():
+    # type: () -> None
+    if not METRICS_ENABLED or METRICS_PORT <= 0:
+        return
+    try:
+        srv = ThreadingHTTPServer(("0.0.0.0", METRICS_PORT), _MetricsHandler)
+    except OSError as e:
+        log.error("📈 Metrics [%d]: %s", METRICS_PORT, e)
+        return
+    threading.Thread(target=srv.serve_forever, name="metrics", daemon=True).start()
+    log.info("📈 Metrics: http://0.0.0.0:%d/metrics", METRICS_PORT)
+
+
+# ═══════════════════════════════════════════════
+#   MARKET SNAPSHOT — تحليل ticker/24hr مرة واحدة
+# ═══════════════════════════════════════════════
+class MarketSnapshot(object):
+    """
+    صورة السوق في أعمدة NumPy مفهرسة بالرمز:
+      ● data: مصفوفة (5 × عملات) — price, change, vol, high, low
+      ● index: {symbol: رقم الصف}
+    تُبنى مرة واحدة لكل دورة — كل المستهلكين يقرؤون منها
+    بدل بناء قواميس وتحويل النصوص إلى float في كل دالة.
+    """
+    COLS   = ("price", "change", "vol", "high", "low")
+    FIELDS = ("lastPrice", "priceChangePercent", "quoteVolume", "highPrice", "lowPrice")
+    __slots__ = ("symbols", "index", "data", "price", "change", "vol",
+                 "high", "low", "ts")
+
+    def __init__(self, symbols, data, ts=None, index=None):
+        # type: (List[str], np.ndarray, Optional[float], Optional[Dict[str, int]]) -> None
+        self.symbols = symbols
+        # index جاهز (نفس قائمة الرموز) = بدون إعادة بناء القاموس — للـ replay
+        self.index   = {s: i for i, s in enumerate(symbols)} if index is None else index
+        self.ts      = time.time() if ts is None else ts
+        self._set_data(data)
+
+    def _set_data(self, data):
+        # type: (np.ndarray) -> None
+        self.data = data
+        self.price, self.change, self.vol, self.high, self.low = data
+
+    @classmethod
+    def from_tickers(cls, raw):
+        # type: (List[Dict]) -> MarketSnapshot
+        """رد ticker/24hr → صورة. الصف الناقص أو التالف يُتجاهل."""
+        symbols = []
+        rows    = []
+        for t in raw:
+            try:
+                rows.append((float(t["lastPrice"]), float(t["priceChangePercent"]),
+                             float(t["quoteVolume"]), float(t["highPrice"]),
+                             float(t["lowPrice"])))
+            except (KeyError, ValueError, TypeError):
+                continue
+            symbols.append(t.get("symbol", ""))
+        data = np.array(rows, dtype=np.float64).T if rows else np.zeros((5, 0))
+        return cls(symbols, data)
+
+    @classmethod
+    def from_records(cls, rows):
+        # type: (List[Any]) -> MarketSnapshot
+        """صفوف TickerRow (أرقام جاهزة) → صورة."""
+        if not rows:
+            return cls.empty()
+        data = np.array([(r.lastPrice, r.priceChangePercent, r.quoteVolume,
+                          r.highPrice, r.lowPrice) for r in rows], dtype=np.float64).T
+        return cls([r.symbol for r in rows], data)
+
+    @classmethod
+    def from_columns(cls, raw):
+        # type: (List[Dict]) -> MarketSnapshot
+        """
+        مثل from_tickers لكن التحويل عمود كامل في NumPy (بدون float() لكل حقل).
+        أي صف ناقص/تالف يرفع خطأ — المستدعي يرجع إلى from_tickers.
+        """
+        if not raw:
+            return cls.empty()
+        data = np.array([[t[f] for t in raw] for f in cls.FIELDS], dtype=np.float64)
+        # None يتحول إلى NaN بصمت هنا — from_tickers يتجاهل الصف بدلها
+        if np.isnan(data).any():
+            raise ValueError("NaN")
+        return cls([t.get("symbol", "") for t in raw], data)
+
+    @classmethod
+    def empty(cls):
+        # type: () -> MarketSnapshot
+        return cls([], np.zeros((5, 0)), ts=0.0)
+
+    @classmethod
+    def concat(cls, parts):
+        # type: (List[Tuple[str, MarketSnapshot]]) -> MarketSnapshot
+        """صور عدة مصادر → صورة واحدة. كل جزء (بادئة الرموز, صورة) — الوقت من الأول."""
+        if len(parts) == 1 and not parts[0][0]:
+            return parts[0][1]
+        symbols = [pre + s if pre else s for pre, snap in parts for s in snap.symbols]
+        data = np.concatenate([snap.data for _, snap in parts], axis=1)
+        return cls(symbols, data, ts=parts[0][1].ts)
+
+    def copy(self):
+        # type: () -> MarketSnapshot
+        snap = MarketSnapshot.__new__(MarketSnapshot)
+        snap.symbols = list(self.symbols)
+        snap.index   = dict(self.index)
+        snap.ts      = self.ts
+        snap._set_data(self.data.copy())
+        return snap
+
+    def update(self, rows):
+        # type: (List[Tuple[str, float, float, float, float, float]]) -> None
+        """تحديث في المكان (للـ Stream) — الرموز الجديدة تُضاف في النهاية."""
+        new = []
+        for row in rows:
+            r = self.index.get(row[0])
+            if r is None:
+                new.append(row)
+            else:
+                self.data[:, r] = row[1:]
+        if new:
+            for row in new:
+                self.index[row[0]] = len(self.symbols)
+                self.symbols.append(row[0])
+            extra = np.array([row[1:] for row in new], dtype=np.float64).T
+            self._set_data(np.concatenate([self.data, extra], axis=1))
+        self.ts = time.time()
+
+    def changed(self, prev):
+        # type: (Optional[MarketSnapshot]) -> Set[str]
+        """
+        الدلتا: رموز تغير سعرها أو حجمها منذ prev (+ الرموز الجديدة).
+        بدون prev = كل الرموز.
+        """
+        if prev is None or not len(prev):
+            return set(self.symbols)
+        if prev.symbols == self.symbols:
+            diff = (self.price != prev.price) | (self.vol != prev.vol)
+        else:
+            pos  = np.fromiter((prev.index.get(s, -1) for s in self.symbols),
+                               dtype=np.int64, count=len(self.symbols))
+            old  = np.maximum(pos, 0)
+            diff = (pos < 0) | (self.price != prev.price[old]) | (self.vol != prev.vol[old])
+        syms = self.symbols
+        return {syms[r] for r in np.flatnonzero(diff).tolist()}
+
+    def get(self, col, sym, default=0.0):
+        # type: (str, str, float) -> float
+        r = self.index.get(sym)
+        return default if r is None else float(getattr(self, col)[r])
+
+    def as_map(self, col):
+        # type: (str) -> Dict[str, float]
+        return dict(zip(self.symbols, getattr(self, col).tolist()))
+
+    def __contains__(self, sym):
+        return sym in self.index
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+if msgspec is not None:
+    class TickerRow(msgspec.Struct):
+        """الحقول التي يقرؤها البوت فقط — الباقي يُتخطى أثناء التحليل."""
+        symbol:             str
+        lastPrice:          float
+        priceChangePercent: float
+        quoteVolume:        float
+        highPrice:          float
+        lowPrice:           float
+
+    # strict=False: MEXC ترسل الأرقام كنصوص ("1.23") — تُحوّل أثناء التحليل
+    _ticker_decoder = msgspec.json.Decoder(List[TickerRow], strict=False) if FAST_JSON else None
+else:
+    _ticker_decoder = None
+
+json_loads = orjson.loads if orjson is not None and FAST_JSON else json.loads
+
+
+def decode_tickers(body):
+    # type: (bytes) -> MarketSnapshot
+    """
+    رد ticker/24hr الخام → MarketSnapshot مباشرة:
+      ● msgspec: تحليل إلى TickerRow — الأرقام محوّلة والحقول الأخرى متخطاة
+      ● غير ذلك: json_loads + تحويل الأعمدة في NumPy
+      ● أي صف ناقص أو تالف: المسار العادي (from_tickers) — نفس النتيجة دائماً
+    """
+    if _ticker_decoder is not None:
+        try:
+            return MarketSnapshot.from_records(_ticker_decoder.decode(body))
+        except msgspec.MsgspecError:
+            pass
+    raw = json_loads(body)
+    if FAST_JSON and isinstance(raw, list):
+        try:
+            return MarketSnapshot.from_columns(raw)
+        except (KeyError, ValueError, TypeError, AttributeError):
+            pass
+    return MarketSnapshot.from_tickers(raw)
+
+
+# ═══════════════════════════════════════════════
+#   SECTOR INDEX — رمز → قطاعات (بدل البحث في القوائم)
+# ═══════════════════════════════════════════════
+class SectorIndex(object):
+    """
+    فهرس عكسي للقطاعات + تجميع كل القطاعات في مرور واحد:
+      ● of[sym]: القطاعات التي تحتوي الرمز (بترتيب SECTORS)
+      ● aggregate(snap): متوسط التغيير / نسبة الصاعدة / الحجم / الأعلى صعوداً
+        لكل القطاعات عبر np.bincount — يتحمل ملفات بآلاف الرموز
+    """
+
+    def __init__(self, sectors):
+        # type: (Dict[str, List[str]]) -> None
+        self._lock = threading.Lock()
+        self.load(sectors)
+
+    def load(self, sectors):
+        # type: (Dict[str, List[str]]) -> None
+        with self._lock:
+            self.names = list(sectors)
+            self.of    = {}   # type: Dict[str, Tuple[str, ...]]
+            # أزواج (رمز, قطاع) بترتيب القوائم — الجمع يبقى بنفس الترتيب القديم
+            self._pairs = [(sym, i) for i, name in enumerate(self.names)
+                           for sym in sectors[name]]
+            for sym, i in self._pairs:
+                if self.names[i] not in self.of.get(sym, ()):
+                    self.of[sym] = self.of.get(sym, ()) + (self.names[i],)
+            self._symbols = None   # type: Optional[List[str]]
+            self._rows = self._ids = np.zeros(0, dtype=int)
+
+    def first(self, sym, among=None):
+        # type: (str, Optional[Any]) -> str
+        """أول قطاع للرمز (بين among إذا حُددت) أو ""."""
+        for s in self.of.get(sym, ()):
+            if among is None or s in among:
+                return s
+        return ""
+
+    def _membership(self, snap):
+        # type: (MarketSnapshot) -> Tuple[np.ndarray, np.ndarray]
+        with self._lock:
+            if snap.symbols != self._symbols:
+                pairs = [(snap.index[sym], i) for sym, i in self._pairs
+                         if sym in snap.index]
+                self._rows = np.array([p[0] for p in pairs], dtype=int)
+                self._ids  = np.array([p[1] for p in pairs], dtype=int)
+                self._symbols = list(snap.symbols)
+            return self._rows, self._ids
+
+    def aggregate(self, snap, top_n=3):
+        # type: (MarketSnapshot, int) -> Dict[str, Dict[str, Any]]
+        rows, ids = self._membership(snap)
+        n = len(self.names)
+        ch  = snap.change[rows]
+        vol = snap.vol[rows]
+        count  = np.bincount(ids, minlength=n)
+        sum_ch = np.bincount(ids, weights=ch,  minlength=n)
+        n_up   = np.bincount(ids, weights=ch > 0, minlength=n)
+        tot_v  = np.bincount(ids, weights=vol, minlength=n)
+
+        # الأعلى صعوداً: ترتيب (قطاع, -تغيير, ترتيب القائمة) ثم أول top_n
+        up    = np.flatnonzero(ch > 0)
+        order = up[np.lexsort((up, -ch[up], ids[up]))]
+        top   = {}   # type: Dict[int, List[Tuple[str, float]]]
+        for k in order.tolist():
+            lst = top.setdefault(int(ids[k]), [])
+            if len(lst) < top_n:
+                lst.append((symbol_index.get(snap.symbols[rows[k]]).base, float(ch[k])))
+
+        out = {}
+        for i in np.flatnonzero(count).tolist():
+            out[self.names[i]] = {
+                "avg":        float(sum_ch[i]) / int(count[i]),
+                "rising_pct": float(n_up[i]) / int(count[i]) * 100,
+                "total_vol":  float(tot_v[i]),
+                "top":        top.get(i, []),
+            }
+        return out
+
+
+def load_sector_file(path):
+    # type: (str) -> int
+    """
+    يدمج ملف قطاعات في SECTORS ويعيد بناء الفهارس.
+    يرجع عدد الرموز المحملة (0 عند الفشل).
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            if path.lower().endswith(".json"):
+                extra = {k: [str(s).upper() for s in v] for k, v in json.load(f).items()}
+            else:
+                extra = {}
+                for line in f:
+                    parts = [p.strip() for p in line.split(",")]
+                    if len(parts) < 2 or not parts[0] or parts[0].lower() == "symbol":
+                        continue
+                    extra.setdefault(parts[1], []).append(parts[0].upper())
+    except (OSError, ValueError, AttributeError) as e:
+        log.error("SECTORS_FILE [%s]: %s", path, e)
+        return 0
+
+    SECTORS.update(extra)
+    sector_index.load(SECTORS)
+    symbol_index.invalidate()
+    n = sum(len(v) for v in extra.values())
+    log.info("🗂️ Sectors: %d قطاع من الملف (%d رمز) | المجموع: %d قطاع",
+             len(extra), n, len(SECTORS))
+    return n
+
+
+# ═══════════════════════════════════════════════
+#   SYMBOL INDEX — تصنيف كل رمز مرة واحدة
+# ═══════════════════════════════════════════════
+SymbolMeta = namedtuple("SymbolMeta", [
+    "quote",        # عملة التسعير (USDT / USDC / ...) أو ""
+    "base",         # الاسم بدون USDT — نفس sym.replace("USDT", "")
+    "stable",       # base في STABLECOINS
+    "stable_like",  # stable أو اسم يبدأ/ينتهي بكلمة من STABLE_KEYWORDS
+    "leveraged",    # يحتوي كلمة من LEVERAGE_KEYWORDS
+    "excluded",     # في EXCLUDED
+    "sector",       # أول قطاع يحتوي الرمز أو ""
+    "eligible",     # USDT + ليس stable + ليس رافعة + ليس مستبعد
+])
+
+
+def classify_symbol(sym):
+    # type: (str) -> SymbolMeta
+    sym    = sym.rpartition(":")[2]   # "اسم:رمز" من مصدر إضافي → نفس تصنيف الرمز
+    base   = sym.replace("USDT", "")
+    quote  = next((q for q in QUOTE_ASSETS if sym.endswith(q)), "")
+    stable = base in STABLECOINS
+    stable_like = stable or any(base.startswith(kw) or base.endswith(kw)
+                                for kw in STABLE_KEYWORDS)
+    leveraged = any(k in sym for k in LEVERAGE_KEYWORDS)
+    excluded  = sym in EXCLUDED
+    sector    = sector_index.first(sym)
+    return SymbolMeta(quote, base, stable, stable_like, leveraged, excluded, sector,
+                      quote == "USDT" and not stable and not leveraged and not excluded)
+
+
+class SymbolIndex(object):
+    """
+    فهرس تصنيف الرموز:
+      ● get(sym): SymbolMeta من الذاكرة — التصنيف (بحث نصي) مرة واحدة فقط
+      ● masks(snap): أعمدة bool بنفس ترتيب صفوف الصورة — للفلاتر الدفعية
+        تُعاد بناؤها فقط عندما تتغير قائمة رموز البورصة
+    """
+
+    def __init__(self):
+        self.meta     = {}      # type: Dict[str, SymbolMeta]
+        self._symbols = None    # type: Optional[List[str]]
+        self._masks   = {}      # type: Dict[str, np.ndarray]
+        self._lock    = threading.Lock()
+
+    def get(self, sym):
+        # type: (str) -> SymbolMeta
+        m = self.meta.get(sym)
+        if m is None:
+            m = self.meta[sym] = classify_symbol(sym)
+        return m
+
+    def invalidate(self):
+        # type: () -> None
+        """بعد تغيير SECTORS / القوائم — كل الرموز تُصنف من جديد."""
+        with self._lock:
+            self.meta     = {}
+            self._symbols = None
+
+    def masks(self, snap):
+        # type: (MarketSnapshot) -> Dict[str, np.ndarray]
+        with self._lock:
+            if snap.symbols != self._symbols:
+                old = self.meta
+                self.meta = {s: old.get(s) or classify_symbol(s) for s in snap.symbols}
+                metas = [self.meta[s] for s in snap.symbols]
+                col = lambda f: np.fromiter((f(m) for m in metas), dtype=bool,
+                                            count=len(metas))
+                self._masks = {
+                    "eligible": col(lambda m: m.eligible),
+                    # Smart Money: كل أزواج USDT ما عدا Stablecoins
+                    "breadth":  col(lambda m: m.quote == "USDT" and not m.stable),
+                }
+                self._symbols = list(snap.symbols)
+            return self._masks
+
 
 # ═══════════════════════════════════════════════
 #                   STATE
@@ -211,11 +1254,12 @@ sector_vol_history = {}    # type: Dict[str, float]
 
 # قائمة العملات المرشحة (بعد الفلتر المسبق)
 candidates     = []        # type: List[str]
-changes_map    = {}        # type: Dict[str, float]
-all_tickers    = []        # type: List[Dict]
+# صورة السوق الحالية — تُستبدل (لا تُعدّل) كل دورة، آمنة للقراءة من أي خيط
+market_snapshot = MarketSnapshot.empty()  # type: MarketSnapshot
+symbol_index    = SymbolIndex()
+sector_index    = SectorIndex(SECTORS)
 
-# Cache الشموع: {symbol_interval: (data, timestamp)}
-klines_cache   = {}        # type: Dict[str, Tuple[Dict, float]]
+# Cache الشموع: klines_cache (KlineCache — في SMART CACHE)
 
 # توقيتات آخر تشغيل
 last_tickers      = 0.0
@@ -225,6 +1269,7 @@ last_deep_scan    = 0.0
 last_stale        = 0.0
 last_report       = 0.0
 last_smart_money  = 0.0
+last_state_save   = 0.0
 
 # Smart Money — تاريخ حجم Stablecoins
 stable_vol_history = {}   # type: Dict[str, List[float]]
@@ -232,19 +1277,40 @@ smart_money_alert  = False
 
 # 🆕 Momentum Detector — تتبع الأسعار اللحظية
 price_prev         = {}   # type: Dict[str, float]  السعر السابق
+price_prev_ts      = {}   # type: Dict[str, float]  وقت تسجيل السعر السابق
 momentum_alerted   = {}   # type: Dict[str, float]  آخر تنبيه {sym: time}
 
 # 🆕 نظام الإشعارات الثلاثي
 # {sym: {stage, entry_price, entry_vol, entry_time, alerted_2, alerted_3}}
 momentum_stage     = {}   # type: Dict[str, Dict]
 
+# الدلتا — كل دورة تفحص فقط ما تغير منذ آخر صورة
+delta_snapshot     = None  # type: Optional[MarketSnapshot]  آخر صورة REST فُحصت
+last_tracked_check = 0.0   # آخر فحص Trailing/Progression
+
 # إحصائيات API (لمراقبة الاستخدام)
 api_calls_total    = 0
 api_calls_minute   = 0
 api_minute_reset   = time.time()
+api_lock           = threading.Lock()
+
+# Deep Scan في الخلفية — حلقة الأسعار لا تنتظره
+# state_lock يحمي tracked / discovered / momentum_stage بين الخيوط
+state_lock         = threading.RLock()
+scan_pool          = ThreadPoolExecutor(max_workers=SCAN_WORKERS,
+                                        thread_name_prefix="scan")
+scan_thread        = None  # type: Optional[threading.Thread]
+
+# ميزانية الوزن لكل طلبات MEXC + ميزانية/ثانية خاصة بخيوط الـ Scan
+api_limiter        = TokenBucket(API_WEIGHT_PER_MIN, API_WEIGHT_BURST)
+scan_limiter       = TokenBucket(SCAN_MAX_RPS * 60, max(SCAN_MAX_RPS, 1))
 
-session = requests.Session()
-session.headers.update({"User-Agent": "MafioBot/10.0"})
+mexc_session       = make_session(HTTP_POOL_MEXC, HTTP_RETRIES)
+tg_session         = make_session(HTTP_POOL_TG)   # الطابور يعيد المحاولة بنفسه
+http_prev          = {"conns": 0, "reqs": 0}      # لحساب إعادة الاستخدام/دقيقة
+
+tg_queue           = TelegramQueue()
+metrics            = Metrics()
 
 
 # ═══════════════════════════════════════════════
@@ -261,96 +1327,847 @@ def format_price(p):
 
 def send(msg):
     # type: (str) -> None
+    """يضع الرسالة في طابور Telegram ويرجع فوراً (لا ينتظر الشبكة)."""
     if "YOUR" in TELEGRAM_TOKEN:
         return
-    try:
-        session.post(
-            "https://api.telegram.org/bot{}/sendMessage".format(TELEGRAM_TOKEN),
-            data={"chat_id": CHAT_ID, "text": msg, "parse_mode": "Markdown"},
-            timeout=10,
-        )
-    except Exception as e:
-        log.error("Telegram: %s", e)
+    with timed("send"):
+        tg_queue.push(msg)
 
 
-def safe_get(url, params=None):
-    # type: (str, Optional[dict]) -> Optional[Any]
+def safe_get(url, params=None, decode=None, limiter=None, session=None, weight=None,
+             record=None):
+    # type: (str, Optional[dict], Optional[Any], Optional[TokenBucket], Optional[Any], Optional[int], Optional[bool]) -> Optional[Any]
+    """
+    كل طلبات MEXC تمر من هنا:
+    الوزن يُحجز من api_limiter قبل الإرسال — الطلب ينتظر بدل أن يسبب 429.
+    decode: دالة bytes → نتيجة (مثل decode_tickers) بدل json_loads.
+    limiter / session: ميزانية و Pool مصدر إضافي (MexcSource) بدل العامة.
+    record: تسجيل الرد للـ Recorder (None = حسب RECORD_ENDPOINTS).
+    """
     global api_calls_total, api_calls_minute, api_minute_reset
+    endpoint = url.split("/")[-1]
+    limiter  = limiter or api_limiter
+    with timed("api_wait"):
+        limiter.acquire(request_weight(url, params) if weight is None else weight)
     try:
-        r = session.get(url, params=params, timeout=10)
+        with timed(endpoint, "api"):
+            r = (session or mexc_session).get(url, params=params, timeout=HTTP_TIMEOUT)
+        if r.status_code in (418, 429):
+            # حظر مؤقت — نوقف كل طلبات هذا المصدر حتى ينتهي
+            try:
+                pause = float(r.headers.get("Retry-After", API_BAN_PAUSE))
+            except ValueError:
+                pause = API_BAN_PAUSE
+            limiter.pause(pause)
+            log.warning("⛔ API %d [%s] — إيقاف %.0fs",
+                        r.status_code, endpoint, pause)
+            return None
         r.raise_for_status()
-        api_calls_total  += 1
-        api_calls_minute += 1
-        # إعادة تعيين عداد الدقيقة
-        if time.time() - api_minute_reset >= 60:
-            log.info("📡 API: %d طلب/دقيقة | إجمالي: %d",
-                     api_calls_minute, api_calls_total)
-            api_calls_minute = 0
-            api_minute_reset = time.time()
-        return r.json()
+        with api_lock:
+            api_calls_total  += 1
+            api_calls_minute += 1
+            # إعادة تعيين عداد الدقيقة
+            if time.time() - api_minute_reset >= 60:
+                st = api_limiter.stats()
+                ps = pool_stats(mexc_session)
+                reqs  = ps["reqs"] - http_prev["reqs"]
+                conns = ps["conns"] - http_prev["conns"]
+                http_prev.update(ps)
+                log.info("📡 API: %d طلب/دقيقة | إجمالي: %d | رصيد: %.0f | طابور: %d | "
+                         "اتصالات جديدة: %d | إعادة استخدام: %.0f%%",
+                         api_calls_minute, api_calls_total, st["budget"], st["queue"],
+                         conns, (1 - conns / reqs) * 100 if reqs else 100.0)
+                api_calls_minute = 0
+                api_minute_reset = time.time()
+        with timed("json_decode"):
+            data = (decode or json_loads)(r.content)
+        if recorder is not None and (url in RECORD_ENDPOINTS if record is None else record):
+            recorder.response(url, params, data)
+        return data
     except Exception as e:
-        log.debug("API خطأ [%s]: %s", url.split("/")[-1], e)
+        log.debug("API خطأ [%s]: %s", endpoint, e)
+        return None
+
+
+class SingleFlight(object):
+    """
+    طلب واحد لكل مفتاح في نفس اللحظة: أول مستدعٍ ينفذ fn والباقون
+    ينتظرون نفس النتيجة (أو نفس الاستثناء) بدل طلبات مكررة.
+    """
+
+    def __init__(self):
+        self.coalesced = 0    # مستدعون انتظروا طلباً جارياً بدل طلب جديد
+        self._calls    = {}   # type: Dict[Any, Future]
+        self._lock     = threading.Lock()
+
+    def do(self, key, fn, *args):
+        # type: (Any, Any, Any) -> Any
+        with self._lock:
+            fut    = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result()
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return fut.result()
+
+
+# ═══════════════════════════════════════════════
+#   MARKET SOURCES — واجهة موحدة لكل منصة (MEXC / ملفات محلية)
+# ═══════════════════════════════════════════════
+def depth_side(rows):
+    # type: (List[Any]) -> List[Tuple[float, float]]
+    """[[سعر, كمية, ...], ...] (نصوص MEXC أو أرقام) → أزواج float."""
+    return [(float(p), float(q)) for p, q, *_ in rows]
+
+
+class MarketSource(object):
+    """
+    مصدر بيانات السوق — كل منصة تنفذ نفس الواجهة بالرموز الأصلية للمنصة:
+      ● tickers()                  → MarketSnapshot لكل السوق
+      ● ticker(symbol)             → (السعر, التغير 24h%) لعملة واحدة
+      ● klines(symbol, interval, limit, start=None) → صفوف [openTime, o, h, l, c, v, ...]
+      ● depth(symbol, limit)       → (bids, asks) كأزواج (سعر, كمية)
+      ● stream(on_update) / depth_stream() → بث WebSocket أو None (REST فقط)
+      ● pace()                     → انتظار دور طلبات الـ Scan لهذا المصدر
+    أي فشل = None — المستدعي يتصرف كما مع safe_get.
+    """
+    kind = ""
+
+    def __init__(self, name):
+        # type: (str) -> None
+        self.name = name
+
+    def tickers(self):
+        # type: () -> Optional[MarketSnapshot]
+        return None
+
+    def ticker(self, symbol):
+        # type: (str) -> Optional[Tuple[float, float]]
+        return None
+
+    def klines(self, symbol, interval, limit, start=None):
+        # type: (str, str, int, Optional[int]) -> Optional[List[Any]]
+        return None
+
+    def depth(self, symbol, limit):
+        # type: (str, int) -> Optional[Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]]
+        return None
+
+    def stream(self, on_update):
+        # type: (Any) -> Optional[MarketStream]
+        return None
+
+    def depth_stream(self):
+        # type: () -> Optional[DepthStream]
         return None
 
+    def pace(self):
+        # type: () -> None
+        pass
+
+
+class MexcSource(MarketSource):
+    """
+    MEXC أو أي خادم بنفس الـ API (مثل replay_http.py).
+      ● الأساسي: limiter/session = None → api_limiter / scan_limiter / mexc_session
+        العامة (backtest و bench يستبدلونها) + الردود تُسجل للـ Recorder
+        (بأوزان MEXC حتى مع base مخصص)
+      ● الإضافي: ميزانية وزن و Pool اتصالات خاصة — لا يأكل من رصيد MEXC
+    """
+    kind = "mexc"
+
+    def __init__(self, name, base=MEXC_BASE, ws_url=None, primary=True):
+        # type: (str, str, Optional[str], bool) -> None
+        MarketSource.__init__(self, name)
+        self.base       = base.rstrip("/")
+        self.url_24h    = self.base + MEXC_24H[len(MEXC_BASE):]
+        self.url_klines = self.base + MEXC_KLINES[len(MEXC_BASE):]
+        self.url_depth  = self.base + MEXC_DEPTH[len(MEXC_BASE):]
+        self.weights    = {self.url_24h:    API_WEIGHTS[MEXC_24H],
+                           self.url_klines: API_WEIGHTS[MEXC_KLINES],
+                           self.url_depth:  API_WEIGHTS[MEXC_DEPTH]}
+        self.ws_url     = ws_url
+        self.record     = (self.url_klines, self.url_depth) if primary else ()
+        self.limiter    = None if primary else TokenBucket(SOURCE_WEIGHT_PER_MIN, API_WEIGHT_BURST)
+        self.scan       = None if primary else TokenBucket(SCAN_MAX_RPS * 60, max(SCAN_MAX_RPS, 1))
+        self.session    = None if primary else make_session(HTTP_POOL_MEXC, HTTP_RETRIES)
+
+    def _get(self, url, params=None, decode=None):
+        # type: (str, Optional[dict], Optional[Any]) -> Optional[Any]
+        return safe_get(url, params, decode, limiter=self.limiter, session=self.session,
+                        weight=request_weight(url, params, self.weights),
+                        record=url in self.record)
+
+    def tickers(self):
+        # type: () -> Optional[MarketSnapshot]
+        return self._get(self.url_24h, decode=decode_tickers)
+
+    def ticker(self, symbol):
+        # type: (str) -> Optional[Tuple[float, float]]
+        data = self._get(self.url_24h, {"symbol": symbol})
+        try:
+            return float(data["lastPrice"]), float(data["priceChangePercent"])
+        except (KeyError, ValueError, TypeError):
+            return None
+
+    def klines(self, symbol, interval, limit, start=None):
+        # type: (str, str, int, Optional[int]) -> Optional[List[Any]]
+        params = {"symbol": symbol, "interval": interval}
+        if start is not None:
+            params["startTime"] = int(start)   # تحديث تراكمي من آخر شمعة
+        params["limit"] = limit
+        return self._get(self.url_klines, params)
+
+    def depth(self, symbol, limit):
+        # type: (str, int) -> Optional[Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]]
+        data = self._get(self.url_depth, {"symbol": symbol, "limit": limit})
+        if not data: return None
+        try:
+            return depth_side(data.get("bids", [])), depth_side(data.get("asks", []))
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def stream(self, on_update):
+        # type: (Any) -> Optional[MarketStream]
+        return MarketStream(self.ws_url, STREAM_CHANNEL, on_update) if self.ws_url else None
+
+    def depth_stream(self):
+        # type: () -> Optional[DepthStream]
+        return DepthStream(self.ws_url) if self.ws_url else None
+
+    def pace(self):
+        # type: () -> None
+        (self.scan or scan_limiter).acquire()
+
+
+class FileSource(MarketSource):
+    """
+    ملفات محلية بصيغ ردود MEXC نفسها (نفس مجلد replay_http.py) — بدون شبكة:
+      ● tickers.json  — رد ticker/24hr كامل (يُعاد تحميله عند تغير الملف)
+      ● tickers.jsonl — بديل للـ replay: رد كامل في كل سطر، كل استدعاء = السطر التالي
+      ● klines/<SYMBOL>_<interval>.json | depth/<SYMBOL>.json
+    """
+    kind = "file"
+
+    def __init__(self, name, path):
+        # type: (str, str) -> None
+        MarketSource.__init__(self, name)
+        self.path    = path
+        self._snap   = None   # type: Optional[MarketSnapshot]
+        self._mtime  = None   # type: Optional[float]
+        self._frames = None   # type: Optional[List[bytes]]
+        self._pos    = 0
+        self._lock   = threading.Lock()
+
+    def _read(self, *parts):
+        # type: (str) -> Optional[Any]
+        try:
+            with open(os.path.join(self.path, *parts), "rb") as f:
+                return json_loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _load(self):
+        # type: () -> Optional[MarketSnapshot]
+        frames = os.path.join(self.path, "tickers.jsonl")
+        if self._frames is None and os.path.exists(frames):
+            with open(frames, "rb") as f:
+                self._frames = [line for line in f.read().splitlines() if line.strip()]
+        if self._frames:
+            body = self._frames[self._pos % len(self._frames)]
+            self._pos += 1
+            return decode_tickers(body)
+        name = os.path.join(self.path, "tickers.json")
+        mtime = os.path.getmtime(name)
+        if mtime != self._mtime or self._snap is None:
+            with open(name, "rb") as f:
+                snap = decode_tickers(f.read())
+            self._mtime = mtime
+            return snap
+        return self._snap
+
+    def tickers(self):
+        # type: () -> Optional[MarketSnapshot]
+        with self._lock:
+            try:
+                self._snap = self._load()
+            except (OSError, ValueError, TypeError) as e:
+                log.debug("مصدر [%s]: %s", self.name, e)
+                return None
+            snap = self._snap.copy()
+        snap.ts = time.time()
+        return snap
+
+    def ticker(self, symbol):
+        # type: (str) -> Optional[Tuple[float, float]]
+        snap = self._snap or self.tickers()
+        if snap is None or symbol not in snap:
+            return None
+        return snap.get("price", symbol), snap.get("change", symbol)
+
+    def klines(self, symbol, interval, limit, start=None):
+        # type: (str, str, int, Optional[int]) -> Optional[List[Any]]
+        rows = self._read("klines", "{}_{}.json".format(symbol, interval))
+        if not isinstance(rows, list):
+            return None
+        if start is not None:
+            return [r for r in rows if r[0] >= start][:limit]
+        return rows[-limit:]
+
+    def depth(self, symbol, limit):
+        # type: (str, int) -> Optional[Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]]
+        data = self._read("depth", symbol + ".json")
+        if not data: return None
+        try:
+            return depth_side(data.get("bids", [])[:limit]), depth_side(data.get("asks", [])[:limit])
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+
+def build_sources(spec):
+    # type: (str) -> List[MarketSource]
+    """
+    MARKET_SOURCES → قائمة المصادر (الأول = الأساسي):
+      "mexc" | "اسم=mexc:URL" | "اسم=file:مجلد"
+    """
+    out = []   # type: List[MarketSource]
+    for item in (x.strip() for x in spec.split(",")):
+        if not item:
+            continue
+        name, _, target = item.partition("=")
+        kind, _, loc = (target or name).partition(":")
+        primary = not out
+        if kind == "mexc":
+            # base مخصص (مثل replay_http.py) لا يملك WebSocket MEXC — إلا إن حُدد MEXC_WS_URL
+            ws = MEXC_WS if primary and (not loc or os.getenv("MEXC_WS_URL")) else None
+            out.append(MexcSource(name, loc or MEXC_BASE, ws, primary))
+        elif kind == "file" and loc:
+            out.append(FileSource(name, loc))
+        else:
+            log.warning("⚠️ مصدر غير معروف: %s", item)
+    return out or [MexcSource("mexc", ws_url=MEXC_WS)]
+
+
+def source_for(symbol):
+    # type: (str) -> Tuple[MarketSource, str]
+    """"اسم:رمز" → (المصدر, الرمز الأصلي). بدون بادئة = المصدر الأساسي."""
+    name, sep, raw = symbol.partition(":")
+    if sep and name in source_map:
+        return source_map[name], raw
+    return sources[0], symbol
+
+
+def fetch_market(base=None):
+    # type: (Optional[MarketSnapshot]) -> Optional[MarketSnapshot]
+    """
+    صورة السوق من كل المصادر بالتوازي — كل مصدر ينتظر ميزانيته فقط.
+    base: صورة الأساسي جاهزة (من الـ Stream) فلا يُطلب مرة أخرى.
+    فشل الأساسي = None (الدورة تُعاد) | فشل مصدر إضافي = آخر صورة له (حتى SOURCE_STALE_SEC).
+    """
+    todo = sources if base is None else sources[1:]
+    if not todo:
+        return base
+    if len(todo) == 1 and base is None:
+        return todo[0].tickers()   # مصدر واحد: بدون خيوط
+    futs = [source_pool.submit(src.tickers) for src in todo]
+    for src, fut in zip(todo, futs):
+        snap = fut.result()
+        if src is sources[0]:
+            base = snap
+        elif snap is not None:
+            # البادئة مرة واحدة هنا — الدمج مع كل رسالة Stream بدون إعادة تسمية
+            source_parts[src.name] = MarketSnapshot.concat([(src.name + ":", snap)])
+        else:
+            log.debug("مصدر [%s]: لا بيانات", src.name)
+    return None if base is None else merge_sources(base)
+
+
+def secondary_snapshot():
+    # type: () -> Optional[MarketSnapshot]
+    """آخر صور المصادر الإضافية مدموجة (رموز "اسم:رمز") — None بدونها."""
+    now   = time.time()
+    parts = [("", source_parts[src.name]) for src in sources[1:]
+             if src.name in source_parts
+             and now - source_parts[src.name].ts < SOURCE_STALE_SEC]
+    return MarketSnapshot.concat(parts) if parts else None
+
+
+def merge_sources(base):
+    # type: (MarketSnapshot) -> MarketSnapshot
+    """صورة الأساسي (REST أو Stream) + آخر صور المصادر الإضافية."""
+    extra = secondary_snapshot()
+    return base if extra is None else MarketSnapshot.concat([("", base), ("", extra)])
+
+
+sources      = build_sources(MARKET_SOURCES)
+source_map   = {src.name: src for src in sources[1:]}
+source_pool  = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="source")
+source_parts = {}   # type: Dict[str, MarketSnapshot]  آخر صورة لكل مصدر إضافي (بالبادئة)
+
 
 # ═══════════════════════════════════════════════
 #   SMART CACHE — يمنع طلبات Klines المتكررة
 # ═══════════════════════════════════════════════
+class OHLCV(object):
+    """
+    شموع في مصفوفة NumPy واحدة (6 × capacity) بدل 5 قوائم من float:
+      ● الصفوف: times, opens, highs, lows, closes, vols
+      ● غير قابل للتغيير بعد إنشائه: merge يبني كائناً جديداً بمصفوفة جديدة
+        (copy-on-write) — الـ views التي يحملها خيط Scan لا تتغير تحته أبداً
+      ● kd["closes"] يرجع view (slice بدون نسخ) — نفس واجهة القاموس القديم
+    """
+    ROWS = {"times": 0, "opens": 1, "highs": 2, "lows": 3, "closes": 4, "vols": 5}
+    __slots__ = ("buf", "start", "end", "window", "avg_vol")
+
+    def __init__(self, buf, start, end, window, avg_vol=None):
+        # type: (np.ndarray, int, int, int, Optional[float]) -> None
+        self.buf    = buf
+        self.start  = start
+        self.end    = end
+        self.window = window
+        self.avg_vol = self._calc_avg_vol() if avg_vol is None else avg_vol
+
+    @staticmethod
+    def _rows(raw):
+        # type: (List[List]) -> np.ndarray
+        """صفوف MEXC [openTime, o, h, l, c, v, ...] → مصفوفة (6 × n)."""
+        return np.array([c[:6] for c in raw], dtype=np.float64).T
+
+    @classmethod
+    def from_rows(cls, raw, window):
+        # type: (List[List], int) -> OHLCV
+        return cls.from_array(cls._rows(raw[-window:]), window)
+
+    @classmethod
+    def from_array(cls, rows, window):
+        # type: (np.ndarray, int) -> OHLCV
+        """مصفوفة (6 × n) جاهزة (من Checkpoint مثلاً) → OHLCV."""
+        n   = rows.shape[1]
+        buf = np.empty((6, window + max(8, window // 4)))
+        buf[:, :n] = rows
+        return cls(buf, 0, n, window)
+
+    def rows(self):
+        # type: () -> np.ndarray
+        """نسخة (6 × n) متصلة من الشموع الحالية."""
+        return np.ascontiguousarray(self.buf[:, self.start:self.end])
+
+    def _calc_avg_vol(self):
+        # type: () -> float
+        # tolist + sum = نفس ترتيب الجمع القديم (نتيجة مطابقة حرفياً)
+        v = self.buf[5, self.start:self.end - 1].tolist()
+        return sum(v) / max(len(v), 1)
+
+    def merge(self, raw):
+        # type: (List[List]) -> Optional[OHLCV]
+        """
+        تحديث تراكمي بصفوف تبدأ من openTime الشمعة الجارية → OHLCV جديد
+        (الشموع المغلقة تُنسخ + الصفوف الجديدة) — هذا الكائن لا يتغير.
+        يرجع None إذا يوجد فجوة (يلزم جلب كامل).
+        """
+        rows  = self._rows(raw)
+        times = self.buf[0, self.start:self.end]
+        if not len(times) or rows[0, 0] > times[-1]:
+            return None
+        keep   = self.start + int(np.searchsorted(times, rows[0, 0]))
+        n      = rows.shape[1]
+        closed = self.buf[:, max(self.start, keep + n - self.window):keep]
+        k      = closed.shape[1]
+        buf    = np.empty((6, max(self.buf.shape[1], k + n)))
+        buf[:, :k]      = closed
+        buf[:, k:k + n] = rows
+        return OHLCV(buf, max(0, k + n - self.window), k + n, self.window)
+
+    def view(self, limit):
+        # type: (int) -> OHLCV
+        """نسخة مجمدة (start/end ثابتة) تشارك نفس الـ buffer."""
+        if limit >= self.end - self.start:
+            return OHLCV(self.buf, self.start, self.end, limit, self.avg_vol)
+        return OHLCV(self.buf, self.end - limit, self.end, limit)
+
+    @property
+    def nbytes(self):
+        # type: () -> int
+        return self.buf.nbytes
+
+    def __getitem__(self, key):
+        # type: (str) -> Any
+        if key == "avg_vol": return self.avg_vol
+        if key == "window":  return self.window
+        return self.buf[self.ROWS[key], self.start:self.end]
+
+    def __len__(self):
+        # type: () -> int
+        return self.end - self.start
+
+
+class KlineArchive(object):
+    """
+    أرشيف الشموع المغلقة: ملف .npy (memmap) لكل رمز/فاصل
+      ● الشكل (capacity + 1, 6): الصف 0 = [عدد الشموع, ...] والباقي
+        time, open, high, low, close, vol بترتيب زمني
+      ● عند الامتلاء تُزاح الأقدم — حجم الملف ثابت (~32KB لـ 672 شمعة)
+        2000 رمز × 3 فواصل ≈ 200MB كحد أقصى
+      ● الشموع المغلقة فقط — الشمعة الجارية تأتي دائماً من API
+      ● فجوة بين الأرشيف والجديد = يبدأ الملف من الجديد (النافذة متصلة دائماً)
+      ● أقصى ARCHIVE_OPEN_MAX ملف مفتوح (LRU) — 6000 ملف لا تستهلك 6000 fd
+    """
+    # محارف ممنوعة في أسماء ملفات Windows ("اسم:رمز" من مصدر إضافي)
+    _UNSAFE = str.maketrans({c: "_" for c in '<>:"/\\|?*'})
+
+    def __init__(self, path, max_open=ARCHIVE_OPEN_MAX):
+        # type: (str, int) -> None
+        self.path     = path
+        self.max_open = max_open
+        self._maps    = OrderedDict()   # type: OrderedDict
+        self._lock    = threading.Lock()
+
+    def _open(self, symbol, interval, create=False):
+        # type: (str, str, bool) -> Optional[np.ndarray]
+        key = (symbol, interval)
+        mm  = self._maps.get(key)
+        if mm is not None:
+            self._maps.move_to_end(key)
+            return mm
+        name = os.path.join(self.path, interval, symbol.translate(self._UNSAFE) + ".npy")
+        try:
+            if os.path.exists(name):
+                mm = np.load(name, mmap_mode="r+")
+            elif create:
+                os.makedirs(os.path.dirname(name), exist_ok=True)
+                cap = ARCHIVE_CAPACITY.get(interval, ARCHIVE_DEFAULT_CAP)
+                mm  = np.lib.format.open_memmap(name, mode="w+", dtype=np.float64,
+                                                shape=(cap + 1, 6))
+            else:
+                return None
+        except (OSError, ValueError) as e:
+            log.debug("Archive [%s]: %s", name, e)
+            return None
+        self._maps[key] = mm
+        while len(self._maps) > self.max_open:
+            self._close(self._maps.popitem(last=False)[1])
+        return mm
+
+    @staticmethod
+    def _close(mm):
+        # type: (np.ndarray) -> None
+        """flush ثم إغلاق الـ mmap (و fd الخاص به) فوراً بدل انتظار جامع القمامة."""
+        mm.flush()
+        mmap = getattr(mm, "_mmap", None)
+        del mm
+        if mmap is not None:
+            try:
+                mmap.close()
+            except BufferError:
+                pass   # مرجع آخر للمصفوفة — يُغلق عند تحريره
+
+    def read(self, symbol, interval, limit):
+        # type: (str, str, int) -> Optional[np.ndarray]
+        """آخر limit شمعة مغلقة كمصفوفة (6 × n) — أو None."""
+        with self._lock:
+            mm = self._open(symbol, interval)
+            if mm is None:
+                return None
+            n = int(mm[0, 0])
+            if n == 0:
+                return None
+            return np.array(mm[1 + max(n - limit, 0):1 + n].T)
+
+    def write(self, symbol, interval, rows, now_ms):
+        # type: (str, str, np.ndarray, float) -> int
+        """يضيف الشموع المغلقة الجديدة من rows (6 × n). يرجع عدد المضاف."""
+        step = INTERVAL_MS.get(interval)
+        if not step or not rows.shape[1]:
+            return 0
+        closed = rows[:, rows[0] + step <= now_ms]
+        if not closed.shape[1]:
+            return 0
+        with self._lock:
+            mm = self._open(symbol, interval, create=True)
+            if mm is None:
+                return 0
+            cap = mm.shape[0] - 1
+            n   = int(mm[0, 0])
+            if n:
+                last  = mm[n, 0]
+                fresh = closed[:, closed[0] > last]
+                if fresh.shape[1] and fresh[0, 0] - last > step:
+                    n = 0   # فجوة → نبدأ من جديد
+                    fresh = closed
+            else:
+                fresh = closed
+            k = fresh.shape[1]
+            if not k:
+                return 0
+            if k >= cap:
+                mm[1:] = fresh[:, -cap:].T
+                n = cap
+            else:
+                drop = max(n + k - cap, 0)
+                if drop:
+                    mm[1:1 + n - drop] = mm[1 + drop:1 + n]
+                    n -= drop
+                mm[1 + n:1 + n + k] = fresh.T
+                n += k
+            mm[0, 0] = n
+            return k
+
+    def flush(self):
+        # type: () -> None
+        with self._lock:
+            for mm in self._maps.values():
+                mm.flush()
+
+
+kline_archive = KlineArchive(KLINES_ARCHIVE_DIR) if KLINES_ARCHIVE_DIR else None
+
+
+class KlineCache(object):
+    """
+    Cache الشموع: {symbol_interval: (OHLCV, وقت الجلب)} بترتيب LRU
+      ● حدان: عدد المدخلات وحجم الذاكرة (buffers الـ OHLCV)
+      ● عند تجاوز أي حد أثناء الإضافة: أول منتهي الصلاحية بين أقدم
+        EVICT_SAMPLE مدخل، وإلا الأقل استخداماً
+      ● get يحرك المدخل لنهاية LRU | stats(): الإشغال + نسبة الإصابة
+    """
+    EVICT_SAMPLE = 32
+
+    def __init__(self, max_entries, max_mb):
+        # type: (int, float) -> None
+        self.max_entries = max_entries
+        self.max_bytes   = int(max_mb * 1024 * 1024)
+        self.nbytes      = 0
+        self.hits        = 0
+        self.misses      = 0
+        self.evicted     = 0
+        self._data       = OrderedDict()   # type: OrderedDict
+        self._lock       = threading.RLock()
+
+    @staticmethod
+    def expires(key, ts):
+        # type: (str, float) -> float
+        return kline_expires(key.rsplit("_", 1)[-1], ts)
+
+    def get(self, key):
+        # type: (str) -> Optional[Tuple[OHLCV, float]]
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def count(self, hit):
+        # type: (bool) -> None
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def __setitem__(self, key, entry):
+        # type: (str, Tuple[OHLCV, float]) -> None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[0].nbytes
+            self._data[key] = entry
+            self.nbytes += entry[0].nbytes
+            self._evict(time.time())
+
+    def _evict(self, now):
+        # type: (float) -> None
+        data = self._data
+        while len(data) > 1 and (len(data) > self.max_entries or
+                                 self.nbytes > self.max_bytes):
+            victim = next(iter(data))
+            for i, (k, (_, ts)) in enumerate(data.items()):
+                if i >= self.EVICT_SAMPLE:
+                    break
+                if now >= self.expires(k, ts):
+                    victim = k
+                    break
+            self.nbytes -= data.pop(victim)[0].nbytes
+            self.evicted += 1
+
+    def __delitem__(self, key):
+        # type: (str) -> None
+        with self._lock:
+            self.nbytes -= self._data.pop(key)[0].nbytes
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def update(self, entries):
+        # type: (Dict[str, Tuple[OHLCV, float]]) -> None
+        # الأقدم أولاً — الأحدث يبقى عند امتلاء الحدود
+        for k, entry in sorted(entries.items(), key=lambda kv: kv[1][1]):
+            self[k] = entry
+
+    def copy(self):
+        # type: () -> Dict[str, Tuple[OHLCV, float]]
+        with self._lock:
+            return dict(self._data)
+
+    def clear(self):
+        # type: () -> None
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def expire(self, max_age):
+        # type: (float) -> int
+        """حذف كل ما جُلب قبل أكثر من max_age ثانية."""
+        now = time.time()
+        with self._lock:
+            stale = [k for k, (_, ts) in self._data.items() if now - ts > max_age]
+            for k in stale:
+                self.nbytes -= self._data.pop(k)[0].nbytes
+        return len(stale)
+
+    def stats(self):
+        # type: () -> Dict[str, float]
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries":  len(self._data),
+                "mb":       round(self.nbytes / 1024 / 1024, 2),
+                "hits":     self.hits,
+                "misses":   self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evicted":  self.evicted,
+            }
+
+
+klines_cache  = KlineCache(KLINES_CACHE_MAX, KLINES_CACHE_MB)
+klines_flight = SingleFlight()
+
+
 def get_klines(symbol, interval="15m", limit=50):
-    # type: (str, str, int) -> Optional[Dict]
+    # type: (str, str, int) -> Optional[OHLCV]
     """
-    يجلب الشموع مع Cache ذكي:
-      15m → صالح 60 ثانية
-      1h  → صالح 5 دقائق
-      4h  → صالح 15 دقيقة
+    Cache صالح → فوراً. غير ذلك: طلب واحد لكل (symbol, interval, limit) —
+    الخيوط التي تطلب نفس المفتاح معاً تنتظر نفس النتيجة.
     """
-    cache_ttl = {
+    hit = klines_cache.get("{}_{}".format(symbol, interval))
+    if hit is not None and hit[0].window >= limit \
+            and time.time() < kline_expires(interval, hit[1]):
+        klines_cache.count(True)
+        return hit[0].view(limit)
+    return klines_flight.do((symbol, interval, limit), _load_klines, symbol, interval, limit)
+
+
+def kline_ttl(interval):
+    # type: (str) -> float
+    return {
         "15m": CACHE_15M,
         "1h":  CACHE_1H,
         "4h":  CACHE_4H,
     }.get(interval, CACHE_15M)
 
+
+def kline_close(interval, ts):
+    # type: (str, float) -> float
+    """وقت إغلاق الشمعة الجارية في ts (ثوانٍ) — أو inf لفاصل غير معروف."""
+    step = INTERVAL_MS.get(interval)
+    return (int(ts * 1000) // step + 1) * step / 1000.0 if step else float("inf")
+
+
+def kline_expires(interval, ts):
+    # type: (str, float) -> float
+    """
+    صلاحية سلسلة (مع الشمعة الجارية) جُلبت في ts: الإغلاق أو kline_ttl — أيهما أقرب.
+    الشموع المغلقة لا تتغير أبداً: التحديث يطلب فقط من الشمعة الجارية،
+    وبعد الإغلاق مباشرة تُضاف الشمعة المغلقة النهائية (بدون انتظار TTL).
+    """
+    return min(ts + kline_ttl(interval), kline_close(interval, ts))
+
+
+def _load_klines(symbol, interval, limit):
+    # type: (str, str, int) -> Optional[OHLCV]
+    """
+    يجلب الشموع مع Cache ذكي — صالح حتى kline_expires:
+      15m → 60 ثانية | 1h → 5 دقائق | 4h → 15 دقيقة — أو حتى إغلاق الشمعة
+    Cache تراكمي: عند انتهاء الصلاحية نطلب فقط الشموع من آخر openTime
+    (startTime) — الشمعة الجارية تُستبدل، المغلقة تُضاف، والنافذة تُقص.
+    بدون Cache في الذاكرة: النافذة تُبنى من kline_archive ثم نفس التحديث التراكمي.
+    """
+    klines_cache.count(False)
+
     key = "{}_{}".format(symbol, interval)
     now = time.time()
+    src, raw_sym = source_for(symbol)
+
+    # إرجاع من Cache إذا صالح (ملأه طلب آخر بين الفحص والدخول هنا)
+    cached = None
+    hit = klines_cache.get(key)
+    if hit is not None:
+        data, ts = hit
+        if data.window >= limit:
+            cached = data
+            if now < kline_expires(interval, ts):
+                return data.view(limit)
+
+    # من الأرشيف على القرص (بعد إعادة التشغيل أو أول Scan لهذه العملة)
+    if cached is None and kline_archive is not None:
+        rows = kline_archive.read(symbol, interval, limit)
+        if rows is not None and rows.shape[1] >= limit - 1:   # + الشمعة الجارية
+            cached = OHLCV.from_array(rows, limit)
+
+    # تحديث تراكمي: فقط الشموع الجديدة + الشمعة الجارية
+    step = INTERVAL_MS.get(interval)
+    if cached and step and len(cached):
+        last_open = cached["times"][-1]
+        need = int((now * 1000 - last_open) // step) + 2
+        if need < cached.window:
+            src.pace()
+            raw = src.klines(raw_sym, interval, need, start=last_open)
+            try:
+                merged = cached.merge(raw) if raw else None
+                if merged is not None:
+                    klines_cache[key] = (merged, now)   # كائن جديد — القديم يبقى كما هو لقرائه
+                    if kline_archive is not None:
+                        kline_archive.write(symbol, interval, merged.rows(), now * 1000)
+                    return merged.view(limit)
+            except (IndexError, ValueError, TypeError):
+                pass
+            # فجوة أو رد غير متوقع → جلب كامل
 
-    # إرجاع من Cache إذا صالح
-    if key in klines_cache:
-        data, ts = klines_cache[key]
-        if now - ts < cache_ttl:
-            return data
-
-    # جلب من API
-    raw = safe_get(MEXC_KLINES, {
-        "symbol": symbol, "interval": interval, "limit": limit
-    })
+    # جلب كامل من API
+    src.pace()
+    raw = src.klines(raw_sym, interval, limit)
     if not raw or len(raw) < 6:
         return None
 
     try:
-        opens  = [float(c[1]) for c in raw]
-        highs  = [float(c[2]) for c in raw]
-        lows   = [float(c[3]) for c in raw]
-        closes = [float(c[4]) for c in raw]
-        vols   = [float(c[5]) for c in raw]
-        result = {
-            "opens": opens, "highs": highs, "lows": lows,
-            "closes": closes, "vols": vols,
-            "avg_vol": sum(vols[:-1]) / max(len(vols[:-1]), 1),
-        }
+        result = OHLCV.from_rows(raw, limit)
         klines_cache[key] = (result, now)
-        return result
-    except (IndexError, ValueError, ZeroDivisionError):
+        if kline_archive is not None:
+            kline_archive.write(symbol, interval, result.rows(), now * 1000)
+        return result.view(limit)
+    except (IndexError, ValueError, TypeError):
         return None
 
 
 def clear_expired_cache():
     # type: () -> None
-    """تنظيف Cache القديم لتوفير الذاكرة."""
-    now   = time.time()
-    stale = [k for k, (_, ts) in list(klines_cache.items())
-             if now - ts > CACHE_4H * 2]
-    for k in stale:
-        del klines_cache[k]
+    """تنظيف Cache القديم لتوفير الذاكرة (الحدود نفسها تُفرض عند كل إضافة)."""
+    klines_cache.expire(CACHE_4H * 2)
+    st = klines_cache.stats()
+    log.info("🗄️ Klines Cache: %d مدخل | %.1f MB | إصابة: %.0f%% | طُرد: %d",
+             st["entries"], st["mb"], st["hit_rate"] * 100, st["evicted"])
 
 
 # ═══════════════════════════════════════════════
@@ -364,17 +2181,12 @@ def is_stablecoin(sym, last_price=0.0, change=0.0):
     2. الكلمات الدالة في الاسم
     3. السلوك السعري (تغيير < 0.5% = مستقرة)
     """
-    base = sym.replace("USDT", "")
-
     # طبقة 1: القائمة المباشرة
-    if base in STABLECOINS:
-        return True
-
     # طبقة 2: كلمات في الاسم تدل على Stablecoin
     # مثال: USD1, USDE, EUROC, GBPT...
-    for kw in STABLE_KEYWORDS:
-        if base.startswith(kw) or base.endswith(kw):
-            return True
+    # (الطبقتان محسوبتان مسبقاً في symbol_index)
+    if symbol_index.get(sym).stable_like:
+        return True
 
     # طبقة 3: السلوك السعري
     # إذا التغيير 24h أقل من 0.5% = مستقرة على الأرجح
@@ -391,9 +2203,10 @@ def pre_filter(sym, change, vol, price=0.0):
     يستخدم البيانات الموجودة أصلاً من ticker/24hr.
     يرفض العملات المستقرة والرافعة وخارج النطاق.
     """
-    if not sym.endswith("USDT"): return False
-    if sym in EXCLUDED: return False
-    if any(k in sym for k in LEVERAGE_KEYWORDS): return False
+    meta = symbol_index.get(sym)
+    if meta.quote != "USDT": return False
+    if meta.excluded: return False
+    if meta.leveraged: return False
 
     # فلتر Stablecoin الشامل
     if is_stablecoin(sym, price, change): return False
@@ -420,14 +2233,13 @@ def analyze_btc():
     # type: () -> None
     global btc_change_24h, btc_trend_1h, market_state, last_btc
 
-    data = safe_get(MEXC_24H, {"symbol": "BTCUSDT"})  # طلب واحد فقط
-    if not data:
-        return
-
-    try:
-        btc_change_24h = float(data["priceChangePercent"])
-    except (KeyError, ValueError):
-        pass
+    if "BTCUSDT" in market_snapshot:
+        btc_change_24h = market_snapshot.get("change", "BTCUSDT")
+    else:
+        tk = sources[0].ticker("BTCUSDT")  # طلب واحد فقط
+        if not tk:
+            return
+        btc_change_24h = tk[1]
 
     # اتجاه 1h من Cache إذا وُجد
     kd1 = get_klines("BTCUSDT", "1h", 4)
@@ -474,40 +2286,22 @@ def analyze_btc():
 def analyze_sectors():
     # type: () -> None
     """
-    يستخدم all_tickers المحفوظة مسبقاً — لا طلبات API جديدة!
+    يستخدم market_snapshot — لا طلبات API جديدة!
     """
     global hot_sectors, hot_symbols, sector_vol_history, last_sectors
 
-    if not all_tickers:
+    snap = market_snapshot
+    if not len(snap):
         return
 
-    ticker_map = {t["symbol"]: t for t in all_tickers}
     new_hot    = []
     stats      = {}
 
-    for sector, coins in SECTORS.items():
-        changes   = []
-        total_vol = 0.0
-        rising    = []
-
-        for sym in coins:
-            if sym not in ticker_map:
-                continue
-            try:
-                ch  = float(ticker_map[sym]["priceChangePercent"])
-                vol = float(ticker_map[sym]["quoteVolume"])
-                changes.append(ch)
-                total_vol += vol
-                if ch > 0:
-                    rising.append((sym.replace("USDT",""), ch))
-            except (KeyError, ValueError):
-                pass
-
-        if not changes:
-            continue
-
-        avg_ch     = sum(changes) / len(changes)
-        rising_pct = sum(1 for c in changes if c > 0) / len(changes) * 100
+    # كل القطاعات في مرور واحد على الصورة
+    for sector, agg in sector_index.aggregate(snap).items():
+        avg_ch     = agg["avg"]
+        rising_pct = agg["rising_pct"]
+        total_vol  = agg["total_vol"]
         prev_vol   = sector_vol_history.get(sector, total_vol)
         vol_ratio  = total_vol / prev_vol if prev_vol > 0 else 1.0
         sector_vol_history[sector] = total_vol
@@ -515,7 +2309,7 @@ def analyze_sectors():
         stats[sector] = {
             "avg": avg_ch, "rising_pct": rising_pct,
             "vol_ratio": vol_ratio,
-            "top": sorted(rising, key=lambda x: -x[1])[:3],
+            "top": agg["top"],
         }
 
         if (avg_ch >= SECTOR_HOT_CHANGE and
@@ -587,10 +2381,10 @@ def analyze_smart_money(force_report=False):
     """
     global stable_vol_history, smart_money_alert, last_smart_money
 
-    if not all_tickers:
+    snap = market_snapshot
+    if not len(snap):
         return
 
-    ticker_map  = {t["symbol"]: t for t in all_tickers}
     detected    = []    # Stablecoins بحجم غير عادي
     urgent      = []    # Stablecoins بـ Sigma ≥ 5 (تنبيه فوري)
     total_sigma = 0.0
@@ -599,13 +2393,10 @@ def analyze_smart_money(force_report=False):
     #  الخطوة 1: تحليل حجم كل Stablecoin
     # ═══════════════════════════════════════════
     for sym in SMART_MONEY_STABLES:
-        if sym not in ticker_map:
-            continue
-        try:
-            vol    = float(ticker_map[sym]["quoteVolume"])
-            change = float(ticker_map[sym]["priceChangePercent"])
-        except (KeyError, ValueError):
+        if sym not in snap:
             continue
+        vol    = snap.get("vol", sym)
+        change = snap.get("change", sym)
 
         # بناء تاريخ الحجم (آخر 48 قراءة = 48 ساعة)
         if sym not in stable_vol_history:
@@ -646,28 +2437,15 @@ def analyze_smart_money(force_report=False):
     # ═══════════════════════════════════════════
     #  الخطوة 2: تحليل حالة السوق العام
     # ═══════════════════════════════════════════
-    sell_pressure = 0.0
-    rising_count  = 0
-    falling_count = 0
-    top_falling   = []   # أكثر العملات انخفاضاً
-
-    for t in all_tickers:
-        sym = t.get("symbol", "")
-        if not sym.endswith("USDT"): continue
-        base = sym.replace("USDT", "")
-        if base in STABLECOINS: continue
-        try:
-            ch  = float(t["priceChangePercent"])
-            vol = float(t["quoteVolume"])
-            if ch > 0:
-                rising_count  += 1
-            else:
-                falling_count += 1
-                if ch < -5 and vol > 500_000:
-                    top_falling.append((base, ch, vol))
-            sell_pressure += ch
-        except (KeyError, ValueError):
-            pass
+    mask = symbol_index.masks(snap)["breadth"]
+    ch_all        = snap.change[mask]
+    vol_all       = snap.vol[mask]
+    sell_pressure = float(ch_all.sum())
+    rising_count  = int((ch_all > 0).sum())
+    falling_count = len(ch_all) - rising_count
+    fall_rows     = np.flatnonzero(mask)[(ch_all < -5) & (vol_all > 500_000)]
+    top_falling   = [(symbol_index.get(snap.symbols[r]).base,   # أكثر العملات انخفاضاً
+                      float(snap.change[r]), float(snap.vol[r])) for r in fall_rows]
 
     total_coins  = rising_count + falling_count
     avg_market   = sell_pressure / total_coins if total_coins > 0 else 0
@@ -801,32 +2579,36 @@ def analyze_smart_money(force_report=False):
 #   🆕 MOMENTUM DETECTOR
 #   يرصد الحركة اللحظية — الدخول عند 3-5%
 # ═══════════════════════════════════════════════
-def detect_momentum(price_map, change_now, vol_now, high_map, low_map):
-    # type: (Dict[str, float], Dict[str, float], Dict[str, float], Dict, Dict) -> None
+def detect_momentum(snap, symbols=None):
+    # type: (MarketSnapshot, Optional[Set[str]]) -> None
     """
     نظام الإشعارات الثلاثي — اصطياد القاع مع السيولة:
     🔵 المرحلة 1: Momentum Detected  — أول رصد للسيولة
     🟡 المرحلة 2: السيولة ترتفع      — سعر +2% + حجم متصاعد
     🟢 المرحلة 3: تأكيد الدخول       — كل الشروط معاً (Score 65+)
+    symbols: إذا حُددت (رسالة Stream / دلتا REST) — تُفحص هذه الرموز فقط.
+    سعر لم يتغير لا يغير نتيجة أي فلتر — الرمز الساكن لا يكلف شيئاً.
     """
-    global price_prev, momentum_alerted, momentum_stage
+    global price_prev, price_prev_ts, momentum_alerted, momentum_stage
 
     now = time.time()
 
     # ── المرحلة 2 و 3: متابعة العملات المرصودة ──────────
     for sym, stage_data in list(momentum_stage.items()):
-        if sym not in price_map: continue
-        price      = price_map[sym]
-        vol        = vol_now.get(sym, 0)
-        change_24h = change_now.get(sym, 0)
-        entry_price = stage_data["entry_price"]
-        entry_vol   = stage_data["entry_vol"]
-        gain        = (price - entry_price) / entry_price * 100 if entry_price > 0 else 0
-
         # تنظيف: إذا مضى أكثر من 2 ساعة بدون تأكيد = احذف
+        # (قبل فلتر الدلتا — العملة الساكنة أو المحذوفة تنتهي أيضاً)
         if now - stage_data["entry_time"] > 7200:
             del momentum_stage[sym]
             continue
+        if symbols is not None and sym not in symbols: continue
+        r = snap.index.get(sym)
+        if r is None: continue
+        price      = float(snap.price[r])
+        vol        = float(snap.vol[r])
+        change_24h = float(snap.change[r])
+        entry_price = stage_data["entry_price"]
+        entry_vol   = stage_data["entry_vol"]
+        gain        = (price - entry_price) / entry_price * 100 if entry_price > 0 else 0
 
         # إذا السعر نزل -5% من نقطة الرصد = احذف
         if gain < -5:
@@ -863,35 +2645,40 @@ def detect_momentum(price_map, change_now, vol_now, high_map, low_map):
         if stage_data["stage"] == 2 and not stage_data.get("alerted_3"):
             vol_ratio = vol / entry_vol if entry_vol > 0 else 1
             if gain >= 3.0 and vol_ratio >= 2.0 and change_24h > 0:
-                # Deep Scan للتحقق من Score
-                deep_scan(sym, price, change_24h)
+                # Deep Scan للتحقق من Score (في الخلفية — لا يوقف الحلقة)
+                scan_pool.submit(deep_scan, sym, price, change_24h)
                 # الإشعار يُرسل من داخل deep_scan إذا Score >= 65
                 stage_data["alerted_3"] = True
                 stage_data["stage"] = 3
                 log.info("🟢 Stage3 | %s | +%.2f%% | deep_scan triggered", sym, gain)
 
     # ── المرحلة 1: رصد جديد ──────────────────────────
-    for sym, price in price_map.items():
+    # فلتر الحجم + التصنيف (USDT / Stable / رافعة / مستبعد) دفعة واحدة
+    # الحلقة فقط على ما تبقى
+    ok = symbol_index.masks(snap)["eligible"] & (snap.vol >= MOMENTUM_MIN_VOL)
+    if symbols is None:
+        rows = np.flatnonzero(ok).tolist()
+    else:
+        # الدلتا فقط — بدون المرور على كل السوق
+        index = snap.index
+        rows  = sorted(r for r in (index.get(s) for s in symbols)
+                       if r is not None and ok[r])
+    for r in rows:
+        sym = snap.symbols[r]
         if sym in tracked: continue
         if sym in momentum_stage: continue
-        if not sym.endswith("USDT"): continue
-
-        vol = vol_now.get(sym, 0)
-        if vol < MOMENTUM_MIN_VOL: continue
 
-        base = sym.replace("USDT","")
-        if base in STABLECOINS: continue
-        if any(k in sym for k in LEVERAGE_KEYWORDS): continue
-        if sym in EXCLUDED: continue
+        price, change_24h, vol, high_24h, low_24h = snap.data[:, r].tolist()
 
         prev = price_prev.get(sym, 0)
-        price_prev[sym] = price
+        # خط الأساس يتجدد كل CHECK_INTERVAL — في وضع البث (تحديث كل ثانيتين)
+        # الحركة تُقاس على نفس نافذة 12 ثانية وليس بين رسالتين متتاليتين
+        if now - price_prev_ts.get(sym, 0) >= CHECK_INTERVAL:
+            price_prev[sym]    = price
+            price_prev_ts[sym] = now
         if prev <= 0 or price <= 0: continue
 
         move       = (price - prev) / prev * 100
-        change_24h = change_now.get(sym, 0)
-        high_24h   = high_map.get(sym, price)
-        low_24h    = low_map.get(sym, price)
 
         # ── فلاتر اصطياد القاع ──────────────────────
         if move < MOMENTUM_MOVE_MIN: continue
@@ -912,8 +2699,7 @@ def detect_momentum(price_map, change_now, vol_now, high_map, low_map):
 
         momentum_alerted[sym] = now
         in_hot  = sym in hot_symbols
-        sector  = next((s for s, syms in SECTORS.items()
-                       if sym in syms and s in hot_sectors), "")
+        sector  = sector_index.first(sym, hot_sectors)
         hot_tag = " 🔥 *{}*".format(sector) if in_hot else ""
 
         rebound        = (price - low_24h) / low_24h * 100 if low_24h > 0 else 0
@@ -954,50 +2740,33 @@ def detect_momentum(price_map, change_now, vol_now, high_map, low_map):
         )
 
 
-def refresh_tickers():
-    # type: () -> None
+def refresh_tickers(snap=None):
+    # type: (Optional[MarketSnapshot]) -> None
     """
-    طلب واحد يجيب بكل بيانات السوق.
-    يبني قائمة candidates بعد الفلتر المسبق.
+    يبني قائمة candidates بعد الفلتر المسبق من صورة السوق.
+    بدون snap: طلب واحد لكل مصدر يجيب بكل بيانات السوق.
     """
-    global all_tickers, changes_map, candidates, last_tickers
+    global market_snapshot, candidates, last_tickers
 
-    data = safe_get(MEXC_24H)
-    if not data:
-        return
-
-    all_tickers = data
-    changes_map = {}
-    result      = []
-
-    for t in data:
-        sym = t.get("symbol", "")
-        try:
-            ch    = float(t["priceChangePercent"])
-            vol   = float(t["quoteVolume"])
-            price = float(t.get("lastPrice", 0))
-        except (KeyError, ValueError):
-            continue
-
-        changes_map[sym] = ch
-
-        # فلتر بسيط فقط — نريد أكبر قائمة ممكنة
-        if not sym.endswith("USDT"): continue
-        if sym in EXCLUDED: continue
-        base = sym.replace("USDT","")
-        if base in STABLECOINS: continue
-        if any(k in sym for k in LEVERAGE_KEYWORDS): continue
-        if vol < MIN_VOL_USDT: continue       # حجم أدنى فقط
-        if vol > MAX_VOL_USDT: continue       # حجم أقصى فقط
-        if ch < -15: continue                 # نازل بقوة جداً
-        if 0.95 <= price <= 1.05 and price > 0: continue  # Stablecoin بالسعر
+    if snap is None:
+        snap = fetch_market()
+        if not snap:
+            return
+        market_snapshot = snap
 
-        result.append((sym, vol))
+    price = snap.price; vol = snap.vol; ch = snap.change
+    # فلتر بسيط فقط — نريد أكبر قائمة ممكنة
+    ok = (symbol_index.masks(snap)["eligible"]             # USDT / Stable / رافعة / مستبعد
+          & (vol >= MIN_VOL_USDT) & (vol <= MAX_VOL_USDT)   # حجم أدنى/أقصى
+          & (ch >= -15)                                    # نازل بقوة جداً
+          & ~((price >= 0.95) & (price <= 1.05) & (price > 0)))  # Stablecoin بالسعر
 
-    result.sort(key=lambda x: -x[1])
+    # ترتيب حسب الحجم (مستقر — نفس ترتيب sort السابق عند التساوي)
+    rows = np.flatnonzero(ok)
+    rows = rows[np.argsort(-vol[rows], kind="stable")]
 
     # نأخذ 200 عملة بدل 80 لتغطية أكبر
-    base_candidates = [s for s, _ in result[:200]]
+    base_candidates = [snap.symbols[r] for r in rows[:200].tolist()]
 
     # أضف عملات القطاعات الساخنة دائماً
     extra = [s for s in hot_symbols
@@ -1006,7 +2775,7 @@ def refresh_tickers():
     last_tickers = time.time()
 
     log.info("📋 Candidates: %d من %d | Hot: %s",
-             len(candidates), len(data), ", ".join(hot_sectors) or "لا يوجد")
+             len(candidates), len(snap), ", ".join(hot_sectors) or "لا يوجد")
 
 
 # ═══════════════════════════════════════════════
@@ -1126,28 +2895,107 @@ def detect_pre_breakout(symbol):
     return True, round(min(ts+vs+tm,100),1), desc
 
 
+# ═══════════════════════════════════════════════
+#   ORDER BOOK — Cache + طلب واحد لكل عملة + Stream
+# ═══════════════════════════════════════════════
+def book_summary(bids, asks):
+    # type: (List[Tuple[float, float]], List[Tuple[float, float]]) -> Dict
+    """مستويات (سعر, كمية) → {bid, ask, imb} — قيمة كل جانب بالـ USDT."""
+    bid = sum(p * q for p, q in bids)
+    ask = sum(p * q for p, q in asks)
+    return {"bid": bid, "ask": ask, "imb": bid / ask if ask > 0 else 99}
+
+
+class DepthCache(object):
+    """
+    OrderBook لكل عملة صالح ttl ثانية + SingleFlight:
+    خيوط الـ Scan التي تطلب نفس العملة معاً تنتظر طلباً واحداً.
+    الفشل (None) لا يُخزن — الطلب التالي يعيد المحاولة.
+    """
+
+    def __init__(self, ttl):
+        # type: (float) -> None
+        self.ttl     = ttl
+        self.entries = {}   # type: Dict[str, Tuple[Dict, float]]
+        self.flight  = SingleFlight()
+        self.hits    = 0
+        self.misses  = 0
+        self._lock   = threading.Lock()
+
+    def get(self, symbol, fetch):
+        # type: (str, Any) -> Optional[Dict]
+        with self._lock:
+            hit = self.entries.get(symbol)
+            if hit is not None and time.time() - hit[1] < self.ttl:
+                self.hits += 1
+                return hit[0]
+            self.misses += 1
+        return self.flight.do(symbol, self._load, symbol, fetch)
+
+    def _load(self, symbol, fetch):
+        # type: (str, Any) -> Optional[Dict]
+        ob = fetch(symbol)
+        if ob is not None:
+            with self._lock:
+                self.entries[symbol] = (ob, time.time())
+        return ob
+
+    def clear(self):
+        # type: () -> None
+        with self._lock:
+            self.entries.clear()
+
+    def expire(self):
+        # type: () -> None
+        now = time.time()
+        with self._lock:
+            for s in [s for s, (_, ts) in self.entries.items() if now - ts >= self.ttl]:
+                del self.entries[s]
+
+    def stats(self):
+        # type: () -> Dict[str, int]
+        return {"entries": len(self.entries), "hits": self.hits,
+                "misses": self.misses, "coalesced": self.flight.coalesced}
+
+
+depth_cache = DepthCache(DEPTH_TTL)
+
+
+def fetch_order_book(symbol):
+    # type: (str) -> Optional[Dict]
+    src, raw_sym = source_for(symbol)
+    src.pace()
+    book = src.depth(raw_sym, DEPTH_LIMIT)
+    return book_summary(*book) if book else None
+
+
 def get_order_book(symbol):
     # type: (str) -> Optional[Dict]
-    data = safe_get(MEXC_DEPTH, {"symbol": symbol, "limit": 20})
-    if not data: return None
-    try:
-        bid = sum(float(b[0])*float(b[1]) for b in data.get("bids",[]))
-        ask = sum(float(a[0])*float(a[1]) for a in data.get("asks",[]))
-        return {"bid": bid, "ask": ask, "imb": bid/ask if ask>0 else 99}
-    except: return None
+    """دفتر الـ Stream (إن وجد) ← Cache ← طلب REST واحد مشترك."""
+    if depth_stream is not None:
+        ob = depth_stream.book(symbol)
+        if ob is not None:
+            return ob
+    return depth_cache.get(symbol, fetch_order_book)
 
 
 # ═══════════════════════════════════════════════
 #   DYNAMIC STOP LOSS
 # ═══════════════════════════════════════════════
-def calc_sl(kd, score, ob, is_bo=False):
-    # type: (Dict, int, Optional[Dict], bool) -> float
+def sl_atr(kd):
+    # type: (Dict) -> float
+    """متوسط مدى آخر 10 شموع بالنسبة المئوية (أساس الـ SL)."""
     h=kd["highs"]; l=kd["lows"]
     pairs = list(zip(h[-10:],l[-10:]))
     if pairs and min(lv for _,lv in pairs)>0:
-        atr = sum((hv-lv)/lv*100 for hv,lv in pairs)/len(pairs)
-    else:
-        atr = SL_BASE
+        return sum((hv-lv)/lv*100 for hv,lv in pairs)/len(pairs)
+    return SL_BASE
+
+
+def calc_sl(kd, score, ob, is_bo=False, atr=None):
+    # type: (Dict, int, Optional[Dict], bool, Optional[float]) -> float
+    if atr is None:
+        atr = sl_atr(kd)
     sf = 0.70 if score>=88 else 0.85 if score>=75 else 1.00
     imf = 1.0
     if ob:
@@ -1281,14 +3129,234 @@ def score_label(score):
     return None
 
 
+# ═══════════════════════════════════════════════
+#   BATCH INDICATORS — كل المرشحين دفعة واحدة
+# ═══════════════════════════════════════════════
+# جدول النتائج: صف لكل عملة — نفس قيم الدوال العادية حرفياً
+FEATURE_DTYPE = [
+    ("symbol",   "O"),   # نص Python كامل — "اسم:رمز" قد يتجاوز أي طول ثابت
+    ("pd",       "?"),  ("pd_rise",   "f8"), ("pd_drop", "f8"),
+    ("vol_ok",   "?"),  ("st",        "i1"),
+    ("spike",    "?"),  ("spike_r",   "f8"),
+    ("accum",    "?"),  ("accum_s",   "f8"),
+    ("consol",   "?"),  ("consol_s",  "f8"),
+    ("hl",       "?"),  ("hl_pct",    "f8"),
+    ("green",    "?"),  ("green_pct", "f8"),
+    ("trend_up", "?"),  ("sl_atr",    "f8"),
+    ("avg_vol",  "f8"), ("last_vol",  "f8"),
+    ("score",    "i2"),
+]
+ST_CODES = {1: "UP", -1: "DOWN", 0: "UNKNOWN"}
+
+
+def indicator_features(kd):
+    # type: (OHLCV) -> Dict[str, Any]
+    """كل مؤشرات deep_scan لعملة واحدة (المسار العادي)."""
+    return {
+        "pd":     detect_pump_dump(kd),
+        "st":     get_supertrend(kd),
+        "spike":  detect_volume_spike(kd),
+        "accum":  detect_volume_accum(kd),
+        "consol": detect_consolidation(kd),
+        "hl":     detect_higher_lows(kd),
+        "green":  detect_green_candles(kd),
+        "sl_atr": sl_atr(kd),
+    }
+
+
+def _seq_sum(m):
+    # type: (np.ndarray) -> np.ndarray
+    """
+    جمع الأعمدة بالترتيب (عمود بعد عمود) — نفس ترتيب sum() في بايثون.
+    np.sum يجمع بشكل زوجي (pairwise) فتختلف آخر خانة وقد تنقلب عتبة.
+    """
+    acc = np.zeros(m.shape[0])
+    for j in range(m.shape[1]):
+        acc = acc + m[:, j]
+    return acc
+
+
+def _py_round(a, nd):
+    # type: (np.ndarray, int) -> np.ndarray
+    # round() في بايثون ≠ np.round في حالات الحافة (x.xx5)
+    return np.array([round(x, nd) for x in a.tolist()])
+
+
+def _kernel(X, avg, out):
+    # type: (np.ndarray, np.ndarray, np.ndarray) -> None
+    """
+    X: (عملات × 6 × شموع) بنفس الطول — يملأ out بكل المؤشرات.
+    كل تعبير مكتوب بنفس ترتيب العمليات في الدالة العادية المقابلة.
+    """
+    N, _, L = X.shape
+    o, h, l, c, v = X[:, 1], X[:, 2], X[:, 3], X[:, 4], X[:, 5]
+    cur = c[:, -1]
+
+    # ── Pump & Dump ─────────────────────────────
+    if L >= PD_LOOKBACK:
+        mn = c[:, -PD_LOOKBACK:].min(1)
+        mx = h[:, -PD_LOOKBACK:].max(1)
+        rise = (mx - mn) / mn * 100
+        drop = (mx - cur) / mx * 100
+        out["pd"] = (mn > 0) & (rise >= PD_MAX_RISE) & ((drop >= PD_MIN_DROP) | (rise >= 40))
+        out["pd_rise"] = rise
+        out["pd_drop"] = drop
+
+    out["vol_ok"]   = ~(v[:, -1] < avg * 1.2)
+    out["trend_up"] = cur > c[:, 0]
+    out["avg_vol"]  = avg
+    out["last_vol"] = v[:, -1]
+
+    # ── Supertrend ──────────────────────────────
+    if L >= ST_ATR_PERIOD + 2:
+        pc = c[:, :-1]; hh = h[:, 1:]; ll = l[:, 1:]
+        tr = np.maximum(np.maximum(hh - ll, np.abs(hh - pc)), np.abs(ll - pc))
+        atr   = _seq_sum(tr[:, -ST_ATR_PERIOD:]) / ST_ATR_PERIOD
+        hl2   = (h[:, -1] + l[:, -1]) / 2
+        upper = hl2 + ST_MULTIPLIER * atr
+        lower = hl2 - ST_MULTIPLIER * atr
+        out["st"] = np.where(cur > lower, 1, np.where(cur < upper, -1,
+                             np.where(cur > c[:, -5], 1, -1)))
+
+    # ── Volume Spike ────────────────────────────
+    pos = avg != 0
+    r = np.divide(v[:, -1], avg, out=np.zeros(N), where=pos)
+    out["spike"]   = pos & (r >= VOL_SPIKE_RATIO)
+    out["spike_r"] = np.where(pos, _py_round(r, 2), 0.0)
+
+    # ── Volume Accumulation ─────────────────────
+    if L >= 6:
+        rv = v[:, -6:]; rc = c[:, -6:]
+        ar = _seq_sum(rv) / 6
+        pr = (rc.max(1) - rc.min(1)) / rc.min(1) * 100
+        vt = (rv[:, 1:] >= rv[:, :-1]).sum(1)
+        ok = ~(ar < avg * 1.5) & ~(pr > 3.0) & ~(vt / 5 < 0.5)
+        sc = np.minimum((ar / avg - 1) * 50 + (3 - pr) / 3 * 30 + vt / 5 * 20, 100)
+        out["accum"]   = ok
+        out["accum_s"] = np.where(ok, _py_round(sc, 1), 0.0)
+
+    # ── آخر 8 شموع: Consolidation / Higher Lows / Green ──
+    w = min(8, L)
+    h8 = h[:, -w:]; l8 = l[:, -w:]; c8 = c[:, -w:]; o8 = o[:, -w:]
+    if w >= 4:
+        up_lows = (l8[:, 1:] >= l8[:, :-1]).sum(1)
+        if w >= 6:
+            trg = (h8.max(1) - l8.min(1)) / l8.min(1) * 100
+            ok  = ~(trg > 4.0) & ~((c8[:, -1] - c8[:, 0]) / c8[:, 0] * 100 < -2)
+            sc  = np.minimum((4 - trg) / 4 * 80 + up_lows / (w - 1) * 20, 100)
+            out["consol"]   = ok
+            out["consol_s"] = np.where(ok, _py_round(sc, 1), 0.0)
+        rh = up_lows / (w - 1)
+        out["hl"]     = rh >= HIGHER_LOWS_MIN
+        out["hl_pct"] = _py_round(rh * 100, 1)
+        rg = (c8 >= o8).sum(1) / w
+        out["green"]     = rg >= GREEN_MIN_RATIO
+        out["green_pct"] = _py_round(rg * 100, 1)
+
+    # ── ATR للـ Stop Loss ───────────────────────
+    w10 = min(10, L)
+    h10 = h[:, -w10:]; l10 = l[:, -w10:]
+    pos = l10.min(1) > 0
+    rng = np.divide(h10 - l10, l10, out=np.zeros_like(l10), where=l10 > 0) * 100
+    out["sl_atr"] = np.where(pos, _seq_sum(rng) / w10, SL_BASE)
+
+
+def scan_features(kds):
+    # type: (Dict[str, OHLCV]) -> np.ndarray
+    """
+    كل مؤشرات deep_scan + Score لكل العملات دفعة واحدة.
+    الشموع تُرص في مصفوفة (عملات × 6 × شموع) لكل طول —
+    النتيجة جدول منظم (FEATURE_DTYPE) مطابق للدوال العادية.
+    Score هنا بدون OrderBook / Breakout / قطاع — score_batch يضيفها.
+    """
+    syms  = list(kds)
+    table = np.zeros(len(syms), dtype=FEATURE_DTYPE)
+    table["symbol"] = syms
+    groups = {}   # type: Dict[int, List[int]]
+    for i, sym in enumerate(syms):
+        groups.setdefault(len(kds[sym]), []).append(i)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for L, idx in groups.items():
+            if L == 0: continue
+            X   = np.stack([kds[syms[i]].buf[:, kds[syms[i]].start:kds[syms[i]].end]
+                            for i in idx])
+            avg = np.array([kds[syms[i]].avg_vol for i in idx])
+            sub = table[idx]
+            _kernel(X, avg, sub)
+            table[idx] = sub
+        table["score"] = score_batch(table)
+    return table
+
+
+def table_features(row):
+    # type: (np.void) -> Dict[str, Any]
+    """صف من scan_features → نفس شكل indicator_features."""
+    pd_r = ""
+    if row["pd"]:
+        rise, drop = float(row["pd_rise"]), float(row["pd_drop"])
+        pd_r = ("Pump {:.0f}% Dump {:.0f}%".format(rise, drop)
+                if drop >= PD_MIN_DROP else "ارتفاع مفرط {:.0f}%".format(rise))
+    return {
+        "pd":     (bool(row["pd"]), pd_r),
+        "st":     ST_CODES[int(row["st"])],
+        "spike":  (bool(row["spike"]),  float(row["spike_r"])),
+        "accum":  (bool(row["accum"]),  float(row["accum_s"])),
+        "consol": (bool(row["consol"]), float(row["consol_s"])),
+        "hl":     (bool(row["hl"]),     float(row["hl_pct"])),
+        "green":  (bool(row["green"]),  float(row["green_pct"])),
+        "sl_atr": float(row["sl_atr"]),
+    }
+
+
+def score_batch(table, ob_bid=None, ob_imb=None, bo_str=None, in_hot=None):
+    # type: (np.ndarray, Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]) -> np.ndarray
+    """
+    calculate_score لكل الجدول دفعة واحدة.
+    ob_bid / ob_imb: NaN = لا يوجد OrderBook لهذه العملة.
+    """
+    n   = len(table)
+    avg = table["avg_vol"]
+    r   = np.divide(table["last_vol"], avg, out=np.zeros(n), where=avg > 0)
+    score = np.select([r >= 3, r >= 2, r >= 1.5], [15, 10, 6], 0)
+
+    score += np.select([table["st"] == 1, table["st"] == -1], [10, -5], 0)
+
+    if ob_bid is not None and ob_imb is not None:
+        has = ~np.isnan(ob_bid)
+        score += np.where(has & (ob_bid >= MIN_BID_DEPTH), 5, 0)
+        score += np.where(has, np.select([ob_imb >= 2, ob_imb >= 1.5, ob_imb >= 1],
+                                         [7, 5, 3], 0), 0)
+
+    sr = table["spike_r"]
+    score += np.where(table["spike"], np.select([sr >= 5, sr >= 3.5], [10, 7], 5), 0)
+    score += np.where(table["accum"],
+                      np.maximum(np.trunc(table["accum_s"] / 100 * 8), 5), 0).astype(int)
+    score += np.where(table["consol"],
+                      np.maximum(np.trunc(table["consol_s"] / 100 * 8), 4), 0).astype(int)
+    hp = table["hl_pct"]
+    score += np.where(table["hl"], np.select([hp >= 80, hp >= 70], [8, 5], 3), 0)
+    gp = table["green_pct"]
+    score += np.where(table["green"], np.select([gp >= 75, gp >= 60], [7, 4], 2), 0)
+    score += np.where(table["trend_up"], 5, 0)
+
+    if bo_str is not None:
+        score += np.where(bo_str > 0, np.maximum(np.trunc(bo_str / 100 * 10), 6), 0).astype(int)
+    if in_hot is not None:
+        score += np.where(in_hot, SECTOR_BONUS, 0)
+
+    return np.clip(score, 0, 100)
+
+
 # ═══════════════════════════════════════════════
 #   DEEP SCAN — يُشغَّل كل 4 ساعات
 # ═══════════════════════════════════════════════
-def deep_scan(symbol, price, change):
-    # type: (str, float, float) -> None
+def deep_scan(symbol, price, change, kd=None, feats=None):
+    # type: (str, float, float, Optional[OHLCV], Optional[Dict]) -> None
     """
     الفحص الكامل: Klines + OrderBook + كل المؤشرات.
     يُشغَّل فقط على candidates بعد الفلتر المسبق.
+    kd / feats: جاهزة من run_deep_scan (scan_features) — وإلا تُحسب هنا.
     """
     if symbol in tracked: return
 
@@ -1297,11 +3365,13 @@ def deep_scan(symbol, price, change):
         return
 
     # الشموع (من Cache إذا وُجدت)
-    kd = get_klines(symbol, "15m", 50)
+    if kd is None:
+        kd = get_klines(symbol, "15m", 50)
     if not kd: return
+    f = feats or indicator_features(kd)
 
     # Pump & Dump
-    is_pd, pd_r = detect_pump_dump(kd)
+    is_pd, pd_r = f["pd"]
     if is_pd:
         log.debug("🚫 P&D: %s | %s", symbol, pd_r)
         return
@@ -1310,11 +3380,11 @@ def deep_scan(symbol, price, change):
     if kd["vols"][-1] < kd["avg_vol"] * 1.2: return
 
     # Supertrend
-    st = get_supertrend(kd)
+    st = f["st"]
     if st == "DOWN" and symbol not in hot_symbols: return
 
     # Green Candles
-    ig, gp = detect_green_candles(kd)
+    ig, gp = f["green"]
     if not ig: return
 
     # Order Book (طلب API إضافي — نادر لأن 90% رُفضوا مسبقاً)
@@ -1324,15 +3394,14 @@ def deep_scan(symbol, price, change):
         if ob["bid"] < MIN_BID_DEPTH: return
 
     # تحليلات
-    vol_spike  = detect_volume_spike(kd)
-    vol_accum  = detect_volume_accum(kd)
-    consol     = detect_consolidation(kd)
-    higher_lows= detect_higher_lows(kd)
+    vol_spike  = f["spike"]
+    vol_accum  = f["accum"]
+    consol     = f["consol"]
+    higher_lows= f["hl"]
     is_bo, bo_str, bo_desc = detect_pre_breakout(symbol)
 
     in_hot = symbol in hot_symbols
-    sector = next((s for s,syms in SECTORS.items()
-                   if symbol in syms and s in hot_sectors), "")
+    sector = sector_index.first(symbol, hot_sectors)
 
     score = calculate_score(kd, ob, vol_accum, vol_spike, consol,
                             higher_lows, (ig,gp), bo_str, in_hot, st)
@@ -1343,18 +3412,21 @@ def deep_scan(symbol, price, change):
     if not label or score < min_s:
         return
 
-    sl_pct = calc_sl(kd, score, ob, is_bo)
-
-    tracked[symbol] = {
-        "entry":      price,
-        "peak":       price,
-        "level":      1,
-        "score":      score,
-        "sl_pct":     sl_pct,
-        "entry_time": time.time(),
-        "last_alert": time.time(),
-    }
-    discovered[symbol] = {"price": price, "time": time.time(), "score": score}
+    sl_pct = calc_sl(kd, score, ob, is_bo, f["sl_atr"])
+
+    with state_lock:
+        # خيط آخر (Stage-3 أو Scan سابق) قد يكون سبقنا
+        if symbol in tracked: return
+        tracked[symbol] = {
+            "entry":      price,
+            "peak":       price,
+            "level":      1,
+            "score":      score,
+            "sl_pct":     sl_pct,
+            "entry_time": time.time(),
+            "last_alert": time.time(),
+        }
+        discovered[symbol] = {"price": price, "time": time.time(), "score": score}
 
     # بناء نص الإشارة
     sigs = ""
@@ -1410,6 +3482,174 @@ def deep_scan(symbol, price, change):
              symbol, score, in_hot, is_bo, sl_pct)
 
 
+def run_deep_scan(symbols, verbose=True):
+    # type: (List[str], bool) -> None
+    """
+    Deep Scan متزامن: SCAN_WORKERS عملات بالتوازي تحت ميزانية SCAN_MAX_RPS
+    (scan_limiter) وميزانية الوزن العامة (api_limiter داخل safe_get).
+    يعمل في خيط منفصل — حلقة الأسعار والـ Trailing تستمر أثناءه.
+      1. شموع 15m لكل المرشحين بالتوازي
+      2. كل المؤشرات دفعة واحدة (scan_features)
+      3. فقط من تجاوز البوابات → OrderBook + 4h + Score
+    السعر يُقرأ من market_snapshot لحظة الفحص (ليس لحظة بدء الـ Scan).
+    """
+    t0   = time.time()
+    jobs = {}
+    for sym in symbols:
+        if sym in tracked: continue
+        if market_snapshot.get("price", sym) <= 0: continue
+        if market_state == "DANGER" and sym not in hot_symbols: continue
+        jobs[scan_pool.submit(get_klines, sym, "15m", 50)] = sym
+
+    kds = {}
+    with timed("deep_scan_klines"):
+        for fut in as_completed(jobs):
+            exc = fut.exception()
+            if exc:
+                log.debug("Klines خطأ [%s]: %s", jobs[fut], exc)
+            elif fut.result():
+                kds[jobs[fut]] = fut.result()
+
+    with timed("deep_scan_features"):
+        table = scan_features(kds)
+    passed = {}
+    for sym, row in zip(kds, table):   # بالموضع — نفس ترتيب scan_features
+        if row["pd"] or not row["vol_ok"] or not row["green"]: continue
+        if row["st"] == -1 and sym not in hot_symbols: continue
+        passed[scan_pool.submit(_scan_job, sym, kds[sym], table_features(row))] = sym
+
+    with timed("deep_scan_score"):
+        for fut in as_completed(passed):
+            exc = fut.exception()
+            if exc:
+                log.debug("Deep Scan خطأ [%s]: %s", passed[fut], exc)
+
+    if METRICS_ENABLED:
+        metrics.observe("phase", "deep_scan", time.time() - t0)
+    (log.info if verbose else log.debug)(
+        "✅ Deep Scan انتهى | %d عملة | %d تجاوزت البوابات | %.0fs",
+        len(kds), len(passed), time.time() - t0)
+
+
+def _scan_job(symbol, kd=None, feats=None):
+    # type: (str, Optional[OHLCV], Optional[Dict]) -> None
+    snap  = market_snapshot
+    price = snap.get("price", symbol)
+    if price <= 0: return
+    deep_scan(symbol, price, snap.get("change", symbol), kd, feats)
+
+
+def scan_busy():
+    # type: () -> bool
+    return scan_thread is not None and scan_thread.is_alive()
+
+
+def start_deep_scan(symbols=None):
+    # type: (Optional[List[str]]) -> bool
+    """
+    يبدأ Deep Scan في الخلفية — لا يبدأ ثانياً إذا الأول لم ينتهِ.
+    بدون symbols: كل المرشحين (المسح الكامل). مع symbols: دفعة من الطابور.
+    """
+    global scan_thread
+    if scan_busy():
+        log.info("⏳ Deep Scan السابق ما زال يعمل — تخطي")
+        return False
+    if symbols is None:
+        log.info("🔍 Deep Scan — %d عملة...", len(candidates))
+    scan_thread = threading.Thread(target=run_deep_scan,
+                                   args=(list(candidates if symbols is None else symbols),
+                                         symbols is None),
+                                   name="deep-scan", daemon=True)
+    scan_thread.start()
+    return True
+
+
+# ═══════════════════════════════════════════════
+#   SCAN SCHEDULER — طابور أولوية للـ Deep Scan
+# ═══════════════════════════════════════════════
+class ScanScheduler(object):
+    """
+    بدل مسح كل المرشحين كل ساعة: heap بأولوية كل مرشح من إشارات ticker رخيصة
+      ● قطاع ساخن + مرحلة Momentum الحالية
+      ● تسارع تغيير 24h ونمو الحجم منذ الصورة السابقة — تتراكم حتى الفحص
+        وتضعف SCHED_DECAY كل دورة
+      ● عمر آخر فحص — كل مرشح يصل SCHED_MIN_PRIORITY خلال ساعة (ضمان التغطية)
+    drain() يسحب أعلى الطابور حسب ميزانية API المتاحة الآن.
+    """
+
+    def __init__(self):
+        self.heap      = []     # type: List[Tuple[float, int, str]]  (-أولوية, ترتيب, رمز)
+        self.boost     = {}     # type: Dict[str, float]  إشارات متراكمة منذ آخر فحص
+        self.last_scan = {}     # type: Dict[str, float]
+        self.prev      = None   # type: Optional[MarketSnapshot]
+        self.scanned   = 0
+
+    def update(self, snap, symbols, now):
+        # type: (MarketSnapshot, List[str], float) -> None
+        """يعيد بناء الطابور من الصورة الحالية (عمليات NumPy على المرشحين فقط)."""
+        index = snap.index
+        syms  = [s for s in symbols if s in index and s not in tracked]
+        prev, self.prev = self.prev, snap
+        if not syms:
+            self.heap = []
+            return
+        W   = SCHED_WEIGHTS
+        n   = len(syms)
+        r   = np.fromiter((index[s] for s in syms), dtype=np.int64, count=n)
+        change, vol = snap.change[r], snap.vol[r]
+
+        sig = np.zeros(n)
+        if prev is not None and len(prev):
+            p     = np.fromiter((prev.index.get(s, -1) for s in syms), dtype=np.int64, count=n)
+            old   = np.maximum(p, 0)
+            has   = p >= 0
+            accel = np.where(has, change - prev.change[old], 0.0)
+            pv    = np.where(has, prev.vol[old], 0.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                growth = np.where(pv > 0, (vol / pv - 1) * 100, 0.0)
+            sig = (W["accel"] * np.clip(np.nan_to_num(accel), 0, 4)
+                   + W["vol"] * np.clip(np.nan_to_num(growth), 0, 20))
+
+        boost = np.fromiter((self.boost.get(s, 0.0) for s in syms), dtype=np.float64,
+                            count=n) * SCHED_DECAY + sig
+        self.boost = {s: b for s, b in zip(syms, boost.tolist()) if b > 0.01}
+
+        last  = np.fromiter((self.last_scan.get(s, 0.0) for s in syms), dtype=np.float64,
+                            count=n)
+        hot   = np.fromiter((s in hot_symbols for s in syms), dtype=bool, count=n)
+        stage = np.fromiter((momentum_stage.get(s, {}).get("stage", 0) for s in syms),
+                            dtype=np.float64, count=n)
+        prio  = (W["hot"] * hot + W["stage"] * stage + boost
+                 + W["age"] * np.minimum((now - last) / DEEP_SCAN_EVERY, 2.0))
+
+        ok = (prio >= SCHED_MIN_PRIORITY) & (now - last >= SCHED_RESCAN)
+        # عند التساوي: ترتيب المرشحين (الحجم) — نفس ترتيب المسح الكامل
+        self.heap = [(-float(prio[i]), i, syms[i]) for i in np.flatnonzero(ok).tolist()]
+        heapq.heapify(self.heap)
+
+    def drain(self, limit, now):
+        # type: (int, float) -> List[str]
+        """أعلى limit عملة من الطابور — تُسجل كمفحوصة وتبدأ إشاراتها من الصفر."""
+        batch = []
+        while self.heap and len(batch) < limit:
+            _, _, sym = heapq.heappop(self.heap)
+            batch.append(sym)
+            self.last_scan[sym] = now
+            self.boost.pop(sym, None)
+        self.scanned += len(batch)
+        return batch
+
+
+scan_scheduler = ScanScheduler()
+
+
+def scan_budget():
+    # type: () -> int
+    """كم عملة تُفحص الآن بدون انتظار: رصيد api_limiter بعد حجز طلبات الدورة."""
+    budget = api_limiter.stats()["budget"] - SCHED_API_RESERVE
+    return int(max(0, min(SCHED_BATCH, budget // API_WEIGHTS[MEXC_KLINES][0])))
+
+
 # ═══════════════════════════════════════════════
 #   SIGNAL PROGRESSION (#2, #3)
 # ═══════════════════════════════════════════════
@@ -1443,6 +3683,27 @@ def check_progression(symbol, price):
         log.info("🔥 #3 | %s +%.2f%%", symbol, gain)
 
 
+def check_tracked(snap, symbols):
+    # type: (MarketSnapshot, Set[str]) -> None
+    """
+    Trailing + Progression للرموز المتغيرة فقط.
+    + من انتهى cooldown إشارته منذ آخر فحص — قد يستحق #2/#3 بنفس السعر.
+    """
+    global last_tracked_check
+    now, since = time.time(), last_tracked_check
+    last_tracked_check = now
+    for sym in list(tracked):
+        if sym not in snap:
+            continue
+        if sym not in symbols:
+            ready = tracked[sym].get("last_alert", 0) + ALERT_COOLDOWN_SEC
+            if not since < ready <= now:
+                continue
+        price = snap.get("price", sym)
+        if not check_trailing(sym, price):
+            check_progression(sym, price)
+
+
 # ═══════════════════════════════════════════════
 #   CLEANUP & REPORT
 # ═══════════════════════════════════════════════
@@ -1453,7 +3714,16 @@ def cleanup():
               if now - d["entry_time"] > STALE_REMOVE_SEC]:
         log.info("🗑️ %s", s)
         del tracked[s]
+    # Momentum: أسعار رموز اختفت من السوق + تنبيهات انتهى cooldown لها —
+    # بدونها تكبر الخرائط (وملف STATE_FILE) بلا حد
+    with state_lock:
+        for s in [s for s, ts in price_prev_ts.items() if now - ts > STALE_REMOVE_SEC]:
+            price_prev.pop(s, None)
+            del price_prev_ts[s]
+        for s in [s for s, ts in momentum_alerted.items() if now - ts >= MOMENTUM_COOLDOWN]:
+            del momentum_alerted[s]
     clear_expired_cache()
+    depth_cache.expire()
 
 
 def send_report():
@@ -1463,10 +3733,14 @@ def send_report():
     last_report = time.time()
     rows = []
     for sym, d in list(discovered.items()):
-        pd = safe_get(MEXC_PRICE, {"symbol": sym})
-        if not pd: continue
         try:
-            cur = float(pd["price"])
+            if sym in market_snapshot:
+                cur = market_snapshot.get("price", sym)
+            else:
+                src, raw_sym = source_for(sym)
+                tk = src.ticker(raw_sym)
+                if not tk: continue
+                cur = tk[0]
             gr  = (cur - d["price"]) / d["price"] * 100
             if gr > 3: rows.append((sym, gr, d["score"]))
         except: pass
@@ -1479,29 +3753,654 @@ def send_report():
     send(msg)
 
 
+# ═══════════════════════════════════════════════
+#   CHECKPOINT — حفظ الحالة واستعادتها (SQLite)
+# ═══════════════════════════════════════════════
+class StateStore(object):
+    """
+    ملف SQLite واحد بجدولين:
+      ● kv:     اسم → JSON (tracked / discovered / momentum_stage / ...)
+      ● klines: مفتاح Cache → شموع (float64 خام) + وقت الجلب
+    الشموع تُكتب فقط إذا تغيرت منذ آخر حفظ (ts مختلف) وتُحذف إذا خرجت من Cache.
+    """
+
+    def __init__(self, path):
+        # type: (str) -> None
+        self.path = path
+        self.db   = sqlite3.connect(path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS kv "
+                        "(key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS klines "
+                        "(key TEXT PRIMARY KEY, ts REAL, window INTEGER, "
+                        "n INTEGER, data BLOB)")
+        self.db.commit()
+        self._saved = {}   # type: Dict[str, float]  آخر ts محفوظ لكل مفتاح
+
+    def save(self, kv, cache):
+        # type: (Dict[str, Any], Dict[str, Tuple[OHLCV, float]]) -> int
+        """يرجع عدد سلاسل الشموع المكتوبة."""
+        changed = [(k, d, ts) for k, (d, ts) in cache.items()
+                   if self._saved.get(k) != ts]
+        removed = [k for k in self._saved if k not in cache]
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO kv VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in kv.items()])
+            self.db.executemany(
+                "INSERT OR REPLACE INTO klines VALUES (?, ?, ?, ?, ?)",
+                [(k, ts, d.window, len(d), d.rows().tobytes())
+                 for k, d, ts in changed])
+            self.db.executemany("DELETE FROM klines WHERE key = ?",
+                                [(k,) for k in removed])
+        for k, _, ts in changed:
+            self._saved[k] = ts
+        for k in removed:
+            del self._saved[k]
+        return len(changed)
+
+    def load(self):
+        # type: () -> Tuple[Dict[str, Any], Dict[str, Tuple[OHLCV, float]]]
+        kv = {k: json.loads(v) for k, v in self.db.execute("SELECT key, value FROM kv")}
+        cache = {}
+        for k, ts, window, n, blob in self.db.execute(
+                "SELECT key, ts, window, n, data FROM klines"):
+            rows = np.frombuffer(blob, dtype=np.float64).reshape(6, n)
+            cache[k] = (OHLCV.from_array(rows, window), ts)
+            self._saved[k] = ts
+        return kv, cache
+
+    def close(self):
+        # type: () -> None
+        self.db.close()
+
+
+state_store = None   # type: Optional[StateStore]
+
+
+def save_state(force=False):
+    # type: (bool) -> None
+    """يحفظ الحالة كل STATE_SAVE_EVERY (أو فوراً مع force)."""
+    global last_state_save
+    if state_store is None:
+        return
+    now = time.time()
+    if not force and now - last_state_save < STATE_SAVE_EVERY:
+        return
+    last_state_save = now
+
+    t0 = time.time()
+    with state_lock:
+        kv = {
+            "saved_at":           now,
+            "tracked":            tracked,
+            "discovered":         discovered,
+            "momentum_stage":     momentum_stage,
+            "momentum_alerted":   momentum_alerted,
+            "price_prev":         price_prev,
+            "price_prev_ts":      price_prev_ts,
+            "stable_vol_history": stable_vol_history,
+            "sector_vol_history": sector_vol_history,
+            "smart_money_alert":  smart_money_alert,
+            "hot_sectors":        hot_sectors,
+            "candidates":         candidates,
+            "scan_last":          scan_scheduler.last_scan,
+            "market": {
+                "btc_change_24h": btc_change_24h,
+                "btc_trend_1h":   btc_trend_1h,
+                "market_state":   market_state,
+            },
+            "timers": {
+                "tickers": last_tickers,  "btc":    last_btc,
+                "sectors": last_sectors,  "smart":  last_smart_money,
+                "deep":    last_deep_scan, "stale": last_stale,
+                "report":  last_report,
+            },
+        }
+        kv = json.loads(json.dumps(kv))   # نسخة ثابتة قبل ترك القفل
+    try:
+        n = state_store.save(kv, klines_cache.copy())
+        log.debug("💾 State: %d إشارة | %d شموع جديدة | %.0fms",
+                  len(tracked), n, (time.time() - t0) * 1000)
+    except (sqlite3.Error, ValueError) as e:
+        log.error("💾 State save: %s", e)
+
+
+def load_state():
+    # type: () -> bool
+    """
+    يفتح STATE_FILE ويستعيد الحالة.
+    يرجع True إذا الحالة حديثة بما يكفي لبداية دافئة (بدون Warm-up).
+    """
+    global state_store, hot_sectors, hot_symbols, candidates, smart_money_alert
+    global btc_change_24h, btc_trend_1h, market_state
+    global last_tickers, last_btc, last_sectors, last_smart_money
+    global last_deep_scan, last_stale, last_report, last_state_save
+    if not STATE_FILE:
+        return False
+    try:
+        state_store = StateStore(STATE_FILE)
+        kv, cache = state_store.load()
+    except (sqlite3.Error, ValueError) as e:
+        log.error("💾 State [%s]: %s — بداية باردة", STATE_FILE, e)
+        return False
+
+    age = time.time() - kv.get("saved_at", 0)
+    if not kv or age > STATE_MAX_AGE:
+        return False
+
+    with state_lock:
+        tracked.update(kv.get("tracked", {}))
+        discovered.update(kv.get("discovered", {}))
+        momentum_stage.update(kv.get("momentum_stage", {}))
+        momentum_alerted.update(kv.get("momentum_alerted", {}))
+        price_prev.update(kv.get("price_prev", {}))
+        price_prev_ts.update(kv.get("price_prev_ts", {}))
+        stable_vol_history.update(kv.get("stable_vol_history", {}))
+        sector_vol_history.update(kv.get("sector_vol_history", {}))
+        klines_cache.update(cache)
+        smart_money_alert = kv.get("smart_money_alert", False)
+        hot_sectors = [s for s in kv.get("hot_sectors", []) if s in SECTORS]
+        hot_symbols = {c for s in hot_sectors for c in SECTORS[s]}
+        candidates  = kv.get("candidates", [])
+        scan_scheduler.last_scan.update(kv.get("scan_last", {}))
+
+        m = kv.get("market", {})
+        btc_change_24h = m.get("btc_change_24h", btc_change_24h)
+        btc_trend_1h   = m.get("btc_trend_1h", btc_trend_1h)
+        market_state   = m.get("market_state", market_state)
+
+        t = kv.get("timers", {})
+        last_tickers     = t.get("tickers", 0.0)
+        last_btc         = t.get("btc", 0.0)
+        last_sectors     = t.get("sectors", 0.0)
+        last_smart_money = t.get("smart", 0.0)
+        last_deep_scan   = t.get("deep", 0.0)
+        last_stale       = t.get("stale", 0.0)
+        last_report      = t.get("report", 0.0)
+        last_state_save  = time.time()
+
+    log.info("♻️ State: %d إشارة | %d مراحل | %d شموع | عمر %.0f ثانية",
+             len(tracked), len(momentum_stage), len(klines_cache), age)
+    return True
+
+
+def _on_sigterm(signum, frame):
+    # Heroku يرسل SIGTERM عند إعادة التشغيل → نفس مسار الإيقاف (حفظ الحالة)
+    raise KeyboardInterrupt
+
+
+# ═══════════════════════════════════════════════
+#   RECORDER — تسجيل السوق للـ Backtest (backtest.py)
+# ═══════════════════════════════════════════════
+RECORD_ENDPOINTS = (MEXC_KLINES, MEXC_DEPTH)
+
+
+class Recorder(object):
+    """
+    يسجل ما يراه البوت فعلاً ليعاد تشغيله بدون API:
+      ● snapshots-<ts>.npz: ts (T) + symbols (S) + data (T × 5 × S) float32
+        (الرمز الغائب في دورة = NaN) — ملف لكل RECORD_CHUNK دورة
+      ● responses-<YYYYmmddHH>.jsonl.gz: {"t", "e", "p", "r"} لكل رد Klines/Depth
+    الكتابة المضغوطة للصور في خيط منفصل — الحلقة لا تنتظر.
+    """
+
+    def __init__(self, path, chunk=RECORD_CHUNK):
+        # type: (str, int) -> None
+        self.path  = path
+        self.chunk = chunk
+        self.steps = []     # type: List[Tuple[float, List[str], np.ndarray]]
+        self._lock = threading.Lock()
+        self._fh   = None   # type: Optional[Any]
+        self._hour = ""
+        os.makedirs(path, exist_ok=True)
+
+    def snapshot(self, snap):
+        # type: (MarketSnapshot) -> None
+        self.steps.append((time.time(), snap.symbols, snap.data.astype(np.float32)))
+        if len(self.steps) >= self.chunk:
+            steps, self.steps = self.steps, []
+            threading.Thread(target=self._write_chunk, args=(steps,),
+                             name="recorder", daemon=True).start()
+
+    def _write_chunk(self, steps):
+        # type: (List[Tuple[float, List[str], np.ndarray]]) -> None
+        pos = {}   # type: Dict[str, int]
+        for _, syms, _ in steps:
+            for s in syms:
+                if s not in pos:
+                    pos[s] = len(pos)
+        data = np.full((len(steps), 5, len(pos)), np.nan, dtype=np.float32)
+        prev, cols = None, None
+        for t, (_, syms, d) in enumerate(steps):
+            if syms is not prev:
+                prev, cols = syms, np.array([pos[s] for s in syms], dtype=int)
+            data[t][:, cols] = d
+        name = os.path.join(self.path, "snapshots-{}.npz".format(int(steps[0][0])))
+        try:
+            np.savez_compressed(name, ts=np.array([st[0] for st in steps]),
+                                symbols=np.array(list(pos)), data=data)
+        except OSError as e:
+            log.error("🎞️ Recorder: %s", e)
+
+    def response(self, url, params, data):
+        # type: (str, Optional[dict], Any) -> None
+        now  = time.time()
+        line = json.dumps({"t": now, "e": url.split("/")[-1], "p": params or {}, "r": data},
+                          separators=(",", ":"))
+        hour = datetime.fromtimestamp(now).strftime("%Y%m%d%H")
+        with self._lock:
+            try:
+                if hour != self._hour:
+                    if self._fh is not None:
+                        self._fh.close()
+                    self._fh = gzip.open(os.path.join(
+                        self.path, "responses-{}.jsonl.gz".format(hour)), "at",
+                        encoding="utf-8")
+                    self._hour = hour
+                self._fh.write(line + "\n")
+            except OSError as e:
+                log.error("🎞️ Recorder: %s", e)
+
+    def close(self):
+        # type: () -> None
+        if self.steps:
+            self._write_chunk(self.steps)
+            self.steps = []
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+recorder = Recorder(RECORD_DIR) if RECORD_DIR else None   # type: Optional[Recorder]
+
+
+# ═══════════════════════════════════════════════
+#   STREAMING — WebSocket بدل Polling كل 12 ثانية
+# ═══════════════════════════════════════════════
+class MarketStream(object):
+    """
+    بث miniTickers من MEXC → خرائط السوق في الذاكرة.
+      ● كل رسالة تُحدّث الخرائط وتستدعي on_update(الرموز المتغيرة)
+      ● إعادة اتصال تلقائية — الحلقة الرئيسية ترجع لـ REST أثناء الانقطاع
+      ● seed(صورة REST كاملة) قبل أن يُعتبر سليماً — الرسائل الأولى جزئية
+        ولا تكفي لبناء candidates أو القطاعات
+      ● STREAM_RECORD_FILE: يسجل الرسائل الخام (سطر JSON لكل رسالة)
+        ليعيد replay_ws.py تشغيلها محلياً
+    """
+
+    def __init__(self, url, channel, on_update, record=True):
+        self.url       = url
+        self.channel   = channel
+        self.on_update = on_update
+        self.live      = MarketSnapshot.empty()
+        self.seeded    = False   # الصورة الحية بدأت من صورة REST كاملة
+        self.last_msg  = 0.0
+        self.connected = False
+        self.frames    = 0
+        self._ws       = None
+        self._lock     = threading.Lock()
+        self._stop     = threading.Event()
+        self._record   = open(STREAM_RECORD_FILE, "a", encoding="utf-8") \
+            if STREAM_RECORD_FILE and record else None
+
+    def start(self):
+        # type: () -> None
+        threading.Thread(target=self._run, name="stream", daemon=True).start()
+
+    def stop(self):
+        # type: () -> None
+        self._stop.set()
+        if self._ws is not None:
+            self._ws.close()
+
+    def healthy(self):
+        # type: () -> bool
+        return (self.seeded and self.connected and len(self.live) > 0 and
+                time.time() - self.last_msg < STREAM_STALE_SEC)
+
+    def seed(self, snap):
+        # type: (MarketSnapshot) -> None
+        """
+        الصورة الحية = صورة REST كاملة + ما وصل من الرسائل فوقها.
+        رموز المصادر الإضافية ("اسم:رمز") ليست على هذا البث.
+        """
+        if not len(snap):
+            return
+        rows = [r for r, sym in enumerate(snap.symbols) if ":" not in sym]
+        base = MarketSnapshot([snap.symbols[r] for r in rows], snap.data[:, rows], ts=snap.ts)
+        with self._lock:
+            live = self.live
+            if len(live):
+                base.update([(sym,) + tuple(live.data[:, r].tolist())
+                             for r, sym in enumerate(live.symbols)])
+            self.live   = base
+            self.seeded = True
+
+    def snapshot(self):
+        # type: () -> MarketSnapshot
+        """نسخة ثابتة من الصورة الحية (آمنة للقراءة من خيط آخر)."""
+        with self._lock:
+            return self.live.copy()
+
+    # ── الاتصال ──────────────────────────────────
+    def _run(self):
+        # type: () -> None
+        while not self._stop.is_set():
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=lambda ws, e: log.debug("Stream خطأ: %s", e),
+                on_close=self._on_close,
+            )
+            try:
+                self._ws.run_forever()
+            except Exception as e:
+                log.debug("Stream: %s", e)
+            self.connected = False
+            if not self._stop.is_set():
+                log.warning("⚠️ Stream منقطع — REST حتى إعادة الاتصال (%ds)",
+                            STREAM_RETRY_SEC)
+                self._stop.wait(STREAM_RETRY_SEC)
+
+    def _on_open(self, ws):
+        ws.send(json.dumps({"method": "SUBSCRIPTION", "params": [self.channel]}))
+        self.connected = True
+        log.info("📡 Stream متصل: %s", self.channel)
+        self._start_ping(ws)
+
+    def _start_ping(self, ws):
+        threading.Thread(target=self._ping, args=(ws,), name="stream-ping",
+                         daemon=True).start()
+
+    def _ping(self, ws):
+        while self.connected and self._ws is ws and not self._stop.is_set():
+            self._stop.wait(STREAM_PING_SEC)
+            try:
+                ws.send(json.dumps({"method": "PING"}))
+            except Exception:
+                return
+
+    def _on_close(self, ws, *args):
+        self.connected = False
+
+    def _on_message(self, ws, msg):
+        self.last_msg = time.time()
+        self.frames  += 1
+        if self._record:
+            self._record.write(json.dumps({"t": self.last_msg, "m": msg}) + "\n")
+        try:
+            data = json.loads(msg)
+        except ValueError:
+            return
+        d = data.get("d") if isinstance(data, dict) else None
+        if not d:
+            return   # رد الاشتراك / PONG
+        items   = d if isinstance(d, list) else d.get("data", [d])
+        updated = self.apply(items)
+        if updated:
+            try:
+                self.on_update(updated)
+            except Exception as e:
+                log.error("Stream update: %s", e, exc_info=True)
+
+    def apply(self, items):
+        # type: (List[Dict]) -> List[str]
+        """
+        miniTicker: s=الرمز  p=السعر  r=نسبة التغيير (كسر: 0.05 = 5%)
+                    h/l=أعلى/أدنى  v=حجم بالـ USDT
+        """
+        rows = []
+        for t in items:
+            try:
+                rows.append((t["s"], float(t["p"]), float(t["r"]) * 100,
+                             float(t["v"]), float(t["h"]), float(t["l"])))
+            except (KeyError, ValueError, TypeError):
+                continue
+        with self._lock:
+            self.live.update(rows)
+        return [row[0] for row in rows]
+
+
+class DepthStream(MarketStream):
+    """
+    دفتر أوامر محلي (أول 20 مستوى) لعدد محدود من العملات:
+      ● كل رسالة limit.depth تحمل أول 20 مستوى — bid/ask/imb تُحدّث مع كل رسالة
+        (نفس نافذة REST limit=20 التي بُني عليها الـ Score)
+      ● watch(symbols) يضيف/يلغي الاشتراكات حسب الحاجة (حد MEXC: 30)
+      ● get_order_book يقرأ من هنا أولاً — بدون طلب REST
+    """
+
+    def __init__(self, url):
+        # type: (str) -> None
+        # التسجيل (STREAM_RECORD_FILE) لبث الأسعار فقط
+        MarketStream.__init__(self, url, "depth", None, record=False)
+        self.symbols = set()   # type: Set[str]
+        self.books   = {}      # type: Dict[str, Dict]
+        self.stamps  = {}      # type: Dict[str, float]   # وقت آخر رسالة لكل دفتر
+
+    def healthy(self):
+        # type: () -> bool
+        return self.connected and time.time() - self.last_msg < STREAM_STALE_SEC
+
+    def book(self, symbol):
+        # type: (str) -> Optional[Dict]
+        """دفتر أقدم من DEPTH_TTL (عملة هادئة أو بث متوقف) → None → REST."""
+        ts = self.stamps.get(symbol)
+        if not self.connected or ts is None or time.time() - ts > DEPTH_TTL:
+            return None
+        return self.books.get(symbol)
+
+    def watch(self, symbols):
+        # type: (List[str]) -> None
+        """الاشتراك في أول DEPTH_STREAM_MAX عملة (بالترتيب) وإلغاء الباقي."""
+        want = set()
+        for s in symbols:
+            if len(want) >= DEPTH_STREAM_MAX:
+                break
+            want.add(s)
+        add, drop = want - self.symbols, self.symbols - want
+        self.symbols = want
+        for s in drop:
+            self.books.pop(s, None)
+            self.stamps.pop(s, None)
+        if self.connected and self._ws is not None:
+            try:
+                if drop:
+                    self._send("UNSUBSCRIPTION", drop)
+                if add:
+                    self._send("SUBSCRIPTION", add)
+            except Exception as e:
+                log.debug("Depth Stream: %s", e)
+
+    def _send(self, method, symbols, ws=None):
+        # type: (str, Set[str], Any) -> None
+        (ws or self._ws).send(json.dumps({
+            "method": method,
+            "params": [DEPTH_CHANNEL.format(s) for s in sorted(symbols)]}))
+
+    def _on_open(self, ws):
+        self.connected = True
+        if self.symbols:
+            self._send("SUBSCRIPTION", self.symbols, ws)
+        log.info("📚 Depth Stream متصل: %d عملة", len(self.symbols))
+        self._start_ping(ws)
+
+    def _on_close(self, ws, *args):
+        self.connected = False
+        self.books.clear()   # بعد الانقطاع لا نثق بالدفتر القديم
+        self.stamps.clear()
+
+    def _on_message(self, ws, msg):
+        self.last_msg = time.time()
+        self.frames  += 1
+        try:
+            data = json.loads(msg)
+            sym  = data.get("s")
+            d    = data.get("d")
+            if not sym or not isinstance(d, dict) or sym not in self.symbols:
+                return   # رد الاشتراك / PONG / عملة أُلغيت
+            self.books[sym] = book_summary(
+                [(float(l["p"]), float(l["v"])) for l in d.get("bids", [])],
+                [(float(l["p"]), float(l["v"])) for l in d.get("asks", [])])
+            self.stamps[sym] = self.last_msg
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return
+
+
+def depth_watchlist():
+    # type: () -> List[str]
+    """
+    الأولوية: tracked ← مراحل Momentum ← القطاعات الساخنة (بين المرشحين).
+    رموز المصادر الإضافية ("اسم:رمز") ليست على بث الأساسي.
+    """
+    with state_lock:
+        out = list(tracked) + [s for s in momentum_stage if s not in tracked]
+    seen = set(out)
+    out += [s for s in candidates if s in hot_symbols and s not in seen]
+    return [s for s in out if ":" not in s]
+
+
+def on_stream_update(symbols):
+    # type: (List[str]) -> None
+    """
+    يُستدعى من خيط الـ Stream مع كل رسالة:
+    Trailing + Progression + Momentum للرموز المتغيرة فقط — بدون انتظار الدورة.
+    """
+    global market_snapshot
+    with timed("stream_update"):
+        # البث للأساسي فقط — رموز المصادر الإضافية تبقى في الصورة
+        snap = market_snapshot = merge_sources(market_stream.snapshot())
+        syms = set(symbols)
+        with state_lock:
+            check_tracked(snap, syms)
+            detect_momentum(snap, syms)
+
+
+market_stream = None   # type: Optional[MarketStream]
+depth_stream  = None   # type: Optional[DepthStream]
+
+
+def start_stream():
+    # type: () -> None
+    global market_stream, depth_stream
+    if not (STREAM_ENABLED or DEPTH_STREAM):
+        return
+    if websocket is None:
+        log.info("📡 websocket-client غير مثبت — REST فقط")
+        return
+    # البث للمصدر الأساسي فقط — المصادر الإضافية REST بالتوازي (fetch_market)
+    if STREAM_ENABLED:
+        market_stream = sources[0].stream(on_stream_update)
+        if market_stream is not None:
+            market_stream.seed(market_snapshot)   # صورة الإقلاع (REST)
+            market_stream.start()
+    if DEPTH_STREAM:
+        depth_stream = sources[0].depth_stream()
+        if depth_stream is not None:
+            depth_stream.watch(depth_watchlist())
+            depth_stream.start()
+
+
 # ═══════════════════════════════════════════════
 #   MAIN LOOP
 # ═══════════════════════════════════════════════
+def periodic_tasks(now):
+    # type: (float) -> None
+    """BTC / القطاعات / Smart Money / التنظيف — كل منها حسب توقيته."""
+    global last_stale
+    if now - last_btc >= BTC_EVERY:
+        with timed("btc"): analyze_btc()
+    if now - last_sectors >= SECTORS_EVERY:
+        with timed("sectors"): analyze_sectors()
+    if now - last_smart_money >= SMART_MONEY_EVERY:
+        with timed("smart_money"): analyze_smart_money()
+    if now - last_stale >= STALE_EVERY:
+        last_stale = now
+        with timed("cleanup"): cleanup()
+    if depth_stream is not None:
+        depth_stream.watch(depth_watchlist())
+
+
+def process_snapshot(snap, now, streaming=False):
+    # type: (MarketSnapshot, float, bool) -> None
+    """
+    كل ما يعتمد على صورة السوق في دورة واحدة — الحلقة الحية و backtest.py
+    يستدعيانها بنفس الترتيب.
+    """
+    global market_snapshot, last_deep_scan, delta_snapshot
+    market_snapshot = snap
+    if recorder is not None:
+        recorder.snapshot(snap)
+
+    # تحديث candidates كل 15 دقيقة فقط
+    if now - last_tickers >= TICKERS_EVERY:
+        with timed("refresh_tickers"): refresh_tickers(snap)
+        with timed("sectors"): analyze_sectors()  # تحديث القطاعات بعد كل refresh
+
+    # ── Trailing Stop + Signal Progression ──────
+    # (في وضع البث تعمل مع كل رسالة للأساسي — هنا REST أو المصادر الإضافية فقط)
+    # الدلتا: فقط الرموز التي تغير سعرها/حجمها منذ آخر صورة (أول دورة = الكل)
+    polled = secondary_snapshot() if streaming else snap
+    if polled is not None:
+        with timed("delta"):
+            delta = polled.changed(delta_snapshot)
+            delta_snapshot = polled
+        with timed("trailing"), state_lock:
+            check_tracked(snap, delta)
+
+        # ── 🆕 Momentum Detector (كل 12 ثانية) ──────
+        # يرصد تحرك السعر اللحظي ويطلق Deep Scan فوراً
+        with timed("momentum"), state_lock:
+            detect_momentum(snap, delta)
+
+    # ── Deep Scan (في الخلفية) ──────────────────
+    # Scheduler: كل دورة أعلى الطابور حسب ميزانية API | بدونه: كل المرشحين كل ساعة
+    if SCAN_SCHEDULER:
+        with timed("scan_schedule"), state_lock:
+            scan_scheduler.update(snap, candidates, now)
+        if not scan_busy():
+            batch = scan_scheduler.drain(scan_budget(), now)
+            if batch and start_deep_scan(batch):
+                last_deep_scan = now
+    elif now - last_deep_scan >= DEEP_SCAN_EVERY:
+        if start_deep_scan():
+            last_deep_scan = now
+
+
 def run():
-    global last_tickers, last_btc, last_sectors
-    global last_deep_scan, last_stale, last_smart_money
+    global last_deep_scan
 
     log.info("🚀 MAFIO BOT V10 يبدأ...")
+    log.info("🌐 المصادر: %s", ", ".join(
+        "{} ({})".format(src.name, src.kind) for src in sources))
+    signal.signal(signal.SIGTERM, _on_sigterm)
+    if SECTORS_FILE:
+        load_sector_file(SECTORS_FILE)
+
+    if load_state():
+        # ── بداية دافئة: طلب واحد لصورة السوق، والباقي حسب التوقيتات المحفوظة ──
+        refresh_tickers()
+    else:
+        # ── تهيئة كاملة قبل البدء ──────────────────
+        log.info("⏳ تحميل بيانات السوق...")
+        analyze_btc()
 
-    # ── تهيئة كاملة قبل البدء ──────────────────
-    log.info("⏳ تحميل بيانات السوق...")
-    analyze_btc()
-
-    # نكرر refresh_tickers مرتين للتأكد من البيانات
-    refresh_tickers()
-    time.sleep(2)
-    refresh_tickers()   # مرة ثانية للتأكد
+        # نكرر refresh_tickers مرتين للتأكد من البيانات
+        refresh_tickers()
+        time.sleep(2)
+        refresh_tickers()   # مرة ثانية للتأكد
 
-    analyze_sectors()
+        analyze_sectors()
+        last_deep_scan = 0  # نبدأ Deep Scan فوراً
     log.info("✅ جاهز | Candidates: %d | Hot: %s",
              len(candidates), ", ".join(hot_sectors) or "لا يوجد")
 
-    last_deep_scan = 0  # نبدأ Deep Scan فوراً
+    start_stream()
+    start_metrics_server()
 
     send(
         "🤖 *MAFIO BOT SIGNAL V10*\n"
@@ -1509,13 +4408,16 @@ def run():
         "✅ Anti Rate-Limit (~8 req/min)\n"
         "✅ Smart Cache (15m/1h/4h)\n"
         "✅ Trailing Stop (`{trail}%` من القمة)\n"
-        "✅ Sector Rotation (12 قطاع)\n"
+        "✅ Sector Rotation ({sectors} قطاع)\n"
         "✅ Score Min: `{score}` | Deep Scan: كل ساعة\n"
         "✅ Anti P&D | Supertrend | Dynamic SL\n"
         "━━━━━━━━━━━━━━━━━━\n"
         "₿ BTC: `{btc:+.2f}%` | السوق: `{mst}`\n"
-        "🔥 Hot: `{hot}`".format(
+        "🔥 Hot: `{hot}`\n"
+        "📌 إشارات نشطة: `{active}`".format(
+            active=len(tracked),
             trail=TRAIL_DROP_TRIGGER,
+            sectors=len(SECTORS),
             score=SCORE_MIN,
             btc=btc_change_24h,
             mst=market_state,
@@ -1527,80 +4429,59 @@ def run():
     while True:
         try:
             now = time.time()
+            cycle_t0 = time.perf_counter()
 
             # ── تحديثات دورية ────────────────────────
-            if now - last_btc         >= BTC_EVERY:         analyze_btc()
-            if now - last_sectors     >= SECTORS_EVERY:     analyze_sectors()
-            if now - last_smart_money >= SMART_MONEY_EVERY: analyze_smart_money()
-            if now - last_stale       >= STALE_EVERY:
-                cleanup()
-                last_stale = now
-
-            # ── جلب 24h Ticker (كل دورة = طلب واحد) ──
-            # يحتوي على السعر + الحجم + التغيير = كل ما نحتاج
-            tickers_now = safe_get(MEXC_24H)
-            if not tickers_now:
-                time.sleep(CHECK_INTERVAL)
-                continue
-
-            # بناء الخرائط من الـ ticker
-            price_map  = {}
-            change_now = {}
-            vol_now    = {}
-            high_map   = {}
-            low_map    = {}
-            for t in tickers_now:
-                sym = t.get("symbol","")
-                try:
-                    price_map[sym]  = float(t["lastPrice"])
-                    change_now[sym] = float(t["priceChangePercent"])
-                    vol_now[sym]    = float(t["quoteVolume"])
-                    high_map[sym]   = float(t["highPrice"])
-                    low_map[sym]    = float(t["lowPrice"])
-                except (KeyError, ValueError):
-                    pass
-
-            # تحديث all_tickers و changes_map للقطاعات
-            all_tickers = tickers_now
-            changes_map.update(change_now)
-
-            # تحديث candidates كل 15 دقيقة فقط
-            if now - last_tickers >= TICKERS_EVERY:
-                refresh_tickers()
-                analyze_sectors()  # تحديث القطاعات بعد كل refresh
-
-            # ── Trailing Stop + Signal Progression ──────
-            for sym in list(tracked.keys()):
-                if sym in price_map:
-                    if not check_trailing(sym, price_map[sym]):
-                        check_progression(sym, price_map[sym])
-
-            # ── 🆕 Momentum Detector (كل 12 ثانية) ──────
-            # يرصد تحرك السعر اللحظي ويطلق Deep Scan فوراً
-            detect_momentum(price_map, change_now, vol_now, high_map, low_map)
-
-            # ── Deep Scan كل 15 دقيقة ────────────────────
-            if now - last_deep_scan >= DEEP_SCAN_EVERY:
-                log.info("🔍 Deep Scan — %d عملة...", len(candidates))
-                scanned = 0
-                for sym in candidates:
-                    if sym in tracked: continue
-                    price  = price_map.get(sym, 0)
-                    change = changes_map.get(sym, 0)
-                    if price <= 0: continue
-                    deep_scan(sym, price, change)
-                    scanned += 1
-                    if scanned % 10 == 0:
-                        time.sleep(0.5)
-                last_deep_scan = now
-                log.info("✅ Deep Scan انتهى | %d عملة", scanned)
+            periodic_tasks(now)
+
+            # ── Stream متصل: الخرائط من الذاكرة (بدون أي طلب) ──
+            # Trailing و Momentum يعملان مع كل رسالة (on_stream_update)
+            streaming = market_stream is not None and market_stream.healthy()
+            if streaming:
+                snap = market_stream.snapshot()
+                if len(sources) > 1:
+                    with timed("tickers_fetch"):
+                        snap = fetch_market(snap)
+            else:
+                # ── جلب 24h Ticker (كل دورة = طلب واحد لكل مصدر) ──
+                # يحتوي على السعر + الحجم + التغيير = كل ما نحتاج
+                # التحليل مباشرة إلى أعمدة (القطاعات / Smart Money / Deep Scan)
+                with timed("tickers_fetch"):
+                    snap = fetch_market()
+                if not snap:
+                    time.sleep(CHECK_INTERVAL)
+                    continue
+                if market_stream is not None and not market_stream.seeded:
+                    market_stream.seed(snap)   # الإقلاع فشل — أول صورة REST كاملة
+
+            process_snapshot(snap, now, streaming)
 
             cycle += 1
-            send_report()
+            with timed("report"): send_report()
+            with timed("state_save"): save_state()
+            if METRICS_ENABLED:
+                metrics.observe("phase", "cycle", time.perf_counter() - cycle_t0)
+                metrics.maybe_log()
             time.sleep(CHECK_INTERVAL)
 
         except KeyboardInterrupt:
             send("⛔ *MAFIO BOT V10* — تم الإيقاف")
+            scan_pool.shutdown(wait=False, cancel_futures=True)
+            source_pool.shutdown(wait=False, cancel_futures=True)
+            if market_stream is not None:
+                market_stream.stop()
+            if depth_stream is not None:
+                depth_stream.stop()
+            save_state(force=True)
+            if kline_archive is not None:
+                kline_archive.flush()
+            if state_store is not None:
+                state_store.close()
+            if not tg_queue.flush():
+                log.warning("✉️ Telegram: %d رسالة لم تُرسل", tg_queue.pending)
+            tg_queue.stop()
+            if recorder is not None:
+                recorder.close()
             break
         except Exception as e:
             log.error("خطأ: %s", e, exc_info=True)
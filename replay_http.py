@@ -0,0 +1,168 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║        MAFIO BOT — REST STAND-IN SERVER (منصة محلية)        ║
+║      يخدم نفس endpoints الـ MEXC من مجلد ملفات JSON محلي      ║
+╚══════════════════════════════════════════════════════════════╝
+
+المجلد (نفس صيغة FileSource في main.py):
+  market_dir/tickers.json             ← رد ticker/24hr كامل
+  market_dir/tickers.jsonl            ← بديل: رد لكل سطر، كل طلب = السطر التالي
+  market_dir/klines/BTCUSDT_15m.json  ← صفوف [openTime, o, h, l, c, v, ...]
+  market_dir/depth/BTCUSDT.json       ← {"bids": [[p, q]], "asks": [[p, q]]}
+
+التشغيل:
+  python replay_http.py market_dir --port 8081
+  MARKET_SOURCES="mexc,dev=mexc:http://127.0.0.1:8081" python main.py
+
+  ● /api/v3/ticker/24hr و /ticker/price (مع symbol أو بدونه) | /klines | /depth
+  ● klines: startTime + limit مثل MEXC (من startTime للأمام، وإلا آخر limit)
+  ● --latency 0.2  = تأخير كل رد (لاختبار الجلب المتوازي)
+  ● --ban-every 50 = كل 50 طلباً رد 429 مع Retry-After (لاختبار الإيقاف)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+
+class Market(object):
+    """قراءة المجلد — tickers.jsonl يتقدم سطراً مع كل طلب سوق كامل."""
+
+    def __init__(self, path):
+        self.path   = path
+        self.frames = None
+        self.pos    = 0
+        self.lock   = threading.Lock()
+        frames = os.path.join(path, "tickers.jsonl")
+        if os.path.exists(frames):
+            with open(frames, encoding="utf-8") as f:
+                self.frames = [json.loads(line) for line in f if line.strip()]
+
+    def _json(self, *parts):
+        try:
+            with open(os.path.join(self.path, *parts), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def tickers(self, advance=True):
+        with self.lock:
+            if self.frames:
+                data = self.frames[self.pos % len(self.frames)]
+                if advance:
+                    self.pos += 1
+                return data
+        return self._json("tickers.json") or []
+
+    def ticker(self, symbol):
+        # طلب عملة واحدة لا يحرك الـ replay
+        for t in self.tickers(advance=False):
+            if t.get("symbol") == symbol:
+                return t
+        return None
+
+    def klines(self, symbol, interval, limit, start=None):
+        rows = self._json("klines", "{}_{}.json".format(symbol, interval))
+        if rows is None:
+            return None
+        if start is not None:
+            return [r for r in rows if r[0] >= start][:limit]
+        return rows[-limit:]
+
+    def depth(self, symbol, limit):
+        data = self._json("depth", symbol + ".json")
+        if data is None:
+            return None
+        return {"lastUpdateId": int(time.time() * 1000),
+                "bids": data.get("bids", [])[:limit], "asks": data.get("asks", [])[:limit]}
+
+
+# ═══════════════════════════════════════════════
+#   HTTP
+# ═══════════════════════════════════════════════
+def make_handler(market, latency, ban_every):
+    count = [0]
+    lock  = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, data, headers=()):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            q   = {k: v[0] for k, v in parse_qs(url.query).items()}
+            sym = q.get("symbol")
+            with lock:
+                count[0] += 1
+                banned = ban_every and count[0] % ban_every == 0
+            if latency:
+                time.sleep(latency)
+            if banned:
+                return self._reply(429, {"code": 429, "msg": "Too many requests"},
+                                   [("Retry-After", "2")])
+
+            if url.path == "/api/v3/ticker/24hr":
+                data = market.ticker(sym) if sym else market.tickers()
+            elif url.path == "/api/v3/ticker/price":
+                if sym:
+                    t = market.ticker(sym)
+                    data = t and {"symbol": sym, "price": t["lastPrice"]}
+                else:
+                    data = [{"symbol": t["symbol"], "price": t["lastPrice"]}
+                            for t in market.tickers(advance=False)]
+            elif url.path == "/api/v3/klines" and sym:
+                start = q.get("startTime")
+                data = market.klines(sym, q.get("interval", "15m"),
+                                     int(q.get("limit", 500)),
+                                     int(start) if start else None)
+            elif url.path == "/api/v3/depth" and sym:
+                data = market.depth(sym, int(q.get("limit", 100)))
+            else:
+                return self._reply(404, {"code": 404, "msg": "Not found"})
+
+            if data is None:
+                return self._reply(400, {"code": -1121, "msg": "Invalid symbol."})
+            self._reply(200, data)
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve a local market directory as a MEXC-compatible REST API")
+    ap.add_argument("path")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--ban-every", type=int, default=0)
+    args = ap.parse_args()
+
+    market = Market(args.path)
+    srv = ThreadingHTTPServer((args.host, args.port),
+                              make_handler(market, args.latency, args.ban_every))
+    srv.daemon_threads = True
+    print("▶️  http://{}:{} | {} | {}".format(
+        args.host, args.port, args.path,
+        "{} صورة (replay)".format(len(market.frames)) if market.frames else "tickers.json"))
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        srv.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
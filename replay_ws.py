@@ -0,0 +1,186 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║         MAFIO BOT — WebSocket REPLAY SERVER (محلي)          ║
+║     يعيد تشغيل رسائل MEXC المسجلة بدل الاتصال الحقيقي      ║
+╚══════════════════════════════════════════════════════════════╝
+
+التسجيل (من البوت الحقيقي):
+  STREAM_RECORD_FILE=frames.jsonl python main.py
+
+إعادة التشغيل:
+  python replay_ws.py frames.jsonl --port 8765 --speed 10
+  MEXC_WS_URL=ws://127.0.0.1:8765 python main.py
+
+  ● كل سطر في الملف: {"t": وقت الاستلام, "m": الرسالة الخام}
+  ● --speed 10 = أسرع 10 مرات من الزمن الحقيقي (0 = بدون انتظار)
+  ● --loop     = إعادة الملف من البداية عند انتهائه
+  ● يرد على {"method":"PING"} بـ PONG مثل MEXC
+  ● يغلق الاتصال في نهاية الملف (بدون --loop) لاختبار الرجوع لـ REST
+"""
+
+import sys
+import json
+import time
+import base64
+import socket
+import struct
+import hashlib
+import argparse
+import threading
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def load_frames(path):
+    frames = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                rec = json.loads(line)
+                frames.append((float(rec["t"]), rec["m"]))
+    return frames
+
+
+# ═══════════════════════════════════════════════
+#   بروتوكول WebSocket (RFC 6455) — الحد الأدنى
+# ═══════════════════════════════════════════════
+def handshake(conn):
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = conn.recv(4096)
+        if not chunk:
+            return False
+        data += chunk
+    key = ""
+    for line in data.decode("latin-1").split("\r\n"):
+        if line.lower().startswith("sec-websocket-key:"):
+            key = line.split(":", 1)[1].strip()
+    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    conn.sendall((
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        "Sec-WebSocket-Accept: {}\r\n\r\n".format(accept)
+    ).encode())
+    return True
+
+
+def encode_frame(payload, opcode=0x1):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    n = len(payload)
+    if n < 126:
+        head = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 65536:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return head + payload
+
+
+def _recv_exact(conn, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("closed")
+        buf += chunk
+    return buf
+
+
+def read_frame(conn):
+    b1, b2 = _recv_exact(conn, 2)
+    opcode = b1 & 0x0F
+    n = b2 & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", _recv_exact(conn, 2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", _recv_exact(conn, 8))[0]
+    mask = _recv_exact(conn, 4) if b2 & 0x80 else b"\0\0\0\0"
+    data = bytes(b ^ mask[i % 4] for i, b in enumerate(_recv_exact(conn, n)))
+    return opcode, data
+
+
+# ═══════════════════════════════════════════════
+#   جلسة عميل واحد
+# ═══════════════════════════════════════════════
+def serve_client(conn, frames, speed, loop):
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def send(payload, opcode=0x1):
+        with lock:
+            conn.sendall(encode_frame(payload, opcode))
+
+    def reader():
+        try:
+            while not done.is_set():
+                opcode, data = read_frame(conn)
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    send(data, 0xA)
+                elif opcode == 0x1:
+                    msg = json.loads(data.decode("utf-8"))
+                    if msg.get("method") == "PING":
+                        send(json.dumps({"id": 0, "code": 0, "msg": "PONG"}))
+                    elif msg.get("method") == "SUBSCRIPTION":
+                        send(json.dumps({"id": 0, "code": 0,
+                                         "msg": ",".join(msg.get("params", []))}))
+        except (ConnectionError, OSError, ValueError):
+            pass
+        done.set()
+
+    if not handshake(conn):
+        conn.close()
+        return
+    threading.Thread(target=reader, daemon=True).start()
+
+    try:
+        while not done.is_set():
+            start_wall = time.time()
+            start_rec  = frames[0][0] if frames else 0.0
+            for t, msg in frames:
+                if speed > 0:
+                    delay = (t - start_rec) / speed - (time.time() - start_wall)
+                    if delay > 0 and done.wait(delay):
+                        break
+                send(msg)
+            if not loop:
+                break
+        send(b"", 0x8)
+    except OSError:
+        pass
+    done.set()
+    conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recorded MEXC WebSocket frames")
+    ap.add_argument("file")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--speed", type=float, default=1.0)
+    ap.add_argument("--loop", action="store_true")
+    args = ap.parse_args()
+
+    frames = load_frames(args.file)
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind((args.host, args.port))
+    srv.listen(4)
+    print("▶️  ws://{}:{} | {} رسالة | سرعة ×{}".format(
+        args.host, args.port, len(frames), args.speed))
+    try:
+        while True:
+            conn, _ = srv.accept()
+            threading.Thread(target=serve_client,
+                             args=(conn, frames, args.speed, args.loop),
+                             daemon=True).start()
+    except KeyboardInterrupt:
+        srv.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
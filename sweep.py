@@ -0,0 +1,333 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║              MAFIO BOT — PARAMETER SWEEP                    ║
+║   بحث شبكي/عشوائي لثوابت الإشارات فوق backtest.py بالتوازي   ║
+╚══════════════════════════════════════════════════════════════╝
+
+الاستخدام:
+  python sweep.py rec --random 64
+  python sweep.py rec --grid SCORE_MIN=60,65,70 --grid TRAIL_DROP_TRIGGER=1,1.5,2
+  python sweep.py rec --random 200 --range SCORE_MIN=55:80 --rank avg --out sweep.csv
+
+  ● التسجيل يُحوَّل مرة واحدة إلى <rec>/.sweep/ (مصفوفات .npy)
+    وكل عملية تفتحها بـ memmap — نفس صفحات الذاكرة بدون إعادة تحليل
+  ● كل تجربة في عملية جديدة (ProcessPoolExecutor) — حالة main نظيفة دائماً
+  ● الصف الأول = الثوابت الحالية (baseline) للمقارنة
+"""
+
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import random
+import argparse
+import itertools
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import main
+import backtest
+
+CACHE_DIR = ".sweep"
+
+# مجال البحث الافتراضي: (أدنى, أعلى) — int إذا الطرفان int
+SPACE = {
+    "SCORE_MIN":          (55, 80),
+    "GOLD_MIN":           (80, 95),
+    "VOL_SPIKE_RATIO":    (1.5, 4.0),
+    "TRAIL_GAIN_TRIGGER": (1.0, 4.0),
+    "TRAIL_DROP_TRIGGER": (0.8, 3.0),
+    "MOMENTUM_MOVE_MIN":  (1.0, 4.0),
+    "ST_MULTIPLIER":      (2.0, 4.0),
+}
+
+RANKS = {   # المقياس → ترتيب تنازلي؟
+    "total":    True,
+    "avg":      True,
+    "median":   True,
+    "hit_rate": True,
+    "max_dd":   False,
+}
+
+
+# ═══════════════════════════════════════════════
+#   تحويل التسجيل إلى مصفوفات memmap
+# ═══════════════════════════════════════════════
+def prepare(path):
+    """
+    <rec>/.sweep/:
+      ts.npy (T) + data.npy (T × 5 × S) float32 + symbols.json
+      rows.npy (M × 8) float64: صفوف Klines / مستويات Depth (عمودان)
+      index.npy (R × 5): key_id, t, start, split, end  +  keys.json
+    يُعاد البناء فقط إذا تغير التسجيل.
+    """
+    out   = os.path.join(path, CACHE_DIR)
+    files = sorted(glob.glob(os.path.join(path, "snapshots-*.npz")) +
+                   glob.glob(os.path.join(path, "responses-*.jsonl.gz")))
+    if not files:
+        raise SystemExit("❌ لا يوجد تسجيل في {}".format(path))
+    stamp = os.path.join(out, "stamp.json")
+    sig   = [[os.path.basename(f), os.path.getsize(f)] for f in files]
+    try:
+        with open(stamp) as f:
+            if json.load(f) == sig:
+                return out
+    except (OSError, ValueError):
+        pass
+    os.makedirs(out, exist_ok=True)
+    t0 = time.time()
+
+    # ── صور السوق: اتحاد الرموز ثم الكتابة مباشرة في memmap ──
+    pos, total = {}, 0
+    for ts, symbols, _ in _chunk_headers(path):
+        total += len(ts)
+        for s in symbols:
+            pos.setdefault(s, len(pos))
+    all_ts = np.lib.format.open_memmap(os.path.join(out, "ts.npy"), mode="w+",
+                                       dtype=np.float64, shape=(total,))
+    data = np.lib.format.open_memmap(os.path.join(out, "data.npy"), mode="w+",
+                                     dtype=np.float32, shape=(total, 5, len(pos)))
+    t = 0
+    for ts, symbols, chunk in backtest.iter_chunks(path):
+        n    = len(ts)
+        cols = np.array([pos[s] for s in symbols], dtype=int)
+        data[t:t + n] = np.nan
+        data[t:t + n][:, :, cols] = chunk
+        all_ts[t:t + n] = ts
+        t += n
+    data.flush()
+    all_ts.flush()
+    del data, all_ts
+    with open(os.path.join(out, "symbols.json"), "w") as f:
+        json.dump(list(pos), f)
+
+    # ── الردود: JSON مرة واحدة → أرقام ──
+    keys, index, rows, m = [], [], [], 0
+    for k, items in backtest.ResponseStore.read(path).items():
+        kid = len(keys)
+        keys.append(list(k))
+        for ts, resp in items:
+            try:
+                if k[0] == "klines":
+                    arr = np.array([r[:8] for r in resp], dtype=np.float64)
+                    split = len(arr)
+                else:
+                    bids = [b[:2] for b in resp.get("bids", [])]
+                    asks = [a[:2] for a in resp.get("asks", [])]
+                    arr  = np.zeros((len(bids) + len(asks), 8))
+                    if len(arr):
+                        arr[:, :2] = np.array(bids + asks, dtype=np.float64)
+                    split = len(bids)
+            except (ValueError, TypeError, AttributeError, IndexError):
+                continue
+            index.append((kid, ts, m, m + split, m + len(arr)))
+            rows.append(arr.reshape(-1, 8))
+            m += len(arr)
+    np.save(os.path.join(out, "rows.npy"),
+            np.concatenate(rows) if rows else np.zeros((0, 8)))
+    np.save(os.path.join(out, "index.npy"),
+            np.array(index, dtype=np.float64).reshape(-1, 5))
+    with open(os.path.join(out, "keys.json"), "w") as f:
+        json.dump(keys, f)
+
+    with open(stamp, "w") as f:
+        json.dump(sig, f)
+    print("📦 تحضير البيانات: {:,} دورة × {:,} رمز | {:,} رد | {:.1f}s".format(
+        total, len(pos), len(index), time.time() - t0))
+    return out
+
+
+def _chunk_headers(path):
+    """ts + symbols فقط (بدون تحميل data) — للمرور الأول."""
+    for name in sorted(glob.glob(os.path.join(path, "snapshots-*.npz"))):
+        with np.load(name) as z:
+            yield z["ts"], z["symbols"].tolist(), None
+
+
+class MappedStore(backtest.ResponseStore):
+    """ResponseStore يقرأ من rows.npy (memmap) بدل JSON."""
+
+    def __init__(self, cache):
+        self.rows = np.load(os.path.join(cache, "rows.npy"), mmap_mode="r")
+        index = np.load(os.path.join(cache, "index.npy"))
+        with open(os.path.join(cache, "keys.json")) as f:
+            keys = [tuple(k) for k in json.load(f)]
+        recs = {}
+        for kid, ts, start, split, end in index.tolist():
+            recs.setdefault(keys[int(kid)], []).append(
+                (ts, (int(start), int(split), int(end))))
+        self.recs = self.index(recs)
+
+    def data(self, key, item):
+        start, split, end = item
+        if key[0] == "klines":
+            return self.rows[start:end].tolist()
+        return {"bids": self.rows[start:split, :2].tolist(),
+                "asks": self.rows[split:end, :2].tolist()}
+
+
+def mapped_chunks(cache):
+    with open(os.path.join(cache, "symbols.json")) as f:
+        symbols = json.load(f)
+    ts   = np.load(os.path.join(cache, "ts.npy"), mmap_mode="r")
+    data = np.load(os.path.join(cache, "data.npy"), mmap_mode="r")
+    yield ts, symbols, data
+
+
+# ═══════════════════════════════════════════════
+#   تجربة واحدة (داخل عملية منفصلة)
+# ═══════════════════════════════════════════════
+def evaluate(cache, params, horizon):
+    main.log.setLevel(logging.WARNING)
+    for name, value in params.items():
+        setattr(main, name, value)
+    t0 = time.perf_counter()
+    ledger, msgs, steps, _ = backtest.run_replay(
+        backtest.snapshots(mapped_chunks(cache)), MappedStore(cache), horizon)
+    stats = {}
+    for kind in ("signal", "momentum"):
+        stats[kind] = backtest.summarize([t for t in ledger.trades if t["kind"] == kind])
+    return {"params": params, "stats": stats, "steps": steps,
+            "sec": time.perf_counter() - t0}
+
+
+# ═══════════════════════════════════════════════
+#   مجال البحث
+# ═══════════════════════════════════════════════
+def _num(text):
+    return int(text) if text.lstrip("-").isdigit() else float(text)
+
+
+def check_param(name):
+    if not isinstance(getattr(main, name, None), (int, float)):
+        raise SystemExit("❌ {} ليس ثابتاً رقمياً في main.py".format(name))
+
+
+def grid_jobs(specs):
+    names, values = [], []
+    for spec in specs:
+        name, _, vals = spec.partition("=")
+        check_param(name)
+        names.append(name)
+        values.append([_num(v) for v in vals.split(",") if v])
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def random_jobs(n, ranges, seed):
+    space = dict(SPACE)
+    for spec in ranges:
+        name, _, rng = spec.partition("=")
+        lo, _, hi = rng.partition(":")
+        space[name] = (_num(lo), _num(hi))
+    for name in space:
+        check_param(name)
+    rnd  = random.Random(seed)
+    jobs = []
+    for _ in range(n):
+        p = {}
+        for name, (lo, hi) in space.items():
+            if isinstance(lo, int) and isinstance(hi, int):
+                p[name] = rnd.randint(lo, hi)
+            else:
+                p[name] = round(rnd.uniform(lo, hi), 2)
+        jobs.append(p)
+    return jobs
+
+
+# ═══════════════════════════════════════════════
+#   النتائج
+# ═══════════════════════════════════════════════
+def rank(results, kind, metric):
+    key = lambda r: (r["stats"][kind] or {}).get(metric, float("-inf") if RANKS[metric]
+                                                  else float("inf"))
+    return sorted(results, key=key, reverse=RANKS[metric])
+
+
+def print_table(results, names, kind, top):
+    head = "{:>4} ".format("#") + " ".join("{:>10}".format(n[:10]) for n in names)
+    head += " | {:>5} {:>6} {:>7} {:>8} {:>7}".format("n", "hit%", "avg%", "total%", "maxDD%")
+    print(head)
+    print("─" * len(head))
+    i = 0
+    for r in results[:top]:
+        st  = r["stats"][kind]
+        if not r.get("baseline"):
+            i += 1
+        tag = "base" if r.get("baseline") else str(i)
+        row = "{:>4} ".format(tag) + " ".join(
+            "{:>10}".format(r["params"].get(n, getattr(main, n))) for n in names)
+        if st is None:
+            row += " | {:>5}".format(0)
+        else:
+            row += " | {:>5} {:>6.1f} {:>+7.2f} {:>+8.2f} {:>7.2f}".format(
+                st["n"], st["hit_rate"], st["avg"], st["total"], st["max_dd"])
+        print(row)
+
+
+def write_csv(results, names, path):
+    fields = names + ["kind", "n", "hit_rate", "avg", "median", "total", "max_dd",
+                      "avg_mae", "avg_mfe"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(fields)
+        for r in results:
+            for kind, st in r["stats"].items():
+                st = st or {}
+                w.writerow([r["params"].get(n, getattr(main, n)) for n in names] +
+                           [kind] + [st.get(k, "") for k in fields[len(names) + 1:]])
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description="Parallel parameter sweep over recorded data")
+    ap.add_argument("path", help="RECORD_DIR من البوت الحقيقي")
+    ap.add_argument("--grid", action="append", default=[], metavar="NAME=v1,v2,...")
+    ap.add_argument("--random", type=int, default=0, metavar="N")
+    ap.add_argument("--range", action="append", default=[], metavar="NAME=lo:hi")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--horizon", type=float, default=3600)
+    ap.add_argument("--kind", choices=("signal", "momentum"), default="signal")
+    ap.add_argument("--rank", choices=sorted(RANKS), default="total")
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--out", default="", help="كل النتائج في CSV")
+    args = ap.parse_args()
+
+    jobs = grid_jobs(args.grid) if args.grid else []
+    if args.random or not jobs:
+        jobs += random_jobs(args.random or 32, args.range, args.seed)
+    names = sorted({n for p in jobs for n in p})
+    cache = prepare(args.path)
+
+    t0 = time.time()
+    results = []
+    # spawn + max_tasks_per_child=1: كل تجربة تبدأ من main نظيف (بدون حالة سابقة)
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(args.workers, mp_context=ctx, max_tasks_per_child=1) as ex:
+        futs = {ex.submit(evaluate, cache, {}, args.horizon): None}
+        futs.update({ex.submit(evaluate, cache, p, args.horizon): p for p in jobs})
+        for i, fut in enumerate(as_completed(futs), 1):
+            r = fut.result()
+            if futs[fut] is None:
+                r["baseline"] = True
+            results.append(r)
+            print("\r⏳ {}/{}".format(i, len(futs)), end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    base   = [r for r in results if r.get("baseline")]
+    ranked = rank([r for r in results if not r.get("baseline")], args.kind, args.rank)
+    print("🔬 Sweep | {} تجربة | {} عملية | {:.0f}s | ترتيب: {} ({})".format(
+        len(jobs), args.workers, time.time() - t0, args.rank, args.kind))
+    print_table(base + ranked, names, args.kind, args.top + 1)
+    if args.out:
+        write_csv(base + ranked, names, args.out)
+        print("💾 {}".format(args.out))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
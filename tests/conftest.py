@@ -0,0 +1,38 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║              MAFIO BOT — TESTS (pytest)                     ║
+║     المطابقة: المسارات السريعة ≡ المسارات العادية          ║
+╚══════════════════════════════════════════════════════════════╝
+
+التشغيل (من جذر المشروع):
+  python -m pytest -q
+
+  ● البيانات الصناعية من bench.py (نفس بيانات القياس)
+  ● bench.py للتوقيت فقط — الصحة هنا
+"""
+
+import os
+import sys
+import logging
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+import bench  # noqa: E402
+
+
+@pytest.fixture
+def quiet(monkeypatch):
+    """بدون Telegram / سجلات / حدود API / خيوط — يُستعاد كل شيء بعد الاختبار."""
+    level = main.log.level
+    main.log.setLevel(logging.WARNING)
+    monkeypatch.setattr(main, "send", lambda msg: None)
+    monkeypatch.setattr(main, "scan_limiter", main.TokenBucket(1e12, 1e12))
+    monkeypatch.setattr(main, "api_limiter", main.TokenBucket(1e12, 1e12))
+    monkeypatch.setattr(main, "scan_pool", bench._Inline())
+    monkeypatch.setattr(main, "recorder", None)
+    monkeypatch.setattr(main, "kline_archive", None)
+    yield
+    main.log.setLevel(level)
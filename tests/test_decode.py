@@ -0,0 +1,38 @@
+"""decode_tickers ≡ json.loads + MarketSnapshot.from_tickers — على كل مسار تحليل متاح."""
+
+import json
+
+import numpy as np
+import pytest
+
+import main
+from bench import synth_tickers
+
+
+def _corrupt():
+    raw = synth_tickers(500)
+    raw[3]["lastPrice"] = None
+    raw[7]["highPrice"] = "n/a"
+    del raw[9]["quoteVolume"]
+    return raw
+
+
+@pytest.fixture(params=["msgspec", "columns"])
+def decoder(request, monkeypatch):
+    """msgspec (إن وُجد) ← from_columns — الصف التالف يرجع للمسار العادي في الحالتين."""
+    if request.param == "msgspec":
+        if main._ticker_decoder is None:
+            pytest.skip("msgspec غير مثبت أو FAST_JSON=0")
+    else:
+        monkeypatch.setattr(main, "_ticker_decoder", None)
+        monkeypatch.setattr(main, "FAST_JSON", True)
+    return request.param
+
+
+@pytest.mark.parametrize("body", [synth_tickers(500), _corrupt()], ids=["clean", "corrupt"])
+def test_decode_tickers(decoder, body):
+    payload = json.dumps(body).encode()
+    a = main.MarketSnapshot.from_tickers(json.loads(payload))
+    b = main.decode_tickers(payload)
+    assert a.symbols == b.symbols
+    assert np.array_equal(a.data, b.data)
@@ -0,0 +1,89 @@
+"""
+detect_momentum + check_tracked على الدلتا ≡ على كل الرموز
+(نفس المراحل / التنبيهات / tracked بعد سلسلة دورات REST).
+"""
+
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+import main
+from bench import synth_tickers, moved
+
+CYCLES = 40
+
+
+class _Clock(object):
+    """main.time بديل — كل دورة REST تتقدم CHECK_INTERVAL+1 ثانية."""
+
+    def __init__(self, t):
+        self.t = t
+
+    def time(self):
+        return self.t
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+class _FixedDatetime(datetime):
+    """main.datetime بديل — وقت الرسائل ثابت فلا تختلف المقارنة عند تغير الثانية."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.fromtimestamp(1_700_000_000.0, tz)
+
+
+@pytest.fixture
+def snaps():
+    raw, out = synth_tickers(), []
+    for k in range(CYCLES):
+        out.append(main.MarketSnapshot.from_tickers(raw))
+        raw = moved(raw, frac=0.05, seed=100 + k, lo=0.94, hi=1.07)
+    return out
+
+
+@pytest.fixture
+def run(quiet, monkeypatch):
+    state = (main.price_prev, main.price_prev_ts, main.momentum_alerted,
+             main.momentum_stage, main.tracked)
+    monkeypatch.setattr(main, "datetime", _FixedDatetime)
+    monkeypatch.setattr(main, "time", _Clock(0.0))
+    monkeypatch.setattr(main, "last_tracked_check", 0.0)
+
+    def _run(snaps, delta):
+        sent  = []
+        clock = main.time = _Clock(1_700_000_000.0)
+        main.send = sent.append
+        # المرحلة 3 تطلق Deep Scan — يُسجل فقط (بدون شبكة)
+        main.deep_scan = lambda sym, price, ch: sent.append(("deep", sym))
+        for d in state:
+            d.clear()
+        for s in snaps[0].symbols[:60]:
+            p = snaps[0].get("price", s)
+            main.tracked[s] = {"entry": p, "peak": p, "level": 1, "score": 70,
+                               "sl_pct": 5.0, "entry_time": clock.t, "last_alert": 0.0}
+        main.last_tracked_check = 0.0
+        prev = None
+        for snap in snaps:
+            clock.t += main.CHECK_INTERVAL + 1
+            syms = snap.changed(prev) if delta else set(snap.symbols)
+            prev = snap
+            main.check_tracked(snap, syms)
+            main.detect_momentum(snap, syms if delta else None)
+        return sent, json.dumps([main.momentum_stage, main.tracked], sort_keys=True)
+
+    monkeypatch.setattr(main, "deep_scan", main.deep_scan)
+    yield _run
+    for d in state:
+        d.clear()
+
+
+def test_delta_matches_full(snaps, run):
+    full  = run(snaps, False)
+    delta = run(snaps, True)
+    assert full[0], "السلسلة لا تطلق أي تنبيه — المقارنة بلا معنى"
+    assert delta[0] == full[0]
+    assert delta[1] == full[1]
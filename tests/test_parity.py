@@ -0,0 +1,62 @@
+"""scan_features / score_batch (مصفوفات) ≡ indicator_features / calculate_score / calc_sl لكل سلسلة."""
+
+import random
+
+import numpy as np
+import pytest
+
+import main
+from bench import synth_series
+
+
+@pytest.fixture(scope="module")
+def market():
+    kds  = synth_series()
+    rnd  = random.Random(1)
+    syms = list(kds)
+    ob   = {s: ({"bid": rnd.uniform(0, 60_000), "ask": 1.0, "imb": rnd.uniform(0, 3)}
+                if rnd.random() < 0.7 else None) for s in syms}
+    bo   = {s: rnd.choice([0.0, rnd.uniform(0, 100)]) for s in syms}
+    hot  = {s: rnd.random() < 0.2 for s in syms}
+    table = main.scan_features(kds)
+    scores = main.score_batch(
+        table,
+        ob_bid=np.array([ob[s]["bid"] if ob[s] else np.nan for s in syms]),
+        ob_imb=np.array([ob[s]["imb"] if ob[s] else np.nan for s in syms]),
+        bo_str=np.array([bo[s] for s in syms]),
+        in_hot=np.array([hot[s] for s in syms]),
+    )
+    scalar = {s: main.indicator_features(kds[s]) for s in syms}
+    return kds, syms, ob, bo, hot, table, scores, scalar
+
+
+def test_features(market):
+    kds, syms, _, _, _, table, _, scalar = market
+    bad = {s: [k for k, v in scalar[s].items() if main.table_features(table[i])[k] != v]
+           for i, s in enumerate(syms)}
+    bad = {s: keys for s, keys in bad.items() if keys}
+    assert not bad, list(bad.items())[:5]
+
+
+def test_scores(market):
+    kds, syms, ob, bo, hot, _, scores, scalar = market
+    bad = []
+    for i, s in enumerate(syms):
+        a  = scalar[s]
+        sc = main.calculate_score(kds[s], ob[s], a["accum"], a["spike"], a["consol"],
+                                  a["hl"], a["green"], bo[s], hot[s], a["st"])
+        if sc != scores[i]:
+            bad.append((s, sc, scores[i]))
+    assert not bad, bad[:5]
+
+
+def test_stop_loss(market):
+    kds, syms, ob, bo, _, table, scores, _ = market
+    bad = []
+    for i, s in enumerate(syms):
+        sl_atr = main.table_features(table[i])["sl_atr"]
+        a = main.calc_sl(kds[s], scores[i], ob[s], bo[s] > 0)
+        b = main.calc_sl(kds[s], scores[i], ob[s], bo[s] > 0, sl_atr)
+        if a != b:
+            bad.append((s, a, b))
+    assert not bad, bad[:5]